@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-zawamis-secret-key-2025-change-in-production'
@@ -14,18 +16,23 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'hello',
 ]
 
 MIDDLEWARE = [
+    'hello.metrics.MetricsMiddleware',
+    'hello.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'hello.throttling.ThrottleMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'hello.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -51,18 +58,89 @@ TEMPLATES = [
 WSGI_APPLICATION = 'dnjango.wsgi.application'
 
 # --------- Hapa nimebadilisha kwenda PostgreSQL ---------
+# Every value can be overridden from the environment (DB_NAME, DB_USER, ...).
+#
+# DB_CONN_MODE picks how connections are reused:
+#   'pool'       - a psycopg 3 pool per worker process (needs psycopg[pool]);
+#                  the right choice under ASGI, where requests do not keep
+#                  to one thread. Sized by DB_POOL_MIN_SIZE/DB_POOL_MAX_SIZE.
+#   'persistent' - one connection per worker thread, kept DB_CONN_MAX_AGE
+#                  seconds (default)
+#   'none'       - connect and disconnect around every request
+# Pooled and persistent connections are health-checked before reuse, so a
+# restarted server or a dropped idle connection costs a reconnect, not a 500.
+DB_CONN_MODE = os.environ.get('DB_CONN_MODE', 'persistent')
+if DB_CONN_MODE not in ('pool', 'persistent', 'none'):
+    raise ImproperlyConfigured(f'DB_CONN_MODE must be pool, persistent or none, not {DB_CONN_MODE!r}')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'jobsite_db',       # Jina la database yako
-        'USER': 'postgres',         # PostgreSQL username yako
-        'PASSWORD': '12345678', # Badilisha na password yako halisi
-        'HOST': 'localhost',        # Host
-        'PORT': '5432',             # Port (default ni 5432)
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql'),
+        'NAME': os.environ.get('DB_NAME', 'jobsite_db'),       # Jina la database yako
+        'USER': os.environ.get('DB_USER', 'postgres'),         # PostgreSQL username yako
+        'PASSWORD': os.environ.get('DB_PASSWORD', '12345678'), # Badilisha na password yako halisi
+        'HOST': os.environ.get('DB_HOST', 'localhost'),        # Host
+        'PORT': os.environ.get('DB_PORT', '5432'),             # Port (default ni 5432)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)) if DB_CONN_MODE == 'persistent' else 0,
+        'CONN_HEALTH_CHECKS': DB_CONN_MODE != 'none',
+        'OPTIONS': {},
     }
 }
+if DB_CONN_MODE == 'pool':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        # Seconds a request waits for a free connection before failing
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        # Idle connections above min_size are closed after this many seconds
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+    }
+
+# Read replicas: DB_REPLICA_HOSTS="host[:port],host[:port]" adds the aliases
+# replica1, replica2, ... with the primary's credentials. See
+# hello/routers.py for what reads from them.
+REPLICA_DATABASES = []
+for number, address in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'], 'HOST': host, 'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica{number}')
+DATABASE_ROUTERS = ['hello.routers.ReplicaRouter']
+# Reads about a user stay on the primary this long after their data changed,
+# and browsers (the admin) this long after their own POST. Keep it above
+# REPLICA_MAX_LAG, or a replica may still serve pre-write rows.
+REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+# Replicas lagging more than this many seconds (or unreachable) are skipped
+# until the next check; None disables the check
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = 2
 # ---------------------------------------------------------
 
+# The first hasher hashes new passwords; the rest are only used to verify (and
+# then upgrade) older rows, including the original unsalted SHA-256 digests.
+PASSWORD_HASHERS = [
+    'hello.hashers.PBKDF2PasswordHasher',
+    'hello.hashers.Argon2PasswordHasher',
+    'hello.hashers.ScryptPasswordHasher',
+    'hello.hashers.UnsaltedSHA256PasswordHasher',
+]
+
+# Work factors per algorithm; raising one rehashes users on their next login.
+# Size them with `python manage.py bench_hashers` before deploying.
+PASSWORD_HASH_COST = {
+    'pbkdf2_sha256': {'iterations': int(os.environ.get('PBKDF2_ITERATIONS', 1000000))},
+    'argon2': {'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},
+    'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 5},
+}
+
+# Hashing runs in a bounded thread pool so a login burst can occupy at most
+# PASSWORD_HASHING_WORKERS cores; once PASSWORD_HASHING_MAX_QUEUE requests are
+# waiting for a worker, login/register answer 503 instead of queueing more.
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASHING_MAX_QUEUE = int(os.environ.get('PASSWORD_HASHING_MAX_QUEUE', 64))
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -82,10 +160,58 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media is served by hello.media.serve_media after an ownership check. Signed
+# download URLs stay valid for MEDIA_URL_MAX_AGE seconds. Behind nginx, set
+# MEDIA_ACCEL_REDIRECT_PREFIX to an `internal` location aliased to MEDIA_ROOT;
+# behind Apache/lighttpd set MEDIA_SENDFILE = True. Either way the proxy then
+# streams the bytes instead of a Django worker.
+MEDIA_URL_MAX_AGE = 3600
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX')
+MEDIA_SENDFILE = False
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Local memory per process by default, which is only right for a single
+# development process. In production point CACHE_BACKEND/CACHE_LOCATION at e.g.
+# django.core.cache.backends.redis.RedisCache so every worker shares it.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'dnjango'),
+    }
+}
+
+# Serialized profiles and message pages (hello/cache.py). Keep the timeout
+# well below MEDIA_URL_MAX_AGE: cached payloads carry signed media URLs.
+# Invalidation bumps a version key in this cache, so it only reaches other
+# workers if the cache is shared. On local memory each worker keeps serving
+# its own copy for up to USER_CACHE_TIMEOUT, and `check --deploy` fails.
+USER_CACHE_ALIAS = 'default'
+USER_CACHE_TIMEOUT = 300
+
+# /api/events/<id>/ Server-Sent Events (hello/events.py). Long-lived streams
+# need an ASGI server, e.g. `uvicorn dnjango.asgi:application`.
+EVENTS_HEARTBEAT = 15
+EVENTS_RETRY_MS = 3000
+EVENTS_QUEUE_SIZE = 100
+EVENTS_RECONNECT_DELAY = 1
+
 REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'hello.tokens.TokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    # hello/throttling.py. *_ip budgets are per client address (set
+    # NUM_PROXIES behind a proxy, or every client shares the proxy's).
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '60/min',
+        'login_email': '10/min',
+        'register_ip': '30/hour',
+        'upload_ip': '120/hour',
+        'upload_user': '60/hour',
+    },
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.MultiPartParser',
@@ -93,6 +219,58 @@ REST_FRAMEWORK = {
     ],
 }
 
+# /metrics (hello/metrics.py): per-view latency, SQL and payload sizes.
+# Requests slower than METRICS_SLOW_REQUEST seconds (None: never) are
+# logged with their METRICS_SLOW_QUERIES most expensive statements.
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+METRICS_SLOW_REQUEST = float(os.environ.get('METRICS_SLOW_REQUEST', 1.0))
+METRICS_SLOW_QUERIES = 5
+
+# Response compression (hello/compression.py): Brotli when the brotli
+# package is installed, else gzip, for bodies of at least this many bytes
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Cache holding the rate limit counters; needs an atomic incr() shared by
+# every worker in production (Redis or memcached rather than local memory)
+THROTTLE_CACHE_ALIAS = 'default'
+
+# Signed bearer tokens issued by /api/login/ (hello/tokens.py), in seconds.
+# Each user's token version is cached in USER_CACHE_ALIAS for
+# TOKEN_STATE_TIMEOUT. That cache must be shared by every worker (`check
+# --deploy` rejects local memory): with a per-process cache a revocation only
+# reaches the worker that made it, and the others keep accepting the revoked
+# token until their copy expires.
+ACCESS_TOKEN_LIFETIME = 15 * 60
+REFRESH_TOKEN_LIFETIME = 14 * 24 * 3600
+TOKEN_STATE_TIMEOUT = 300
+
+# Most recent messages/applications embedded in a profile response
+PROFILE_NESTED_LIMIT = 20
+
+# /api/messages/<id>/ keyset pagination and ?stream=1 NDJSON export
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+MESSAGES_EXPORT_CHUNK_SIZE = 2000
+
+# `manage.py import_applicants`: rows per bulk INSERT where COPY is not
+# available (non-PostgreSQL), and documents/applications per preview task
+IMPORT_BATCH_SIZE = 1000
+IMPORT_PREVIEW_BATCH = 500
+
+# Admin changelists report the planner's estimate instead of COUNT(*) above this
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+# /api/search/ ranked results
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Most applications one /api/applications/bulk-status/ request may move
+BULK_STATUS_MAX_IDS = 10000
+
+# Rows fetched per server-side cursor round trip by /api/exports/applicants/
+EXPORT_CHUNK_SIZE = 2000
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000", "http://127.0.0.1:3000",
     "http://localhost:8000", "http://127.0.0.1:8000",
@@ -102,7 +280,41 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760
+
+# Uploads are streamed to a temporary file in fixed-size chunks (never held in
+# worker RAM) and hashed on the way in, then moved into MEDIA_ROOT atomically.
+# Keep FILE_UPLOAD_TEMP_DIR on the same filesystem as MEDIA_ROOT so the move
+# is a rename rather than a copy.
+FILE_UPLOAD_HANDLERS = ['hello.uploads.HashingTemporaryFileUploadHandler']
+FILE_UPLOAD_CHUNK_SIZE = 64 * 1024
+FILE_UPLOAD_PERMISSIONS = 0o644
+
+# Background tasks (hello/tasks.py): attempts before a task is dead-lettered,
+# first retry delay doubling up to the maximum (seconds), and how long a
+# worker may hold a task before another worker may take it over. Finished
+# tasks are kept TASK_DONE_RETENTION days, purged by run_tasks workers every
+# TASK_PURGE_INTERVAL seconds
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_RETRY_MAX_DELAY = 3600
+TASK_LEASE = 300
+TASK_DONE_RETENTION = 7
+TASK_PURGE_INTERVAL = 3600
+
+# Called with each uploaded application / message file by the scan_uploads
+# task; returns an infection name or None (hello/submissions.py)
+VIRUS_SCANNER = 'hello.submissions.eicar_scanner'
+
+# Thumbnails / first-page previews made by `manage.py run_tasks`
+PREVIEW_SIZE = 320
+PREVIEW_QUALITY = 80
+
+STORAGES = {
+    # Content-addressed: identical uploads share one file under MEDIA_ROOT/blobs/.
+    # Run `manage.py media_blobs gc` periodically to drop unreferenced blobs.
+    'default': {'BACKEND': 'hello.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -1,14 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.views.generic import RedirectView
+from hello.media import serve_media
+from hello.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('hello.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", serve_media, name='serve_media'),
     path('', RedirectView.as_view(url='/admin/')),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+]
\ No newline at end of file
@@ -1,30 +1,182 @@
-from django.contrib import admin
-from .models import User, UserDocument, JobApplication, UserMessage
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.html import format_html
+from .models import User, UserDocument, JobApplication, UserMessage, Task, FailedTask
+from .exports import applicant_rows, export_response
+from .imports import FIELDS, ImportFormatError, guess_format, import_applicants
+from .pagination import EstimatedCountPaginator
+from .search import search_filter
+from .tasks import requeue
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with hundreds of thousands of rows."""
+    paginator = EstimatedCountPaginator
+    # Skip the extra unfiltered COUNT(*) behind "N results (M total)"
+    show_full_result_count = False
+    # tsvector column matched alongside search_fields (see hello/search.py)
+    search_vector = None
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not (self.search_vector and search_term):
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(search_filter(search_term, self.search_fields, self.search_vector, queryset.db)), False
+
+class ImportForm(forms.Form):
+    file = forms.FileField(help_text='.csv, .ndjson or .jsonl')
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        try:
+            self.file_format = guess_format(upload.name)
+        except ImportFormatError as e:
+            raise forms.ValidationError(str(e))
+        return upload
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = ['email', 'first_name', 'last_name', 'phone_number', 'registration_date', 'is_active']
     list_filter = ['gender', 'marital_status', 'is_active', 'registration_date']
     search_fields = ['email', 'first_name', 'last_name', 'phone_number', 'id_number']
+    search_vector = 'search_vector'
     readonly_fields = ['registration_date']
+    ordering = ['-registration_date']
+    actions = ['export_csv', 'export_xlsx']
+
+    # Rejected rows listed after an upload; the rest are only counted
+    IMPORT_REJECTED_SHOWN = 20
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='hello_user_import'),
+            *super().get_urls(),
+        ]
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = ImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                result = import_applicants(form.cleaned_data['file'].file, form.file_format)
+            except ImportFormatError as e:
+                self.message_user(request, str(e), messages.ERROR)
+            else:
+                self.message_user(request, result.summary(), messages.SUCCESS)
+                for line, reason in result.rejected[:self.IMPORT_REJECTED_SHOWN]:
+                    self.message_user(request, f'Line {line}: {reason}', messages.WARNING)
+                return redirect('admin:hello_user_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import applicants',
+            'form': form,
+            'columns': FIELDS,
+        }
+        return TemplateResponse(request, 'admin/hello/user/import.html', context)
+
+    @admin.action(description='Export selected applicants (CSV)')
+    def export_csv(self, request, queryset):
+        return export_response(applicant_rows(queryset), 'csv')
+
+    @admin.action(description='Export selected applicants (XLSX)')
+    def export_xlsx(self, request, queryset):
+        return export_response(applicant_rows(queryset), 'xlsx')
 
 @admin.register(UserDocument)
-class UserDocumentAdmin(admin.ModelAdmin):
-    list_display = ['user', 'document_type', 'uploaded_at']
+class UserDocumentAdmin(LargeTableAdmin):
+    list_display = ['thumbnail', 'user', 'document_type', 'uploaded_at']
+    list_select_related = ['user']
+    ordering = ['-uploaded_at']
+    raw_id_fields = ['user']
     list_filter = ['document_type', 'uploaded_at']
     search_fields = ['user__email', 'user__first_name', 'user__last_name']
-    readonly_fields = ['uploaded_at']
+    readonly_fields = ['uploaded_at', 'preview']
+
+    @admin.display(description='Preview')
+    def thumbnail(self, obj):
+        if not obj.preview:
+            return '-'
+        return format_html('<img src="{}" style="max-height: 48px" loading="lazy">', obj.preview.url)
 
 @admin.register(JobApplication)
-class JobApplicationAdmin(admin.ModelAdmin):
+class JobApplicationAdmin(LargeTableAdmin):
     list_display = ['user', 'job_title', 'status', 'application_date']
+    list_select_related = ['user']
+    ordering = ['-application_date']
+    raw_id_fields = ['user']
     list_filter = ['status', 'application_date']
     search_fields = ['user__email', 'job_title']
+    search_vector = 'search_vector'
     readonly_fields = ['application_date']
+    actions = ['mark_reviewed', 'mark_rejected', 'mark_hired', 'export_csv', 'export_xlsx']
+
+    def transition(self, request, queryset, status):
+        outcomes = queryset.transition(status)
+        updated = sum(1 for outcome, _ in outcomes.values() if outcome == 'updated')
+        self.message_user(request, f'{updated} application(s) marked {status}.', messages.SUCCESS)
+        skipped = sum(1 for outcome, _ in outcomes.values() if outcome == 'invalid_transition')
+        if skipped:
+            self.message_user(request, f'{skipped} application(s) skipped: {status} is not allowed from their current status.', messages.WARNING)
+
+    @admin.action(description='Mark selected applications as reviewed')
+    def mark_reviewed(self, request, queryset):
+        self.transition(request, queryset, 'reviewed')
+
+    @admin.action(description='Mark selected applications as rejected')
+    def mark_rejected(self, request, queryset):
+        self.transition(request, queryset, 'rejected')
+
+    @admin.action(description='Mark selected applications as hired')
+    def mark_hired(self, request, queryset):
+        self.transition(request, queryset, 'hired')
+
+    @admin.action(description='Export selected applications (CSV)')
+    def export_csv(self, request, queryset):
+        return export_response(applicant_rows(id__in=queryset.values('id')), 'csv', 'applications')
+
+    @admin.action(description='Export selected applications (XLSX)')
+    def export_xlsx(self, request, queryset):
+        return export_response(applicant_rows(id__in=queryset.values('id')), 'xlsx', 'applications')
 
 @admin.register(UserMessage)
-class UserMessageAdmin(admin.ModelAdmin):
+class UserMessageAdmin(LargeTableAdmin):
     list_display = ['user', 'created_at', 'admin_reply']
+    list_select_related = ['user']
+    ordering = ['-created_at']
+    raw_id_fields = ['user']
     list_filter = ['created_at']
     search_fields = ['user__email', 'message']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    search_vector = 'search_vector'
+    readonly_fields = ['created_at', 'reply_date']
+
+    def save_model(self, request, obj, form, change):
+        # Delta sync (?since=) and message ETags key off reply_date
+        if 'admin_reply' in form.changed_data:
+            obj.reply_date = timezone.now()
+        super().save_model(request, obj, form, change)
+
+@admin.register(Task)
+class TaskAdmin(LargeTableAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'created_at']
+    list_filter = ['status', 'name']
+    readonly_fields = ['created_at']
+
+@admin.register(FailedTask)
+class FailedTaskAdmin(LargeTableAdmin):
+    list_display = ['name', 'attempts', 'failed_at', 'created_at']
+    list_filter = ['name', 'failed_at']
+    readonly_fields = ['name', 'payload', 'attempts', 'last_error', 'created_at', 'failed_at']
+    ordering = ['-failed_at']
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected tasks')
+    def requeue(self, request, queryset):
+        tasks = requeue(list(queryset))
+        self.message_user(request, f'{len(tasks)} task(s) requeued.', messages.SUCCESS)
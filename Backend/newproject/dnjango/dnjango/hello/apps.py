@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class HelloConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'hello'
\ No newline at end of file
+    name = 'hello'
+
+    def ready(self):
+        # Register background task handlers, cache invalidation and system checks
+        from . import checks, previews, signals, submissions  # noqa: F401
@@ -0,0 +1,80 @@
+"""Shared helpers for the bench_* management commands."""
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date
+
+from django.conf import settings
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+
+from .models import User
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """Run against throwaway test databases, like the test runner, so
+    benchmarks never read or write real data."""
+    setup_test_environment()
+    old_config = setup_databases(verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
+        teardown_test_environment()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def create_user(index=0, password='benchmark-password'):
+    user = User(
+        first_name='Bench', last_name=f'User{index}', date_of_birth=date(1990, 1, 1),
+        phone_number='0700000000', email=f'bench{index}@example.com', gender='other',
+        id_number=f'BENCH-{index}', marital_status='single', form_four_number=f'S0000/{index:04d}/2010',
+    )
+    user.set_password(password)
+    user.save()
+    return user
+
+
+@contextmanager
+def benchmark_media():
+    """Write uploads to a temporary MEDIA_ROOT that is removed afterwards."""
+    media_root = tempfile.mkdtemp(prefix='bench-media-')
+    try:
+        with override_settings(MEDIA_ROOT=media_root):
+            yield media_root
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def cheap_hashing():
+    """Keep password hashing out of the numbers when measuring database work."""
+    return override_settings(
+        PASSWORD_HASHERS=settings.PASSWORD_HASHERS,
+        PASSWORD_HASH_COST={'pbkdf2_sha256': {'iterations': 1000}},
+    )
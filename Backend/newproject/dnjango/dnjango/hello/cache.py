@@ -0,0 +1,130 @@
+"""
+Read-through cache for serialized per-user payloads (profile, message pages).
+
+Every entry is stored under the owning user's current version number, using
+the cache framework's own ``version`` argument. Saving or deleting a user or
+any of their documents, applications or messages bumps that number (see
+``hello.signals``), so readers go straight to fresh keys and old entries
+simply age out. Nothing has to be found and deleted. The version keys live
+in USER_CACHE_ALIAS, so a bump reaches other worker processes only when
+that cache is shared (Redis, memcached). ``hello.checks`` fails ``check
+--deploy`` on a local memory cache.
+
+A version key that is missing (never written, expired or evicted) is
+recreated from the clock rather than from 1. Its new value is therefore
+always higher than any version an old entry could still be stored under.
+
+A request routed to a replica before a write pinned the user may read the
+version that write's commit set, yet build from rows the replica has not
+replayed yet. The commit pins before it bumps. So such a reader finds the
+pin once it has the new version, and it does not store what it built.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .routers import current_read_alias, is_pinned, pin_users
+
+# Keys this process wrote, so a miss on one of them is counted as an eviction
+TRACKED_KEYS = 10000
+
+_stats = Counter()
+_written = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def version_key(user_id):
+    return f'hello:user:{user_id}:version'
+
+
+def get_version(user_id):
+    cache = get_cache()
+    version = cache.get(version_key(user_id))
+    if version is None:
+        cache.add(version_key(user_id), time.time_ns(), timeout=None)
+        version = cache.get(version_key(user_id))
+    return version
+
+
+def bump_version(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:
+        cache.set(version_key(user_id), time.time_ns(), timeout=None)
+    with _lock:
+        _stats['invalidations'] += 1
+
+
+def invalidate_user(user_id):
+    """Drop every cached payload of ``user_id``.
+
+    Bumps now, so the rest of this request reads fresh data, and again on
+    commit, so a concurrent reader that cached pre-commit rows under the
+    new version is discarded too.
+    """
+    invalidate_users([user_id])
+
+
+def invalidate_users(user_ids):
+    user_ids = list(user_ids)
+    for user_id in user_ids:
+        bump_version(user_id)
+
+    def committed():
+        # Replicas may not have the change yet; read these users from the primary.
+        # Pinned first, so a replica reader that sees the new version sees the pin.
+        pin_users(user_ids)
+        for user_id in user_ids:
+            bump_version(user_id)
+
+    transaction.on_commit(committed)
+
+
+def cached(kind, user_id, build, *parts):
+    """``build()``'s result for ``user_id``, from the cache when it is current."""
+    cache = get_cache()
+    key = ':'.join(['hello', kind, str(user_id), *map(str, parts)])
+    version = get_version(user_id)
+    payload = cache.get(key, version=version)
+    with _lock:
+        if payload is not None:
+            _stats['hits'] += 1
+            return payload
+        _stats['misses'] += 1
+        if _written.pop((key, version), None):
+            _stats['evictions'] += 1
+
+    payload = build()
+    if current_read_alias() and is_pinned(user_id):
+        # Possibly pre-commit rows under the post-commit version
+        return payload
+    cache.set(key, payload, timeout=settings.USER_CACHE_TIMEOUT, version=version)
+    with _lock:
+        _written[key, version] = True
+        while len(_written) > TRACKED_KEYS:
+            _written.popitem(last=False)
+    return payload
+
+
+def cache_stats():
+    """Hit/miss/eviction/invalidation counters of this process since start."""
+    with _lock:
+        stats = {name: _stats[name] for name in ('hits', 'misses', 'evictions', 'invalidations')}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    with _lock:
+        _stats.clear()
+        _written.clear()
@@ -0,0 +1,26 @@
+"""
+System checks for settings that only go wrong once several workers serve
+the site. They run with ``manage.py check --deploy``.
+"""
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+from django.utils.module_loading import import_string
+
+
+def is_local_memory(alias):
+    return issubclass(import_string(settings.CACHES[alias]['BACKEND']), LocMemCache)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_user_cache(app_configs, **kwargs):
+    if settings.DEBUG or not is_local_memory(settings.USER_CACHE_ALIAS):
+        return []
+    return [Error(
+        f'USER_CACHE_ALIAS ({settings.USER_CACHE_ALIAS!r}) is a per-process local memory cache.',
+        hint='Its version bumps, replica pins and token revocations would only reach the worker that '
+             'handled the write. The other workers would serve stale profiles and message pages for up to '
+             'USER_CACHE_TIMEOUT seconds, and accept revoked tokens for up to TOKEN_STATE_TIMEOUT. Use a '
+             'cache every worker shares, e.g. Redis or memcached.',
+        id='hello.E001',
+    )]
@@ -0,0 +1,99 @@
+"""
+Negotiated gzip / Brotli compression of API responses.
+
+``CompressionMiddleware`` compresses a response of at least
+COMPRESSION_MIN_BYTES in the best encoding the client accepts: Brotli (if
+the ``brotli`` package is installed), else gzip. Only text and JSON content
+types are compressed. Smaller bodies go out as they are, since framing and
+CPU would eat most of the saving. Like Django's GZipMiddleware, it sets
+``Vary: Accept-Encoding``, keeps the body only if it shrank, and turns a
+strong ETag into a weak one. ``hello.etags`` compares If-None-Match weakly,
+so 304s still work. It also adds the same random gzip header padding
+against BREACH.
+
+Streamed responses (events, NDJSON, media) are passed through untouched:
+compressing them would buffer what should reach the client as it is
+produced.
+"""
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def gzip_compress(content):
+    return compress_string(content, max_random_bytes=100)
+
+
+def brotli_compress(content):
+    return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+# In order of preference when the client weighs them equally
+ENCODINGS = ([('br', brotli_compress)] if brotli else []) + [('gzip', gzip_compress)]
+
+
+def accepted_encodings(header):
+    """Content-coding -> q value from an Accept-Encoding header."""
+    weights = {}
+    for item in header.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights
+
+
+def choose_encoding(header):
+    """``(name, compress)`` of the preferred acceptable encoding, or None."""
+    weights = accepted_encodings(header)
+    best, best_weight = None, 0.0
+    for name, compress in ENCODINGS:
+        weight = weights.get(name, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = (name, compress), weight
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.streaming or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+                or len(response.content) < settings.COMPRESSION_MIN_BYTES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        name, compress = encoding
+        compressed = compress(response.content)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = name
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,68 @@
+"""
+Strong ETags for the JSON endpoints clients poll.
+
+A poll that carries a current ETag in If-None-Match gets an empty 304. The
+message ETag comes from one aggregate over the user's messages, and that
+aggregate is itself cached per user version (``hello.cache``), so
+repeated polls cost no queries until something changes.
+
+Payloads embed signed media URLs. The message ETag therefore also changes
+every MEDIA_URL_MAX_AGE / 2, so a client never revalidates a copy whose
+links have expired. Profiles are hashed from the cached payload itself,
+which already changes whenever its URLs are re-signed.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+
+from .cache import cached
+from .models import User
+from .renderers import dumps
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(dumps(parts, sort_keys=True)).hexdigest()
+    return f'"{digest}"'
+
+
+def media_url_epoch():
+    return int(time.time() // max(1, settings.MEDIA_URL_MAX_AGE // 2))
+
+
+def messages_state(user_id):
+    """Message count, newest message/reply and highest id, or {} for an unknown user."""
+    state = (
+        User.objects.filter(pk=user_id, is_active=True)
+        .annotate(count=Count('messages'), latest=Max('messages__created_at'),
+                  replied=Max('messages__reply_date'), last_id=Max('messages__id'))
+        .values('count', 'latest', 'replied', 'last_id')
+        .first()
+    )
+    return state or {}
+
+
+def messages_etag(user_id, *params):
+    """ETag for a message listing of ``user_id``; raises User.DoesNotExist."""
+    state = cached('messages_state', user_id, lambda: messages_state(user_id))
+    if not state:
+        raise User.DoesNotExist
+    return make_etag(state, media_url_epoch(), *params)
+
+
+def payload_etag(payload):
+    return make_etag(payload)
+
+
+def not_modified(request, etag):
+    """A 304 response when the client's copy is current, else None."""
+    return get_conditional_response(request, etag=etag)
+
+
+def with_etag(response, etag):
+    response['ETag'] = etag
+    # Browsers may keep the body but must revalidate before every reuse
+    response['Cache-Control'] = 'private, no-cache'
+    return response
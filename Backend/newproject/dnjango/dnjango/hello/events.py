@@ -0,0 +1,173 @@
+"""
+Push notifications to applicants over Server-Sent Events.
+
+Save hooks (``hello.signals``) and bulk updates publish small
+``{user, event, id}`` notices when an admin replies to a message or an
+application changes status.
+
+On PostgreSQL a notice is a ``pg_notify`` in the writer's own transaction,
+so it is only delivered once the change is committed, and it reaches every
+worker. Each ASGI worker holds a single LISTEN connection and fans notices
+out to its subscribers, however many there are. Other databases (tests,
+local development) deliver in-process after commit instead.
+
+Subscribers are asyncio queues, one per open ``/api/events/<user_id>/``
+stream. The stream loads and serializes the referenced row itself, so a
+notice only carries ids. Bulk updates pack theirs into as few payloads as
+the 8000 byte NOTIFY limit allows and send them all in one query.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'hello_events'
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD = 7900
+
+
+class Subscription:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+        # Set when the client fell too far behind; the stream then ends and
+        # the client reconnects and catches up with ?since=
+        self.overflowed = False
+
+    def deliver(self, notice):
+        try:
+            self.queue.put_nowait(notice)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """Next notice, or None after ``timeout`` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    """Fan-out of notices to the subscriptions of this process."""
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self.lock:
+            self.subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.user_id, None)
+
+    def dispatch(self, notice):
+        """Hand ``notice`` to its user's subscriptions; safe from any thread."""
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(notice['user'], ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, notice)
+
+    def count(self):
+        with self.lock:
+            return sum(len(subscriptions) for subscriptions in self.subscriptions.values())
+
+
+broker = Broker()
+
+
+def uses_notify(alias='default'):
+    return connections[alias].vendor == 'postgresql'
+
+
+def notices(payload):
+    """Expand one NOTIFY payload, ``{event, items: [[user, id], ...]}``."""
+    return [{'user': user_id, 'event': payload['event'], 'id': pk} for user_id, pk in payload['items']]
+
+
+def pack(event, items):
+    """Split ``items`` into as few payloads as fit the NOTIFY size limit."""
+    payloads, batch, size = [], [], 0
+    for user_id, pk in items:
+        item = [user_id, pk]
+        item_size = len(json.dumps(item, separators=(',', ':'))) + 1
+        if batch and size + item_size > MAX_PAYLOAD:
+            payloads.append(json.dumps({'event': event, 'items': batch}, separators=(',', ':')))
+            batch, size = [], 0
+        batch.append(item)
+        size += item_size
+    if batch:
+        payloads.append(json.dumps({'event': event, 'items': batch}, separators=(',', ':')))
+    return payloads
+
+
+def publish_many(event, items, using='default'):
+    """Notify each ``(user_id, pk)`` in ``items`` of ``event`` with one query."""
+    items = list(items)
+    if not items:
+        return
+    if uses_notify(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                           [CHANNEL, pack(event, items)])
+    else:
+        payload = {'event': event, 'items': items}
+        transaction.on_commit(lambda: [broker.dispatch(notice) for notice in notices(payload)], using=using)
+
+
+def publish(user_id, event, pk, using='default'):
+    publish_many(event, [(user_id, pk)], using)
+
+
+class Listener:
+    """The worker's LISTEN connection, started with its first subscriber."""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self.task = None
+
+    def ensure_started(self):
+        if not uses_notify(self.alias):
+            return
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.listen())
+
+    def conninfo(self):
+        from psycopg.conninfo import make_conninfo
+
+        params = connections[self.alias].settings_dict
+        return make_conninfo(
+            dbname=params['NAME'], user=params['USER'], password=params['PASSWORD'],
+            host=params['HOST'], port=params['PORT'],
+        )
+
+    async def listen(self):
+        import psycopg
+
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.conninfo(), autocommit=True) as conn:
+                    await conn.execute(f'LISTEN {CHANNEL}')
+                    async for notify in conn.notifies():
+                        for notice in notices(json.loads(notify.payload)):
+                            broker.dispatch(notice)
+            except psycopg.Error:
+                logger.warning('LISTEN connection lost, reconnecting', exc_info=True)
+                await asyncio.sleep(settings.EVENTS_RECONNECT_DELAY)
+
+
+listener = Listener()
@@ -0,0 +1,268 @@
+"""
+Streaming applicant exports for HR reporting.
+
+One row per applicant and application, or one row with empty application
+columns for applicants who never applied. Each row shows which documents
+were uploaded. Rows come from a single ``values_list`` query read through
+a server-side cursor (``.iterator(chunk_size=EXPORT_CHUNK_SIZE)``) and are
+written out as they arrive. Worker memory therefore stays flat however many
+rows there are, and the first bytes leave before the query has finished.
+
+XLSX is written by hand as a zip streamed with data descriptors, so it
+needs no spreadsheet library and does not buffer the whole workbook either.
+
+Applicants choose their names, emails and job titles, and HR opens these
+files in a spreadsheet. So nothing they typed may be read as a formula. XLSX
+cells are inline strings, which are never evaluated. In CSV, text starting
+with a formula character is prefixed with ``'``, so ``+255...`` phone
+numbers show as ``'+255...``.
+"""
+import csv
+import re
+import zipfile
+from datetime import datetime, time, timedelta
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_safe
+
+from .models import User, UserDocument, JobApplication
+
+COLUMNS = [
+    ('User ID', 'id'),
+    ('First name', 'first_name'),
+    ('Middle name', 'middle_name'),
+    ('Last name', 'last_name'),
+    ('Email', 'email'),
+    ('Phone number', 'phone_number'),
+    ('ID number', 'id_number'),
+    ('Gender', 'gender'),
+    ('Marital status', 'marital_status'),
+    ('Registered', 'registration_date'),
+    ('Active', 'is_active'),
+    *[(label, f'has_{document_type}') for document_type, label in UserDocument.DOCUMENT_TYPES],
+    ('Application ID', 'applications__id'),
+    ('Job title', 'applications__job_title'),
+    ('Application status', 'applications__status'),
+    ('Applied', 'applications__application_date'),
+]
+
+# Excel stops at 1,048,576 rows per sheet; longer exports continue on another
+XLSX_MAX_ROWS = 1048575
+
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Leading characters that make a spreadsheet read a CSV cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+def applicant_rows(users=None, **application_filters):
+    """Export rows for ``users`` (default: everyone), as tuples in COLUMNS order.
+
+    ``application_filters`` are lookups on JobApplication (e.g. ``status``),
+    which limit the export to applicants with matching applications and list
+    only those applications.
+    """
+    users = User.objects.all() if users is None else users
+    if application_filters:
+        users = users.filter(**{f'applications__{lookup}': value for lookup, value in application_filters.items()})
+    users = users.annotate(**{
+        f'has_{document_type}': Exists(UserDocument.objects.filter(user=OuterRef('pk'), document_type=document_type))
+        for document_type, _ in UserDocument.DOCUMENT_TYPES
+    })
+    rows = users.order_by('id', 'applications__id').values_list(*[field for _, field in COLUMNS])
+    return rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def start_of_day(value):
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def export_filters(params):
+    """Queryset arguments for the ?status=&job_title=&registered_after=&registered_before= filters."""
+    user_filters, application_filters = {}, {}
+    for param in ('registered_after', 'registered_before'):
+        if params.get(param):
+            value = parse_date(params[param])
+            if value is None:
+                raise ExportFilterError(f'{param} must be a date (YYYY-MM-DD)')
+            # Whole local days, as bounds the registration_date index can use
+            if param == 'registered_after':
+                user_filters['registration_date__gte'] = start_of_day(value)
+            else:
+                user_filters['registration_date__lt'] = start_of_day(value + timedelta(days=1))
+    if params.get('status'):
+        if params['status'] not in dict(JobApplication.STATUS_CHOICES):
+            raise ExportFilterError(f"status must be one of {', '.join(dict(JobApplication.STATUS_CHOICES))}")
+        application_filters['status'] = params['status']
+    if params.get('job_title'):
+        application_filters['job_title__icontains'] = params['job_title']
+    return user_filters, application_filters
+
+
+def cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if hasattr(value, 'isoformat'):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.isoformat(sep=' ', timespec='seconds')
+    return str(value)
+
+
+def csv_cell(value):
+    text = cell_text(value)
+    if isinstance(value, str) and text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+class Echo:
+    """File-like object that hands back what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([label for label, _ in COLUMNS])
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+class ZipSink:
+    """Unseekable sink for ZipFile; ``drain()`` returns what was written since."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def xlsx_row(values):
+    cells = ''.join(
+        f'<c t="inlineStr"><is><t>{escape(INVALID_XML_CHARS.sub("", cell_text(value)))}</t></is></c>'
+        for value in values
+    )
+    return f'<row>{cells}</row>'
+
+
+SHEET_START = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+SHEET_END = '</sheetData></worksheet>'
+
+
+def xlsx_package(sheets):
+    """The workbook parts that list ``sheets`` worksheets, written after them."""
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rels = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    package_rels = 'http://schemas.openxmlformats.org/package/2006/relationships'
+    sheet_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+    numbers = range(1, sheets + 1)
+    return {
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="{sheet_type}"/>' for n in numbers)
+            + '</Types>'
+        ),
+        '_rels/.rels': (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{package_rels}">'
+            f'<Relationship Id="rId1" Type="{rels}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+        ),
+        'xl/workbook.xml': (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><workbook xmlns="{main}" xmlns:r="{rels}"><sheets>'
+            + ''.join(f'<sheet name="Applicants {n}" sheetId="{n}" r:id="rId{n}"/>' for n in numbers)
+            + '</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{package_rels}">'
+            + ''.join(f'<Relationship Id="rId{n}" Type="{rels}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                      for n in numbers)
+            + '</Relationships>'
+        ),
+    }
+
+
+def xlsx_stream(rows):
+    sink = ZipSink()
+    header = xlsx_row([label for label, _ in COLUMNS])
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        sheets, sheet, sheet_rows = 0, None, XLSX_MAX_ROWS
+        for row in rows:
+            if sheet_rows == XLSX_MAX_ROWS:
+                if sheet is not None:
+                    sheet.write(SHEET_END.encode())
+                    sheet.close()
+                sheets += 1
+                sheet = workbook.open(f'xl/worksheets/sheet{sheets}.xml', 'w', force_zip64=True)
+                sheet.write((SHEET_START + header).encode())
+                sheet_rows = 0
+            sheet.write(xlsx_row(row).encode())
+            sheet_rows += 1
+            if sheet_rows % settings.EXPORT_CHUNK_SIZE == 0:
+                yield sink.drain()
+        if sheet is None:
+            sheets = 1
+            workbook.writestr('xl/worksheets/sheet1.xml', SHEET_START + header + SHEET_END)
+        else:
+            sheet.write(SHEET_END.encode())
+            sheet.close()
+        for name, content in xlsx_package(sheets).items():
+            workbook.writestr(name, content)
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8'),
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def export_response(rows, export_format='csv', filename='applicants'):
+    stream, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    stamp = timezone.localtime().strftime('%Y%m%d-%H%M')
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{stamp}.{export_format}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_safe
+def export_applicants(request):
+    """GET /api/exports/applicants/?format=csv|xlsx, staff only."""
+    if not getattr(request.user, 'is_staff', False):
+        return JsonResponse({'success': False, 'message': 'Staff access required'}, status=403)
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'success': False, 'message': f"format must be one of {', '.join(EXPORT_FORMATS)}"}, status=400)
+    try:
+        user_filters, application_filters = export_filters(request.GET)
+    except ExportFilterError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    rows = applicant_rows(User.objects.filter(**user_filters), **application_filters)
+    return export_response(rows, export_format)
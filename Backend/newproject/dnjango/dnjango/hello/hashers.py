@@ -0,0 +1,151 @@
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+LEGACY_SHA256_RE = re.compile(r'[0-9a-f]{64}')
+
+
+class TunableHasherMixin:
+    """Take work factors (iterations, time_cost, work_factor, ...) from
+    ``settings.PASSWORD_HASH_COST[algorithm]`` so each deployment can size them."""
+
+    def __init__(self):
+        for attr, value in settings.PASSWORD_HASH_COST.get(self.algorithm, {}).items():
+            setattr(self, attr, value)
+
+
+class PBKDF2PasswordHasher(TunableHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class Argon2PasswordHasher(TunableHasherMixin, hashers.Argon2PasswordHasher):
+    pass
+
+
+class ScryptPasswordHasher(TunableHasherMixin, hashers.ScryptPasswordHasher):
+    pass
+
+
+class UnsaltedSHA256PasswordHasher(hashers.BasePasswordHasher):
+    """
+    The bare hex SHA-256 digests written by the original User.set_password.
+    Verify-only: rows are rehashed with the preferred hasher on the next
+    successful login.
+    """
+
+    algorithm = 'unsalted_sha256'
+
+    def salt(self):
+        return ''
+
+    def encode(self, password, salt):
+        if salt != '':
+            raise ValueError('salt must be empty.')
+        hash = hashlib.sha256(password.encode()).hexdigest()
+        return '%s$$%s' % (self.algorithm, hash)
+
+    def decode(self, encoded):
+        algorithm, salt, hash = encoded.split('$', 2)
+        assert algorithm == self.algorithm
+        return {
+            'algorithm': algorithm,
+            'hash': hash,
+            'salt': None,
+        }
+
+    def verify(self, password, encoded):
+        encoded_2 = self.encode(password, '')
+        return constant_time_compare(encoded, encoded_2)
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            _('algorithm'): decoded['algorithm'],
+            _('hash'): hashers.mask_hash(decoded['hash']),
+        }
+
+    def harden_runtime(self, password, encoded):
+        pass
+
+
+def tag_legacy_hash(encoded):
+    """Tag a bare legacy SHA-256 digest so Django can identify its hasher."""
+    if LEGACY_SHA256_RE.fullmatch(encoded or ''):
+        return '%s$$%s' % (UnsaltedSHA256PasswordHasher.algorithm, encoded)
+    return encoded
+
+
+def verify_and_rehash(password, encoded):
+    """``(is_correct, new_encoded)``: new_encoded is a fresh hash of a correct
+    password whose stored hash is legacy or under cost, else None. One pool
+    job, so an upgrade never needs a second slot."""
+    is_correct, must_update = hashers.verify_password(password, encoded)
+    return is_correct, hashers.make_password(password) if is_correct and must_update else None
+
+
+class HashingPoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    """
+    Bounded pool for password hashing. PBKDF2/scrypt (OpenSSL) and argon2
+    (cffi) release the GIL, so a thread pool caps hashing at ``workers``
+    cores and leaves the rest for cheap endpoints. At most ``max_queue`` jobs
+    may wait for a worker; beyond that submit() raises HashingPoolSaturated
+    and the view answers 503 instead of piling up requests.
+    """
+
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hashing') if workers else None
+        self.slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+
+    def submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingPoolSaturated('Too many concurrent password operations')
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda future: self.slots.release())
+        return future
+
+    def run(self, fn, *args):
+        if not self.executor:
+            return fn(*args)
+        return self.submit(fn, *args).result()
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_MAX_QUEUE)
+    return _pool
+
+
+def configure_hashing_pool(workers, max_queue):
+    """Replace the process-wide pool (workers=0 hashes inline on the request thread)."""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, HashingPool(workers, max_queue)
+    if old:
+        old.shutdown()
+    return _pool
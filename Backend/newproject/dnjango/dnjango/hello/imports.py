@@ -0,0 +1,327 @@
+"""
+Bulk applicant import from partner CSV / NDJSON files.
+
+Rows go through three stages:
+
+1. Field checks run in Python while the file is read: required fields,
+   choices, email and date formats, and column lengths.
+2. Rows that pass are loaded into a staging table. On PostgreSQL this is a
+   temporary table filled with COPY. Duplicates inside the file and rows
+   that clash with an existing email / id_number are then rejected with a
+   couple of set-based UPDATEs.
+3. Users, their documents and their job application are created by one
+   INSERT ... SELECT merge.
+
+The merge also uses ON CONFLICT DO NOTHING, so a registration racing the
+import loses nothing; the row it beat is reported instead. Other databases
+run the same stages with bulk ORM queries, one batch at a time.
+
+Imported applicants get an unusable password, as make_password(None) would
+give, from ``unusable_password()`` on both paths. They cannot log in until
+an administrator sets a password for them (``User.set_password``); the API
+has no reset flow, and registering again fails on the taken email. Document,
+CV and cover letter columns hold names of files already in media storage.
+"""
+import csv
+import io
+import json
+import secrets
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connections, transaction
+
+from .models import User, UserDocument, JobApplication
+from .tasks import enqueue_many
+
+USER_FIELDS = [
+    'first_name', 'middle_name', 'last_name', 'date_of_birth', 'phone_number', 'email',
+    'gender', 'id_number', 'marital_status', 'form_four_number',
+]
+DOCUMENT_FIELDS = [document_type for document_type, _ in UserDocument.DOCUMENT_TYPES]
+APPLICATION_FIELDS = ['job_title', 'cv', 'cover_letter']
+FIELDS = USER_FIELDS + DOCUMENT_FIELDS + APPLICATION_FIELDS
+
+REQUIRED = ['first_name', 'last_name', 'date_of_birth', 'phone_number', 'email', 'gender',
+            'id_number', 'marital_status', 'form_four_number']
+CHOICES = {
+    'gender': dict(User.GENDER_CHOICES),
+    'marital_status': dict(User.MARITAL_STATUS_CHOICES),
+}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.users = self.documents = self.applications = 0
+        self.rejected = []  # (line, reason)
+
+    def reject(self, line, reason):
+        self.rejected.append((line, reason))
+
+    def write_rejected(self, stream):
+        writer = csv.writer(stream)
+        writer.writerow(['line', 'reason'])
+        writer.writerows(self.rejected)
+
+    def summary(self):
+        return (f'{self.users} applicants, {self.documents} documents and {self.applications} '
+                f'applications imported; {len(self.rejected)} rows rejected')
+
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+def guess_format(filename):
+    for extension, file_format in FORMATS.items():
+        if filename.lower().endswith(extension):
+            return file_format
+    raise ImportFormatError(f"Cannot tell the format of {filename!r}; use one of {', '.join(FORMATS)}")
+
+
+def read_rows(stream, file_format):
+    """``(line, dict)`` pairs from a binary CSV or NDJSON stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        missing = set(REQUIRED) - set(reader.fieldnames or ())
+        if missing:
+            raise ImportFormatError(f"CSV header is missing {', '.join(sorted(missing))}")
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'ndjson':
+        for line, raw in enumerate(text, 1):
+            if raw.strip():
+                try:
+                    row = json.loads(raw)
+                except ValueError:
+                    row = None
+                yield line, row if isinstance(row, dict) else None
+    else:
+        raise ImportFormatError(f'Unknown format {file_format!r}')
+
+
+def max_lengths():
+    lengths = {}
+    for model, names in ((User, USER_FIELDS), (UserDocument, ['file']), (JobApplication, APPLICATION_FIELDS)):
+        for name in names:
+            lengths[name] = model._meta.get_field(name).max_length
+    for name in DOCUMENT_FIELDS:
+        lengths[name] = lengths['file']
+    return lengths
+
+
+def clean_row(row, lengths):
+    """The row as a tuple in FIELDS order, or raise ValidationError with the reason."""
+    if row is None:
+        raise ValidationError('not a JSON object')
+    values = {name: str(row.get(name) or '').strip() for name in FIELDS}
+    for name in REQUIRED:
+        if not values[name]:
+            raise ValidationError(f'{name} is required')
+    for name, choices in CHOICES.items():
+        if values[name] not in choices:
+            raise ValidationError(f'{name} must be one of {", ".join(choices)}')
+    validate_email(values['email'])
+    try:
+        values['date_of_birth'] = date.fromisoformat(values['date_of_birth']).isoformat()
+    except ValueError:
+        raise ValidationError('date_of_birth must be YYYY-MM-DD')
+    for name, value in values.items():
+        if lengths[name] and len(value) > lengths[name]:
+            raise ValidationError(f'{name} is longer than {lengths[name]} characters')
+    if (values['cv'] or values['cover_letter']) and not values['job_title']:
+        raise ValidationError('cv / cover_letter given without job_title')
+    return tuple(values[name] for name in FIELDS)
+
+
+def clean_rows(rows, result):
+    lengths = max_lengths()
+    for line, row in rows:
+        try:
+            yield (line, *clean_row(row, lengths))
+        except ValidationError as e:
+            result.reject(line, '; '.join(e.messages))
+
+
+def import_applicants(stream, file_format='csv', using='default'):
+    """Import applicants from ``stream``; returns an ImportResult."""
+    result = ImportResult()
+    rows = clean_rows(read_rows(stream, file_format), result)
+    with transaction.atomic(using=using):
+        if connections[using].vendor == 'postgresql':
+            created = PostgresImport(using).run(rows, result)
+        else:
+            created = BatchImport(using).run(rows, result)
+        document_ids, application_ids = created
+        batch = settings.IMPORT_PREVIEW_BATCH
+        enqueue_many(
+            [('generate_previews', {'model': 'hello.UserDocument', 'ids': document_ids[start:start + batch]})
+             for start in range(0, len(document_ids), batch)]
+            + [('generate_previews', {'model': 'hello.JobApplication', 'ids': application_ids[start:start + batch]})
+               for start in range(0, len(application_ids), batch)]
+        )
+    result.rejected.sort()
+    return result
+
+
+def unusable_password():
+    # Same shape as make_password(None), minus its per-character secrets.choice()
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(30)
+
+
+DUPLICATE_IN_FILE = 'duplicate {field} (line {line})'
+ALREADY_REGISTERED = '{field} already registered'
+
+
+class PostgresImport:
+    """COPY into a temporary staging table, reject in sets, merge once."""
+
+    def __init__(self, using):
+        self.using = using
+
+    def run(self, rows, result):
+        with connections[self.using].cursor() as cursor:
+            columns = ', '.join(f'{name} text' for name in FIELDS)
+            # Room for the staging sorts and hashes to stay in memory
+            cursor.execute("SET LOCAL work_mem = '64MB'")
+            cursor.execute('DROP TABLE IF EXISTS import_staging')
+            cursor.execute(f'CREATE TEMPORARY TABLE import_staging (line integer, {columns}, password text, '
+                           'error text) ON COMMIT DROP')
+            with cursor.cursor.copy(f"COPY import_staging (line, {', '.join(FIELDS)}, password) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row((*row, unusable_password()))
+            cursor.execute('CREATE INDEX ON import_staging (email)')
+            cursor.execute('CREATE INDEX ON import_staging (id_number)')
+            cursor.execute('ANALYZE import_staging')
+
+            for field in ('email', 'id_number'):
+                cursor.execute(f"""
+                    UPDATE import_staging s
+                    SET error = format(%s, earliest.line)
+                    FROM (SELECT {field}, min(line) AS line FROM import_staging
+                          WHERE error IS NULL GROUP BY {field}) earliest
+                    WHERE s.error IS NULL AND s.{field} = earliest.{field} AND s.line <> earliest.line
+                """, [DUPLICATE_IN_FILE.format(field=field, line='%s')])
+                cursor.execute(f"""
+                    UPDATE import_staging s SET error = %s
+                    FROM users u WHERE s.error IS NULL AND u.{field} = s.{field}
+                """, [ALREADY_REGISTERED.format(field=field)])
+
+            documents = ', '.join(f"('{name}', s.{name})" for name in DOCUMENT_FIELDS)
+            cursor.execute(f"""
+                WITH new_users AS (
+                    INSERT INTO users ({', '.join(USER_FIELDS)}, password, registration_date, is_active)
+                    SELECT first_name, nullif(middle_name, ''), last_name, date_of_birth::date, phone_number,
+                           email, gender, id_number, marital_status, form_four_number,
+                           password, now(), true
+                    FROM import_staging s WHERE s.error IS NULL ORDER BY s.line
+                    ON CONFLICT DO NOTHING
+                    RETURNING id, email
+                ), staged AS (
+                    SELECT u.id AS user_id, s.* FROM new_users u JOIN import_staging s ON s.email = u.email AND s.error IS NULL
+                ), new_documents AS (
+                    INSERT INTO user_documents (user_id, document_type, file, uploaded_at)
+                    SELECT s.user_id, d.document_type, d.file, now()
+                    FROM staged s CROSS JOIN LATERAL (VALUES {documents}) AS d (document_type, file)
+                    WHERE d.file <> ''
+                    RETURNING id
+                ), new_applications AS (
+                    INSERT INTO job_applications (user_id, job_title, cv, cover_letter, status, application_date)
+                    SELECT s.user_id, s.job_title, s.cv, s.cover_letter, 'pending', now()
+                    FROM staged s WHERE s.job_title <> ''
+                    RETURNING id
+                )
+                SELECT 'user', count(*) FROM new_users
+                UNION ALL SELECT 'document', id FROM new_documents
+                UNION ALL SELECT 'application', id FROM new_applications
+                UNION ALL SELECT 'raced', line FROM import_staging s
+                    WHERE s.error IS NULL AND NOT EXISTS (SELECT 1 FROM new_users u WHERE u.email = s.email)
+            """)
+            document_ids, application_ids = [], []
+            for kind, value in cursor.fetchall():
+                if kind == 'user':
+                    result.users = value
+                elif kind == 'document':
+                    document_ids.append(value)
+                elif kind == 'application':
+                    application_ids.append(value)
+                else:
+                    result.reject(value, 'email or id_number already registered')
+
+            cursor.execute('SELECT line, error FROM import_staging WHERE error IS NOT NULL')
+            for line, error in cursor.fetchall():
+                result.reject(line, error)
+        result.documents, result.applications = len(document_ids), len(application_ids)
+        return document_ids, application_ids
+
+
+class BatchImport:
+    """The same stages with bulk ORM queries, IMPORT_BATCH_SIZE rows at a time."""
+
+    def __init__(self, using):
+        self.using = using
+        self.seen = {'email': {}, 'id_number': {}}
+
+    def run(self, rows, result):
+        document_ids, application_ids = [], []
+        batch = []
+        for row in rows:
+            batch.append(dict(zip(['line', *FIELDS], row)))
+            if len(batch) == settings.IMPORT_BATCH_SIZE:
+                self.merge(batch, result, document_ids, application_ids)
+                batch = []
+        if batch:
+            self.merge(batch, result, document_ids, application_ids)
+        return document_ids, application_ids
+
+    def merge(self, batch, result, document_ids, application_ids):
+        accepted = []
+        for row in batch:
+            for field in ('email', 'id_number'):
+                if row[field] in self.seen[field]:
+                    first = self.seen[field][row[field]]
+                    result.reject(row['line'], DUPLICATE_IN_FILE.format(field=field, line=first))
+                    break
+            else:
+                self.seen['email'][row['email']] = self.seen['id_number'][row['id_number']] = row['line']
+                row['middle_name'] = row['middle_name'] or None
+                accepted.append(row)
+
+        users = User.objects.using(self.using)
+        taken = {
+            'email': set(users.filter(email__in=[row['email'] for row in accepted]).values_list('email', flat=True)),
+            'id_number': set(users.filter(id_number__in=[row['id_number'] for row in accepted])
+                             .values_list('id_number', flat=True)),
+        }
+        new_rows = []
+        for row in accepted:
+            field = next((field for field in ('email', 'id_number') if row[field] in taken[field]), None)
+            if field:
+                result.reject(row['line'], ALREADY_REGISTERED.format(field=field))
+            else:
+                new_rows.append(row)
+
+        new_users = User.objects.using(self.using).bulk_create([
+            User(**{name: row[name] for name in USER_FIELDS}, password=unusable_password())
+            for row in new_rows
+        ])
+        documents = UserDocument.objects.using(self.using).bulk_create([
+            UserDocument(user=user, document_type=name, file=row[name])
+            for user, row in zip(new_users, new_rows) for name in DOCUMENT_FIELDS if row[name]
+        ])
+        applications = JobApplication.objects.using(self.using).bulk_create([
+            JobApplication(user=user, job_title=row['job_title'], cv=row['cv'], cover_letter=row['cover_letter'])
+            for user, row in zip(new_users, new_rows) if row['job_title']
+        ])
+        result.users += len(new_users)
+        result.documents += len(documents)
+        result.applications += len(applications)
+        document_ids += [document.id for document in documents]
+        application_ids += [application.id for application in applications]
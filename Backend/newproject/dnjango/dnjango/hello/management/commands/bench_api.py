@@ -0,0 +1,321 @@
+import itertools
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import date, timedelta
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from hello import metrics
+from hello.benchmarks import benchmark_database, benchmark_media, cheap_hashing, percentile, summarize
+from hello.models import User, JobApplication
+from hello.synthetic import FIRST_NAMES, JOB_TITLES, LAST_NAMES, PASSWORD, PDF, generate
+from hello.tokens import issue_tokens
+
+EXPORT_DAYS = 730
+EXPORT_END = date(2025, 1, 1)
+
+
+def pdf(name):
+    return SimpleUploadedFile(name, PDF, content_type='application/pdf')
+
+
+class Context:
+    """What the scenarios pick their users, tokens and rows from."""
+
+    def __init__(self, user_ids, application_ids, prefix):
+        self.user_ids, self.application_ids, self.prefix = user_ids, application_ids, prefix
+        # Tokens for the submit / refresh scenarios; logout only revokes users outside this pool
+        pool = user_ids[:200]
+        self.tokens = [issue_tokens(user) for user in User.objects.filter(pk__in=pool)]
+        self.logout_ids = user_ids[200:] or user_ids
+        self.run_id = uuid.uuid4().hex[:6]
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def unique(self):
+        with self.lock:
+            return next(self.counter)
+
+    def bearer(self, rng):
+        return {'Authorization': f"Bearer {rng.choice(self.tokens)['access']}"}
+
+
+# Each scenario returns (method, path, client kwargs, expected statuses).
+# Building the request (files, tokens) is not part of the timed call.
+
+def home(ctx, rng):
+    return 'get', '/api/', {}, {200}
+
+
+def register_user(ctx, rng):
+    n = ctx.unique()
+    data = {
+        'firstName': rng.choice(FIRST_NAMES), 'lastName': rng.choice(LAST_NAMES), 'dateOfBirth': '1995-05-05',
+        'phoneNumber': '0700000000', 'email': f'bench-{ctx.run_id}-{n}@example.com', 'gender': 'female',
+        'idNumber': f'B{ctx.run_id}{n:09d}', 'maritalStatus': 'single', 'formFourNumber': 'S0001/0001/2012',
+        'password': PASSWORD, 'confirmPassword': PASSWORD, 'passportPhoto': pdf('photo.pdf'),
+        'birthCertificate': pdf('birth.pdf'), 'educationCertificate': pdf('education.pdf'),
+    }
+    return 'post', '/api/register/', {'data': data}, {201}
+
+
+def login_user(ctx, rng):
+    user_id = rng.choice(ctx.user_ids)
+    email = User.objects.values_list('email', flat=True).get(pk=user_id)
+    return 'post', '/api/login/', {'data': {'email': email, 'password': PASSWORD},
+                                   'content_type': 'application/json'}, {200}
+
+
+def refresh_tokens(ctx, rng):
+    return 'post', '/api/token/refresh/', {'data': {'refresh': rng.choice(ctx.tokens)['refresh']},
+                                          'content_type': 'application/json'}, {200}
+
+
+def logout_user(ctx, rng):
+    user = User.objects.only('id', 'is_active', 'token_version').get(pk=rng.choice(ctx.logout_ids))
+    return 'post', '/api/logout/', {'headers': {'Authorization': f"Bearer {issue_tokens(user)['access']}"}}, {200}
+
+
+def get_user_profile(ctx, rng):
+    return 'get', f'/api/profile/{rng.choice(ctx.user_ids)}/', {}, {200}
+
+
+def submit_job_application(ctx, rng):
+    data = {'job_title': rng.choice(JOB_TITLES), 'cv': pdf('cv.pdf'), 'cover_letter': pdf('letter.pdf')}
+    return 'post', '/api/apply-job/', {'data': data, 'headers': ctx.bearer(rng)}, {201}
+
+
+def export_applicants(ctx, rng):
+    day = EXPORT_END - timedelta(days=rng.randrange(1, EXPORT_DAYS))
+    return 'get', f'/api/exports/applicants/?format=csv&registered_after={day}&registered_before={day}', {}, {200}
+
+
+def bulk_update_application_status(ctx, rng):
+    ids = rng.sample(ctx.application_ids, min(20, len(ctx.application_ids)))
+    return 'post', '/api/applications/bulk-status/', {
+        'data': {'ids': ids, 'status': rng.choice(['reviewed', 'rejected'])}, 'content_type': 'application/json',
+    }, {200}
+
+
+def submit_user_message(ctx, rng):
+    data = {'message': 'Is the position still open?'}
+    if rng.random() < 0.2:
+        data['file'] = pdf('attachment.pdf')
+    return 'post', '/api/messages/', {'data': data, 'headers': ctx.bearer(rng)}, {201}
+
+
+def get_user_messages(ctx, rng):
+    return 'get', f'/api/messages/{rng.choice(ctx.user_ids)}/', {}, {200}
+
+
+def search(ctx, rng):
+    target = rng.choice(['users', 'applications', 'messages'])
+    term = {
+        'users': lambda: rng.choice([rng.choice(LAST_NAMES), f'{ctx.prefix}{rng.randrange(len(ctx.user_ids))}@']),
+        'applications': lambda: rng.choice(JOB_TITLES).split()[0],
+        'messages': lambda: rng.choice(['CV', 'certificate', 'phone number', 'position']),
+    }[target]()
+    return 'get', f'/api/search/?q={term}&type={target}', {}, {200}
+
+
+def user_events(ctx, rng):
+    # Time to the first chunk of the stream: subscribing, not waiting for events
+    return 'sse', f'/api/events/{rng.choice(ctx.user_ids)}/', {}, {200}
+
+
+# URL name in hello/urls.py -> scenario; the view name is also what MetricsMiddleware records
+SCENARIOS = {fn.__name__: fn for fn in [
+    home, register_user, login_user, refresh_tokens, logout_user, get_user_profile, submit_job_application,
+    export_applicants, bulk_update_application_status, submit_user_message, get_user_messages, search,
+    user_events,
+]}
+STAFF_ONLY = {'export_applicants', 'bulk_update_application_status', 'search'}
+
+
+async def first_chunk(path):
+    response = await AsyncClient().get(path)
+    if response.streaming:
+        stream = response.streaming_content
+        await anext(aiter(stream))
+        await stream.aclose()
+    return response
+
+
+class Command(BaseCommand):
+    help = ('Drive every /api/ endpoint with concurrent clients and report throughput, p50/p95/p99 '
+            'latency and SQL statements per request, optionally saved as JSON and compared with an '
+            'earlier run. Runs on throwaway databases seeded with synthetic data, or with --existing '
+            'on the configured database after `manage.py generate_data`. --existing writes to it. '
+            'SQLite lets one writer in at a time, so there concurrent writes fail as "database is locked".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoints', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads per endpoint')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration per endpoint')
+        parser.add_argument('--users', type=int, default=2000, help='Synthetic users for the throwaway database')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--existing', action='store_true', help='Use the configured database as it is')
+        parser.add_argument('--prefix', default='synthetic', help='generate_data --prefix of the users to use')
+        parser.add_argument('--cheap-hashing', action='store_true',
+                            help='Low PBKDF2 cost, so login and registration measure the application, not the hash')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Earlier --output file to compare with')
+        parser.add_argument('--tolerance', type=float, default=10.0,
+                            help='Percent by which p99 may grow or throughput drop before it counts as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        no_limits = dict.fromkeys(settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'])
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(
+                REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': no_limits},
+                METRICS_SLOW_REQUEST=None,
+            ))
+            if options['cheap_hashing']:
+                stack.enter_context(cheap_hashing())
+            if not options['existing']:
+                stack.enter_context(benchmark_database())
+                stack.enter_context(benchmark_media())
+                self.stderr.write(f"Generating {options['users']} users...")
+                generate(options['users'], seed=options['seed'], prefix=options['prefix'])
+            ctx = self.context(options)
+            staff = self.staff_user()
+            results = {}
+            for name in options['endpoints']:
+                results[name] = self.run_endpoint(name, ctx, staff, options)
+                self.report(name, results[name])
+            run = {'meta': self.meta(options), 'results': results}
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(run, f, indent=2)
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = self.compare(baseline, run, options['tolerance'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"Regressions in: {', '.join(regressions)}")
+
+    def context(self, options):
+        active = User.objects.filter(email__startswith=options['prefix'], is_active=True)
+        user_ids = list(active.order_by('id').values_list('id', flat=True)[:100_000])
+        if not user_ids:
+            raise CommandError(f"No active users with prefix {options['prefix']!r}; run generate_data first")
+        application_ids = list(JobApplication.objects.order_by('id').values_list('id', flat=True)[:100_000])
+        return Context(user_ids, application_ids, options['prefix'])
+
+    def staff_user(self):
+        staff, _ = get_user_model().objects.get_or_create(
+            username='bench-staff', defaults={'is_staff': True, 'is_superuser': True},
+        )
+        return staff
+
+    def run_endpoint(self, name, ctx, staff, options):
+        scenario = SCENARIOS[name]
+        samples, statuses, errors, lock = [], {}, [], threading.Lock()
+        barrier = threading.Barrier(options['concurrency'] + 1)
+        metrics.reset_metrics()
+
+        def worker(index):
+            rng = random.Random(f"{options['seed']}-{name}-{index}")
+            client = Client()
+            if name in STAFF_ONLY:
+                client.force_login(staff)
+            try:
+                barrier.wait()
+                deadline = time.perf_counter() + options['seconds']
+                while time.perf_counter() < deadline:
+                    method, path, kwargs, expected = scenario(ctx, rng)
+                    started = time.perf_counter()
+                    if method == 'sse':
+                        # Not asyncio.run(): this keeps the view's database work, and its
+                        # connection, on this thread, where close_all() below reaches it
+                        response = async_to_sync(first_chunk)(path)
+                    else:
+                        response = getattr(client, method)(path, **kwargs)
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - started
+                    outcome = response.status_code if response.status_code in expected else f'error {response.status_code}'
+                    with lock:
+                        samples.append(elapsed)
+                        statuses[outcome] = statuses.get(outcome, 0) + 1
+                        if outcome != response.status_code and not errors:
+                            errors.append(b''.join(response) if not response.streaming else b'')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        series = metrics.queries.series.get((name,))
+        return {
+            **summarize(samples),
+            'p999_ms': percentile(samples, 99.9) * 1000,
+            'requests_per_s': len(samples) / elapsed,
+            'errors': sum(count for outcome, count in statuses.items() if isinstance(outcome, str)),
+            'statuses': {str(outcome): count for outcome, count in sorted(statuses.items(), key=str)},
+            'queries_per_request': series[-1] / sum(series[:-1]) if series else None,
+            'first_error': errors[0][:500].decode(errors='replace') if errors else None,
+        }
+
+    def report(self, name, result):
+        queries = result['queries_per_request']
+        if result['first_error'] is not None:
+            self.stderr.write(f"{name}: first unexpected response: {result['first_error']}")
+        self.stdout.write(
+            f"{name:<32} {result['requests_per_s']:>8.1f} req/s  p50={result['p50_ms']:.1f}ms "
+            f"p95={result['p95_ms']:.1f}ms p99={result['p99_ms']:.1f}ms "
+            f"queries={'-' if queries is None else f'{queries:.1f}'} errors={result['errors']}"
+        )
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                    check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            **{key: options[key] for key in ('concurrency', 'seconds', 'users', 'seed', 'existing', 'cheap_hashing')},
+        }
+
+    def compare(self, baseline, run, tolerance):
+        self.stdout.write(f"\ncompared with {baseline['meta'].get('commit') or 'baseline'}:")
+        regressions = []
+        for name, result in run['results'].items():
+            before = baseline['results'].get(name)
+            if not before:
+                continue
+            p99 = (result['p99_ms'] / before['p99_ms'] - 1) * 100 if before['p99_ms'] else 0.0
+            throughput = (result['requests_per_s'] / before['requests_per_s'] - 1) * 100 if before['requests_per_s'] else 0.0
+            regressed = p99 > tolerance or throughput < -tolerance
+            if regressed:
+                regressions.append(name)
+            self.stdout.write(f"{name:<32} p99 {p99:+6.1f}%  throughput {throughput:+6.1f}%"
+                              f"{'  REGRESSION' if regressed else ''}")
+        return regressions
@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from hello.benchmarks import benchmark_database, create_user, summarize, timed
+
+MODES = ['none', 'persistent', 'pool']
+
+
+class Command(BaseCommand):
+    help = ('Compare DB_CONN_MODE=none/persistent/pool under concurrent load on /api/profile/: '
+            'per-request latency and database connections opened. Each mode runs in its own '
+            'process with the DB_* settings of this environment.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent WSGI worker threads')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per thread')
+        parser.add_argument('--json', action='store_true', help='One JSON object per mode instead of a table')
+        parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self.measure(options)))
+            return
+        if not options['json']:
+            self.stdout.write(f"database: {connection.vendor}, {options['threads']} threads x "
+                              f"{options['requests']} requests")
+            self.stdout.write(f"{'mode':<11} {'opened':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8}")
+        for mode in options['modes']:
+            if mode == 'pool' and connection.vendor != 'postgresql':
+                self.stderr.write('pool: skipped, connection pools need PostgreSQL')
+                continue
+            result = self.run_child(mode, options)
+            if options['json']:
+                self.stdout.write(json.dumps(result))
+            else:
+                self.stdout.write(
+                    f"{mode:<11} {result['connections_opened']:>7} {result['p50_ms']:>6.2f}ms "
+                    f"{result['p95_ms']:>6.2f}ms {result['p99_ms']:>6.2f}ms {result['requests_per_s']:>8.0f}"
+                )
+
+    def run_child(self, mode, options):
+        # DATABASES is built from the environment at import time, so each
+        # mode gets a fresh interpreter rather than patched settings
+        command = [
+            sys.executable, sys.argv[0], 'bench_connections', '--child',
+            '--threads', str(options['threads']), '--requests', str(options['requests']),
+        ]
+        child = subprocess.run(command, env={**os.environ, 'DB_CONN_MODE': mode},
+                               capture_output=True, text=True)
+        if child.returncode:
+            raise CommandError(f'{mode} run failed:\n{child.stderr}')
+        return json.loads(child.stdout.strip().splitlines()[-1])
+
+    def measure(self, options):
+        opened = []
+        connection_created.connect(lambda **kwargs: opened.append(1), weak=False)
+        # Every request reaches the database, as on a cold or shared cache
+        dummy_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with benchmark_database(), override_settings(CACHES=dummy_cache):
+            path = f'/api/profile/{create_user().id}/'
+            connections.close_all()
+            pool = connection.pool if settings.DB_CONN_MODE == 'pool' else None
+            if pool:
+                pool.open(wait=True)
+                pool.pop_stats()
+            opened.clear()
+
+            handler = WSGIHandler()
+            samples, failures, lock = [], [], threading.Lock()
+            barrier = threading.Barrier(options['threads'] + 1)
+            workers = [
+                threading.Thread(target=self.worker, args=(handler, path, options['requests'], samples, failures, lock, barrier))
+                for _ in range(options['threads'])
+            ]
+            for worker in workers:
+                worker.start()
+            barrier.wait()
+            started = time.perf_counter()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+
+            # A pooled checkout also fires connection_created, so ask the pool
+            # how many server connections it actually made
+            connections_opened = pool.get_stats().get('connections_num', 0) if pool else len(opened)
+            if pool:
+                connection.close_pool()
+        if failures:
+            raise CommandError(f'{len(failures)} requests failed, e.g. with {failures[0]}')
+        return {
+            'mode': settings.DB_CONN_MODE,
+            'vendor': connection.vendor,
+            'threads': options['threads'],
+            'requests': len(samples),
+            'connections_opened': connections_opened,
+            'requests_per_s': len(samples) / elapsed,
+            **summarize(samples),
+        }
+
+    def worker(self, handler, path, count, samples, failures, lock, barrier):
+        """Serve ``count`` requests the way a WSGI server thread does."""
+        environ = RequestFactory()._base_environ(PATH_INFO=path, REQUEST_METHOD='GET')
+        try:
+            barrier.wait()
+            for _ in range(count):
+                elapsed, status = timed(self.request, handler, environ)
+                with lock:
+                    samples.append(elapsed)
+                    if not status.startswith('200'):
+                        failures.append(status)
+        finally:
+            connections.close_all()
+
+    def request(self, handler, environ):
+        statuses = []
+        response = handler(dict(environ), lambda status, headers: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            # Fires request_finished, which closes or keeps the connection
+            response.close()
+        return statuses[0]
+
@@ -0,0 +1,36 @@
+import os
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Measure password verifications (i.e. logins) per second per core for each configured hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=2.0, help='Time budget per hasher')
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        self.stdout.write(f"{'hasher':<20} {'cost':<55} {'ms/login':>10} {'logins/s/core':>14} {'logins/s (x' + str(cores) + ')':>16}")
+        for hasher in get_hashers():
+            try:
+                encoded = hasher.encode('correct horse battery staple', hasher.salt())
+            except ValueError as e:
+                self.stdout.write(f'{hasher.algorithm:<20} skipped: {e}')
+                continue
+
+            count, started = 0, time.perf_counter()
+            while True:
+                hasher.verify('correct horse battery staple', encoded)
+                count += 1
+                elapsed = time.perf_counter() - started
+                if elapsed >= options['seconds']:
+                    break
+
+            rate = count / elapsed
+            cost = ', '.join(f'{k}={v}' for k, v in vars(hasher).items()) or '-'
+            self.stdout.write(
+                f'{hasher.algorithm:<20} {cost:<55} {1000 / rate:>10.2f} {rate:>14.1f} {rate * cores:>16.0f}'
+            )
@@ -0,0 +1,54 @@
+import csv
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from hello.benchmarks import benchmark_database
+from hello.imports import FIELDS, import_applicants
+from hello.models import User, UserDocument, JobApplication
+
+
+class Command(BaseCommand):
+    help = ('Measure import_applicants throughput (rows/s) on generated CSV files, '
+            'with a share of invalid and duplicate rows')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 100000])
+        parser.add_argument('--bad-every', type=int, default=50,
+                            help='Every Nth row is invalid and every Nth+1 a duplicate; 0 for none')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self.stdout.write(f'database: {connection.vendor}')
+            self.stdout.write(f"{'rows':>8} {'MiB':>6} {'seconds':>8} {'rows/s':>9} {'imported':>9} {'rejected':>9}")
+            for run, rows in enumerate(options['rows']):
+                data = self.generate(f'r{run}', rows, options['bad_every'])
+                started = time.perf_counter()
+                result = import_applicants(io.BytesIO(data), 'csv')
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{rows:>8} {len(data) / 2 ** 20:>6.1f} {elapsed:>8.2f} {rows / elapsed:>9.0f} '
+                                  f'{result.users:>9} {len(result.rejected):>9}')
+            self.stdout.write(f'totals: {User.objects.count()} users, {UserDocument.objects.count()} documents, '
+                              f'{JobApplication.objects.count()} applications')
+
+    def generate(self, key, rows, bad_every):
+        text = io.StringIO()
+        writer = csv.DictWriter(text, FIELDS)
+        writer.writeheader()
+        for i in range(rows):
+            row = {
+                'first_name': 'Bench', 'last_name': f'Import{i}', 'date_of_birth': '1990-01-01',
+                'phone_number': '0700000000', 'email': f'{key}-{i}@example.com', 'gender': 'other',
+                'id_number': f'IMP-{key}-{i}', 'marital_status': 'single', 'form_four_number': 'S0000/0000/2010',
+                'passport_photo': f'blobs/{i:040x}', 'birth_certificate': f'blobs/{i + 1:040x}',
+                'education_certificate': '', 'job_title': 'Field officer' if i % 2 else '',
+                'cv': 'blobs/cv' if i % 2 else '', 'cover_letter': '',
+            }
+            if bad_every and i % bad_every == 1:
+                row['date_of_birth'] = 'yesterday'
+            elif bad_every and i % bad_every == 2:
+                row['email'] = f'{key}-0@example.com'
+            writer.writerow(row)
+        return text.getvalue().encode()
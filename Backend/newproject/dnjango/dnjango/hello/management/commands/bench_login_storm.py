@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+
+from hello.benchmarks import benchmark_database, create_user, summarize, timed
+from hello.hashers import configure_hashing_pool
+
+
+class Command(BaseCommand):
+    help = 'Measure /api/profile/<id>/ latency before and during a concurrent login storm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each phase')
+        parser.add_argument('--storm-threads', type=int, default=32, help='Concurrent login clients')
+        parser.add_argument('--workers', type=int, default=settings.PASSWORD_HASHING_WORKERS,
+                            help='Hashing pool size (0 hashes inline on the request thread, i.e. unbounded)')
+        parser.add_argument('--max-queue', type=int, default=settings.PASSWORD_HASHING_MAX_QUEUE)
+
+    def handle(self, *args, **options):
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        pool = configure_hashing_pool(options['workers'], options['max_queue'])
+        try:
+            with benchmark_database():
+                user = create_user()
+                baseline = self.profile_latencies(user, options['seconds'])
+                storm, logins = self.during_storm(user, options)
+        finally:
+            pool.shutdown()
+
+        self.stdout.write(f"hashing pool: workers={options['workers']} max_queue={options['max_queue']}, "
+                          f"{options['storm_threads']} login threads")
+        for label, samples in (('profile, idle', baseline), ('profile, login storm', storm)):
+            stats = summarize(samples)
+            self.stdout.write(f"{label:<22} n={stats['count']:<6} p50={stats['p50_ms']:.1f}ms "
+                              f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms")
+        self.stdout.write('login responses: ' + ', '.join(f'{code}={n}' for code, n in sorted(logins.items())))
+
+    def profile_latencies(self, user, seconds):
+        client, samples = Client(), []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            elapsed, response = timed(client.get, f'/api/profile/{user.id}/')
+            assert response.status_code == 200, response.content
+            samples.append(elapsed)
+        return samples
+
+    def during_storm(self, user, options):
+        stop, logins, lock = threading.Event(), Counter(), threading.Lock()
+
+        def login_loop():
+            client = Client()
+            try:
+                while not stop.is_set():
+                    response = client.post('/api/login/', {'email': user.email, 'password': 'benchmark-password'},
+                                           content_type='application/json')
+                    with lock:
+                        logins[response.status_code] += 1
+                    if response.status_code == 503:
+                        # Well-behaved clients back off instead of hammering the endpoint
+                        time.sleep(0.1)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=login_loop) for _ in range(options['storm_threads'])]
+        for thread in threads:
+            thread.start()
+        try:
+            time.sleep(0.5)
+            return self.profile_latencies(user, options['seconds']), logins
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
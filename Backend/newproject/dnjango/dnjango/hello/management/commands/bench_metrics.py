@@ -0,0 +1,68 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import resolve
+
+from hello.benchmarks import benchmark_database
+from hello.metrics import MetricsMiddleware, reset_metrics
+
+
+class Command(BaseCommand):
+    help = ('Per-request cost of MetricsMiddleware, slow-request tracing included: the same handler '
+            'timed bare and wrapped, for several SQL statement counts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000, help='Requests per round and variant')
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--queries', type=int, nargs='+', default=[0, 1, 10])
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/api/profile/1/')
+        request.resolver_match = resolve('/api/profile/1/')
+        body = b'x' * 2048
+        results = []
+        with benchmark_database(), override_settings(METRICS_SLOW_REQUEST=60):
+            connection.ensure_connection()
+            for count in options['queries']:
+                def handler(request):
+                    with connection.cursor() as cursor:
+                        for _ in range(count):
+                            cursor.execute('SELECT 1')
+                    return HttpResponse(body)
+
+                wrapped = MetricsMiddleware(handler)
+                bare, measured = [], []
+                for _ in range(options['rounds']):
+                    # Interleaved, so drift in machine load hits both sides alike
+                    bare.append(self.per_call(handler, request, options['iterations']))
+                    measured.append(self.per_call(wrapped, request, options['iterations']))
+                # The fastest round is the one least disturbed by anything else
+                results.append({
+                    'queries': count,
+                    'bare_us': min(bare) * 1e6,
+                    'with_metrics_us': min(measured) * 1e6,
+                    'overhead_us': (min(measured) - min(bare)) * 1e6,
+                })
+        reset_metrics()
+
+        if options['json']:
+            for result in results:
+                self.stdout.write(json.dumps(result))
+            return
+        self.stdout.write(f'database: {connection.vendor}')
+        self.stdout.write(f"{'queries':>7} {'bare':>9} {'metrics':>9} {'overhead':>9}")
+        for result in results:
+            self.stdout.write(f"{result['queries']:>7} {result['bare_us']:>7.1f}us {result['with_metrics_us']:>7.1f}us "
+                              f"{result['overhead_us']:>7.1f}us")
+
+    def per_call(self, handler, request, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            handler(request)
+        return (time.perf_counter() - started) / iterations
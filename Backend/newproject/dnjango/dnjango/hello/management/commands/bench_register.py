@@ -0,0 +1,87 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.response import Response
+
+from hello.benchmarks import benchmark_database, benchmark_media, cheap_hashing, summarize, timed
+from hello.models import User, UserDocument
+from hello.serializers import UserRegistrationSerializer, UserSerializer
+from hello.views import register_user
+
+
+class LegacyRegistrationSerializer(UserRegistrationSerializer):
+    """Registration as it was before user-005: per-field unique validators,
+    one INSERT per document and no transaction."""
+
+    class Meta(UserRegistrationSerializer.Meta):
+        extra_kwargs = {}
+
+    def create(self, validated_data):
+        validated_data.pop('confirm_password')
+        documents = [
+            (document_type, validated_data.pop(document_type))
+            for document_type, _ in UserDocument.DOCUMENT_TYPES
+        ]
+        password = validated_data.pop('password')
+        user = User(**validated_data)
+        user.set_password(password)
+        user.save()
+        for document_type, file in documents:
+            UserDocument.objects.create(user=user, document_type=document_type, file=file)
+        return user
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def legacy_register_user(request):
+    if User.objects.filter(email=request.data.get('email')).exists():
+        return Response(status=400)
+    if User.objects.filter(id_number=request.data.get('id_number')).exists():
+        return Response(status=400)
+    serializer = LegacyRegistrationSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    user = serializer.save()
+    return Response({'user': UserSerializer(user).data}, status=201)
+
+
+class Command(BaseCommand):
+    help = 'Compare database round trips and latency of the legacy and current registration paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help='Registrations per path')
+
+    def handle(self, *args, **options):
+        with benchmark_database(), benchmark_media(), cheap_hashing():
+            factory = RequestFactory()
+            for label, view in (('legacy', legacy_register_user), ('current', register_user)):
+                samples, queries = [], 0
+                for i in range(options['count']):
+                    data = self.registration_data(f'{label}{i}')
+                    with CaptureQueriesContext(connection) as captured:
+                        elapsed, response = timed(view, factory.post('/api/register/', data))
+                    assert response.status_code == 201, response.data
+                    samples.append(elapsed)
+                    queries += len(captured)
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"{label:<8} queries/registration={queries / options['count']:.1f} "
+                    f"p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms "
+                    f"throughput={options['count'] / sum(samples):.0f}/s"
+                )
+
+    def registration_data(self, key):
+        return {
+            'first_name': 'Bench', 'last_name': 'Register', 'date_of_birth': '1990-01-01',
+            'phone_number': '0700000000', 'email': f'{key}@example.com', 'gender': 'other',
+            'id_number': f'ID-{key}', 'marital_status': 'single', 'form_four_number': 'S0000/0000/2010',
+            'password': 'benchmark-password', 'confirm_password': 'benchmark-password',
+            **{
+                document_type: SimpleUploadedFile(f'{document_type}.pdf', b'%PDF-1.4 benchmark',
+                                                  content_type='application/pdf')
+                for document_type, _ in UserDocument.DOCUMENT_TYPES
+            },
+        }
@@ -0,0 +1,79 @@
+import random
+from datetime import date
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from hello.benchmarks import benchmark_database, summarize, timed
+from hello.models import User
+from hello.search import SEARCH_TARGETS, full_text_supported, search_page
+
+FIRST_NAMES = ['Amina', 'Baraka', 'Neema', 'Juma', 'Zawadi', 'Halima', 'Rehema', 'Omari', 'Imani', 'Faraji']
+LAST_NAMES = ['Mwangi', 'Otieno', 'Kamau', 'Mollel', 'Njoroge', 'Wanjiru', 'Mushi', 'Kimaro', 'Swai', 'Achieng']
+
+
+def legacy_search(term):
+    """The admin search this replaces: OR'ed icontains over the user columns."""
+    fields = SEARCH_TARGETS['users'][1]
+    rows = User.objects.filter(reduce(or_, (Q(**{f'{field}__icontains': term}) for field in fields)))
+    return list(rows.values('id')[:20])
+
+
+def legacy_search_without_indexes(term):
+    # What the planner had before migration 0005: no index can serve LIKE '%term%'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_bitmapscan = off')
+        cursor.execute('SET LOCAL enable_indexscan = off')
+        return legacy_search(term)
+
+
+class Command(BaseCommand):
+    help = 'Compare /api/search/ latency with the old icontains scan on a synthetic applicant table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=200, help='Searches per path')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self.populate(options['users'], options['batch_size'])
+            rng = random.Random(0)
+            terms = [self.term(rng, options['users']) for _ in range(options['queries'])]
+
+            legacy = legacy_search_without_indexes if full_text_supported(connection.alias) else legacy_search
+            for label, fn in (('icontains scan', legacy), ('search', lambda term: search_page('users', term))):
+                samples = [timed(fn, term)[0] for term in terms]
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"{label:<15} p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms "
+                    f"p99={stats['p99_ms']:.2f}ms"
+                )
+
+    def populate(self, count, batch_size):
+        rng = random.Random(0)
+        self.stdout.write(f'Creating {count} users...')
+        for start in range(0, count, batch_size):
+            User.objects.bulk_create([
+                User(
+                    first_name=rng.choice(FIRST_NAMES), last_name=f'{rng.choice(LAST_NAMES)}{i}',
+                    date_of_birth=date(1990, 1, 1), phone_number=f'07{i:08d}', email=f'applicant{i}@example.com',
+                    gender='other', id_number=f'ID{i:09d}', marital_status='single',
+                    form_four_number=f'S{i % 10000:04d}/0001/2010', password='!',
+                )
+                for i in range(start, min(start + batch_size, count))
+            ])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE users')
+
+    def term(self, rng, count):
+        i = rng.randrange(count)
+        return rng.choice([
+            f'applicant{i}@',                                   # email fragment
+            f'ID{i:09d}',                                       # ID number
+            f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{i}',  # full name
+        ])
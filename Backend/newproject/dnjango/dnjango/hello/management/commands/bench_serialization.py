@@ -0,0 +1,151 @@
+import hashlib
+import json
+import random
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core import signing
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from hello import compression, synthetic
+from hello.benchmarks import benchmark_database, benchmark_media, percentile, timed
+from hello.cache import invalidate_user
+from hello.etags import payload_etag
+from hello.models import User, JobApplication, UserMessage
+from hello.pagination import keyset_page
+from hello.payloads import MESSAGES, build_profile
+from hello.renderers import FastJSONRenderer, orjson
+from hello.serializers import UserMessageSerializer, UserSerializer
+
+
+def json_etag(payload):
+    """The ETag hash before hello.renderers.dumps."""
+    return hashlib.sha1(json.dumps([payload], cls=JSONEncoder, sort_keys=True).encode()).hexdigest()
+
+
+class Command(BaseCommand):
+    help = ('Compare the serializer and values() read paths of /api/profile/ and /api/messages/ for one '
+            'user with a long history: payload build, rendering and ETag time, bytes on the wire '
+            'with gzip and Brotli, and whole requests')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='Messages of the measured user')
+        parser.add_argument('--applications', type=int, default=200)
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        results = {'orjson': orjson is not None, 'brotli': compression.brotli is not None}
+        with benchmark_database(), benchmark_media():
+            user = self.populate(options['messages'], options['applications'])
+            self.check_identical(user)
+            results['profile'] = self.compare(
+                options['iterations'],
+                lambda: UserSerializer(User.objects.with_profile().get(pk=user.id, is_active=True)).data,
+                lambda: build_profile(user.id),
+                lambda payload: {'success': True, 'user': payload},
+            )
+            page_size = settings.MESSAGES_MAX_PAGE_SIZE
+            messages = UserMessage.objects.filter(user=user)
+            results['messages_page'] = self.compare(
+                options['iterations'],
+                lambda: UserMessageSerializer(keyset_page(messages, '', page_size)[0], many=True).data,
+                lambda: MESSAGES.rows(keyset_page(MESSAGES.values(messages), '', page_size)[0]),
+                lambda payload: {'success': True, 'messages': payload},
+            )
+            results['requests'] = self.requests(user, options['iterations'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"orjson: {results['orjson']}, brotli: {results['brotli']}, "
+                          f"{options['messages']} messages, {options['applications']} applications")
+        for name in ('profile', 'messages_page'):
+            result = results[name]
+            for step in ('build', 'render', 'etag'):
+                before, after = result[f'{step}_before_us'], result[f'{step}_after_us']
+                self.stdout.write(f"{name:<14} {step:<7} {before:>9.1f}us -> {after:>9.1f}us  ({before / after:.1f}x)")
+            self.stdout.write(f"{name:<14} bytes   " + ', '.join(
+                f"{encoding}={result['bytes'][encoding]} ({result['compress_us'].get(encoding, 0):.0f}us)"
+                for encoding in result['bytes']))
+        for name, stats in results['requests'].items():
+            self.stdout.write(f"{name:<40} p50={stats['p50_ms']:.2f}ms  bytes={stats['bytes']}")
+
+    def populate(self, messages, applications):
+        rng = random.Random(0)
+        synthetic.generate(1, seed=0, messages=0, applications=0)
+        user = User.objects.get()
+        files, now = synthetic.placeholder_files(), timezone.now()
+        UserMessage.objects.bulk_create(
+            UserMessage(
+                user=user, message=rng.choice(synthetic.MESSAGES).format(job=rng.choice(synthetic.JOB_TITLES)),
+                created_at=now - timedelta(minutes=i), admin_reply=rng.choice(synthetic.REPLIES) if i % 2 else None,
+                reply_date=now - timedelta(minutes=i - 1) if i % 2 else None,
+                file=files['pdf'] if i % 7 == 0 else None, file_name='attachment.pdf' if i % 7 == 0 else None,
+                file_type='application/pdf' if i % 7 == 0 else None,
+            )
+            for i in range(messages)
+        )
+        JobApplication.objects.bulk_create(
+            JobApplication(user=user, job_title=rng.choice(synthetic.JOB_TITLES), cv=files['pdf'],
+                           cover_letter=files['pdf'], application_date=now - timedelta(hours=i))
+            for i in range(applications)
+        )
+        return user
+
+    def check_identical(self, user):
+        # Signed media URLs embed the time; pin it so both paths sign alike
+        with mock.patch.object(signing.TimestampSigner, 'timestamp', lambda signer: '1abcde'):
+            before = UserSerializer(User.objects.with_profile().get(pk=user.id)).data
+            assert JSONRenderer().render(before) == FastJSONRenderer().render(build_profile(user.id)), \
+                'the values() profile differs from UserSerializer'
+
+    def compare(self, iterations, serialize, project, wrap):
+        def median_us(fn):
+            fn()
+            return percentile([timed(fn)[0] for _ in range(iterations)], 50) * 1e6
+
+        payload = wrap(project())
+        body = FastJSONRenderer().render(payload)
+        encoded = {'identity': body, 'gzip': compression.gzip_compress(body)}
+        compress_us = {'gzip': median_us(lambda: compression.gzip_compress(body))}
+        if compression.brotli:
+            encoded['br'] = compression.brotli_compress(body)
+            compress_us['br'] = median_us(lambda: compression.brotli_compress(body))
+        return {
+            'build_before_us': median_us(serialize),
+            'build_after_us': median_us(project),
+            'render_before_us': median_us(lambda: JSONRenderer().render(payload)),
+            'render_after_us': median_us(lambda: FastJSONRenderer().render(payload)),
+            'etag_before_us': median_us(lambda: json_etag(payload)),
+            'etag_after_us': median_us(lambda: payload_etag(payload)),
+            'bytes': {encoding: len(content) for encoding, content in encoded.items()},
+            'compress_us': compress_us,
+        }
+
+    def requests(self, user, iterations):
+        """Whole requests through the middleware, from the cache and rebuilt."""
+        client, results = Client(), {}
+        urls = {'profile': f'/api/profile/{user.id}/',
+                'messages': f'/api/messages/{user.id}/?page_size={settings.MESSAGES_MAX_PAGE_SIZE}'}
+        encodings = ['identity', 'gzip'] + (['br'] if compression.brotli else [])
+        for name, url in urls.items():
+            for encoding in encodings:
+                for cached in (True, False):
+                    samples, size = [], 0
+                    for _ in range(iterations):
+                        if not cached:
+                            invalidate_user(user.id)
+                        started = time.perf_counter()
+                        response = client.get(url, headers={'Accept-Encoding': encoding})
+                        samples.append(time.perf_counter() - started)
+                        size = len(response.content)
+                    label = f"{name} {encoding} {'cached' if cached else 'rebuilt'}"
+                    results[label] = {'p50_ms': percentile(samples, 50) * 1000, 'bytes': size}
+        return results
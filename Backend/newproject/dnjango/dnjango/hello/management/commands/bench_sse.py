@@ -0,0 +1,90 @@
+import asyncio
+import time
+import tracemalloc
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from hello.benchmarks import benchmark_database, summarize
+from hello.events import broker
+from hello.models import User, UserMessage
+from hello.views import event_stream
+
+
+async def consume(stream, arrivals):
+    async for chunk in stream:
+        if chunk.startswith('event:'):
+            arrivals.put_nowait(time.perf_counter())
+
+
+class Command(BaseCommand):
+    help = ('Measure how many concurrent /api/events/ subscribers one worker (one event loop) '
+            'sustains: memory per stream, idle CPU and delivery latency')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, nargs='+', default=[1000, 5000, 10000])
+        parser.add_argument('--events', type=int, default=200, help='Single deliveries timed per run')
+        parser.add_argument('--idle-seconds', type=float, default=5.0)
+        parser.add_argument('--heartbeat', type=float, default=15.0)
+
+    def handle(self, *args, **options):
+        with benchmark_database(), override_settings(EVENTS_HEARTBEAT=options['heartbeat']):
+            users = self.create_users(max(options['subscribers']))
+            self.stdout.write(f"{'streams':>8} {'KiB/stream':>10} {'idle CPU':>9} {'p50':>8} {'p99':>8} "
+                              f"{'broadcast':>10} {'events/s':>9}")
+            for count in options['subscribers']:
+                self.stdout.write(asyncio.run(self.run(users[:count], options)))
+
+    def create_users(self, count):
+        User.objects.bulk_create(
+            User(first_name='Bench', last_name=f'Stream{i}', date_of_birth=date(1990, 1, 1),
+                 phone_number='0700000000', email=f'stream{i}@example.com', gender='other',
+                 id_number=f'SSE-{i}', marital_status='single', form_four_number='S0000/0000/2010', password='!')
+            for i in range(count)
+        )
+        users = list(User.objects.order_by('id').values_list('id', flat=True))
+        UserMessage.objects.bulk_create(
+            UserMessage(user_id=user_id, message='Question', admin_reply='Answer') for user_id in users
+        )
+        messages = dict(UserMessage.objects.values_list('user_id', 'id'))
+        return [(user_id, messages[user_id]) for user_id in users]
+
+    async def run(self, users, options):
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        arrivals, tasks = {}, []
+        for user_id, _ in users:
+            arrivals[user_id] = asyncio.Queue()
+            stream = event_stream(broker.subscribe(user_id))
+            await anext(stream)  # retry: preamble, sent on connect
+            tasks.append(asyncio.create_task(consume(stream, arrivals[user_id])))
+        await asyncio.sleep(0.1)
+        per_stream = (tracemalloc.get_traced_memory()[0] - baseline) / len(users) / 1024
+        tracemalloc.stop()
+
+        cpu, wall = time.process_time(), time.perf_counter()
+        await asyncio.sleep(options['idle_seconds'])
+        idle_cpu = (time.process_time() - cpu) / (time.perf_counter() - wall) * 100
+
+        samples = []
+        for i in range(options['events']):
+            user_id, message_id = users[i * len(users) // options['events']]
+            started = time.perf_counter()
+            broker.dispatch({'user': user_id, 'event': 'reply', 'id': message_id})
+            samples.append(await arrivals[user_id].get() - started)
+        stats = summarize(samples)
+
+        # Every subscriber gets one event at once, e.g. a bulk status change
+        started = time.perf_counter()
+        for user_id, message_id in users:
+            broker.dispatch({'user': user_id, 'event': 'reply', 'id': message_id})
+        for user_id, _ in users:
+            await arrivals[user_id].get()
+        broadcast = time.perf_counter() - started
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return (f"{len(users):>8} {per_stream:>10.1f} {idle_cpu:>8.1f}% {stats['p50_ms']:>6.2f}ms "
+                f"{stats['p99_ms']:>6.2f}ms {broadcast * 1000:>8.0f}ms {len(users) / broadcast:>9.0f}")
@@ -0,0 +1,150 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from hello.benchmarks import benchmark_database, create_user, summarize, timed
+from hello.throttling import hit
+
+ATTACKER, VISITOR = '203.0.113.7', '198.51.100.1'
+
+
+def rates(**overrides):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **overrides},
+    })
+
+
+class Command(BaseCommand):
+    help = ('Measure what the rate limiter costs per request, and what it saves: /api/profile/ and '
+            'legitimate /api/login/ latency while one address sends wrong passwords to /api/login/ at '
+            '--attack-rate, '
+            'with the limits off and on')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help='hit() calls and requests timed for overhead')
+        parser.add_argument('--seconds', type=float, default=15.0, help='Duration of each attack phase')
+        parser.add_argument('--attack-threads', type=int, default=16)
+        parser.add_argument('--attack-rate', type=float, default=50.0,
+                            help='Attack requests per second, across all threads')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        caches[settings.THROTTLE_CACHE_ALIAS].clear()
+        results = {'hit_us': self.hit_overhead(options['iterations'])}
+        with benchmark_database():
+            user, visitor = create_user(0), create_user(1)
+            results['request_overhead_us'] = self.request_overhead(options['iterations'] // 20)
+            off = dict.fromkeys(settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'])
+            for label, limits in (('off', rates(**off)), ('on', rates())):
+                caches[settings.THROTTLE_CACHE_ALIAS].clear()
+                with limits:
+                    results[f'attack_limits_{label}'] = self.under_attack(user, visitor, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"cache: {settings.CACHES[settings.THROTTLE_CACHE_ALIAS]['BACKEND']}")
+        self.stdout.write(f"hit(): {results['hit_us']:.1f}us, limiter cost per /api/login/ request: "
+                          f"{results['request_overhead_us']:.1f}us")
+        for label in ('off', 'on'):
+            phase = results[f'attack_limits_{label}']
+            for name in ('profile', 'login'):
+                stats = phase[name]
+                self.stdout.write(f"limits {label:<3} {name:<7} n={stats['count']:<6} p50={stats['p50_ms']:.1f}ms "
+                                  f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms")
+            self.stdout.write(f"limits {label:<3} visitor logins: "
+                              + ', '.join(f'{code}={n}' for code, n in sorted(phase['login_statuses'].items())))
+            self.stdout.write(f"limits {label:<3} attacker responses: "
+                              + ', '.join(f'{code}={n}' for code, n in sorted(phase['attack'].items())))
+
+    def hit_overhead(self, iterations):
+        started = time.perf_counter()
+        for i in range(iterations):
+            # Distinct keys, so every call is allowed and does the full work
+            hit(f'bench:{i % 1000}', iterations, 3600)
+        return (time.perf_counter() - started) / iterations * 1e6
+
+    def request_overhead(self, iterations):
+        """Per-request difference with the login budgets off and on, on a
+        request rejected as invalid before any password is hashed."""
+        def run(limits):
+            client, samples = Client(REMOTE_ADDR=VISITOR), []
+            with limits:
+                for _ in range(iterations):
+                    elapsed, response = timed(client.post, '/api/login/', {'email': 'x@example.com'},
+                                              content_type='application/json')
+                    assert response.status_code == 400, response.content
+                    samples.append(elapsed)
+            return sorted(samples)[len(samples) // 2]
+
+        unlimited = f'{iterations * 10}/hour'
+        limited, unlimited = rates(login_ip=unlimited, login_email=unlimited), rates(login_ip=None, login_email=None)
+        run(unlimited)  # warm up
+        # Interleaved rounds, so drift in machine load hits both sides alike
+        differences = sorted(run(limited) - run(unlimited) for _ in range(5))
+        return differences[2] * 1e6
+
+    def under_attack(self, user, visitor, options):
+        stop, attack, lock = threading.Event(), Counter(), threading.Lock()
+
+        interval = options['attack_threads'] / options['attack_rate']
+
+        def attack_loop():
+            # Paced, as from remote clients: an attack arrives at its own rate
+            # whatever the server does, rather than waiting for each response
+            client, next_request = Client(REMOTE_ADDR=ATTACKER), time.perf_counter()
+            try:
+                while not stop.wait(max(0.0, next_request - time.perf_counter())):
+                    next_request = max(next_request + interval, time.perf_counter())
+                    response = client.post('/api/login/', {'email': user.email, 'password': 'guess'},
+                                           content_type='application/json')
+                    with lock:
+                        attack[response.status_code] += 1
+            finally:
+                connections.close_all()
+
+        login, login_statuses = [], Counter()
+
+        def login_loop():
+            # A real user logging in now and then, well inside the per-account budget
+            client = Client(REMOTE_ADDR=VISITOR)
+            try:
+                while not stop.wait(options['seconds'] / 8):
+                    elapsed, response = timed(client.post, '/api/login/',
+                                              {'email': visitor.email, 'password': 'benchmark-password'},
+                                              content_type='application/json')
+                    with lock:
+                        login.append(elapsed)
+                        login_statuses[response.status_code] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attack_loop) for _ in range(options['attack_threads'])]
+        for thread in threads:
+            thread.start()
+        try:
+            time.sleep(0.5)
+            threads.append(threading.Thread(target=login_loop))
+            threads[-1].start()
+            client, profile = Client(REMOTE_ADDR=VISITOR), []
+            deadline = time.perf_counter() + options['seconds']
+            while time.perf_counter() < deadline:
+                elapsed, response = timed(client.get, f'/api/profile/{user.id}/')
+                profile.append(elapsed)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return {'profile': summarize(profile), 'login': summarize(login),
+                'login_statuses': dict(login_statuses), 'attack': dict(attack)}
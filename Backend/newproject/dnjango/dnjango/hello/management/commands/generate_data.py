@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from hello.models import User
+from hello.synthetic import PASSWORD, email, generate, id_tag
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with synthetic users, documents, job applications and messages, '
+            f'reproducibly from --seed. Every user can log in with the password "{PASSWORD}".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--messages', type=float, default=5.0, help='Mean messages per user')
+        parser.add_argument('--applications', type=float, default=1.5, help='Mean job applications per user')
+        parser.add_argument('--days', type=int, default=730, help='Spread registrations over this many days')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synthetic',
+                            help='Emails are <prefix><n>@example.com; use another prefix to add more users')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Users per transaction')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        users = User.objects.using(using)
+        if (users.filter(email=email(options['prefix'], 0)).exists()
+                or users.filter(id_number__startswith=id_tag(options['prefix'])).exists()):
+            raise CommandError(f"Users with prefix {options['prefix']!r} already exist; pass another --prefix")
+
+        started = time.perf_counter()
+
+        def progress(result):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{result.summary()} ({result.users / elapsed:.0f} users/s)')
+
+        result = generate(
+            options['users'], seed=options['seed'], prefix=options['prefix'], messages=options['messages'],
+            applications=options['applications'], days=options['days'], batch_size=options['batch_size'],
+            using=using, progress=progress if options['verbosity'] > 1 else None,
+        )
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            # Fresh statistics, or the planner keeps costing these tables as empty
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE users, user_documents, job_applications, user_messages')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.summary()} in {time.perf_counter() - started:.1f}s'
+        ))
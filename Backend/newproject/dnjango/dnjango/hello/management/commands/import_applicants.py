@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from hello.imports import ImportFormatError, guess_format, import_applicants
+
+
+class Command(BaseCommand):
+    help = ('Import applicants (with documents and an optional job application per row) '
+            'from a CSV or NDJSON file; see hello/imports.py for the columns')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Default: from the file extension')
+        parser.add_argument('--rejected', help='Write rejected rows (line, reason) to this CSV file; "-" for stdout')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        try:
+            file_format = options['format'] or guess_format(options['path'])
+            with open(options['path'], 'rb') as stream:
+                result = import_applicants(stream, file_format, options['database'])
+        except (ImportFormatError, OSError) as e:
+            raise CommandError(e)
+        self.stdout.write(result.summary())
+        if options['rejected'] == '-':
+            result.write_rejected(self.stdout)
+        elif options['rejected']:
+            with open(options['rejected'], 'w', newline='') as stream:
+                result.write_rejected(stream)
+        else:
+            for line, reason in result.rejected[:20]:
+                self.stderr.write(f'line {line}: {reason}')
+            if len(result.rejected) > 20:
+                self.stderr.write(f'... {len(result.rejected) - 20} more; use --rejected to save them all')
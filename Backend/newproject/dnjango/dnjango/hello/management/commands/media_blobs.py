@@ -0,0 +1,87 @@
+import os
+import time
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from hello.storage import ContentAddressedStorage
+
+
+def file_fields():
+    for model in apps.get_app_config('hello').get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField):
+                yield model, field.name
+
+
+class Command(BaseCommand):
+    help = (
+        'Maintain the content-addressed media store: "backfill" moves files saved '
+        'under their upload_to paths into deduplicated blobs, "gc" deletes blobs '
+        'no row references (e.g. after CASCADE deletes).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['backfill', 'gc'])
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='gc: keep unreferenced blobs younger than this, '
+                                 'so uploads that are not committed yet survive')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('The default storage is not ContentAddressedStorage')
+        getattr(self, options['action'])(options)
+
+    def backfill(self, options):
+        moved, missing = {}, 0
+        for model, field in file_fields():
+            rows = (model.objects.exclude(**{field: ''}).exclude(**{field: None})
+                    .exclude(**{f'{field}__startswith': f'{ContentAddressedStorage.BLOB_DIR}/'})
+                    .values_list('pk', field))
+            for pk, name in rows.iterator(chunk_size=500):
+                if name not in moved:
+                    if not default_storage.exists(name):
+                        missing += 1
+                        self.stderr.write(f'missing: {model.__name__}.{field} #{pk} {name}')
+                        continue
+                    if options['dry_run']:
+                        moved[name] = name
+                        continue
+                    with default_storage.open(name) as f:
+                        blob_name = default_storage.save(name, File(f, name=name))
+                    default_storage.delete(name)
+                    moved[name] = blob_name
+                if not options['dry_run']:
+                    model.objects.filter(pk=pk).update(**{field: moved[name]})
+
+        self.stdout.write(f'{len(moved)} files moved into {len(set(moved.values()))} blobs, {missing} missing')
+
+    def gc(self, options):
+        referenced = set()
+        for model, field in file_fields():
+            rows = model.objects.filter(**{f'{field}__startswith': f'{ContentAddressedStorage.BLOB_DIR}/'})
+            referenced.update(rows.values_list(field, flat=True).iterator(chunk_size=5000))
+
+        cutoff = time.time() - options['grace_hours'] * 3600
+        root = default_storage.path(ContentAddressedStorage.BLOB_DIR)
+        kept = deleted = freed = 0
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, default_storage.location).replace('\\', '/')
+                stat = os.stat(path)
+                if name in referenced or stat.st_mtime > cutoff:
+                    kept += 1
+                    continue
+                deleted += 1
+                freed += stat.st_size
+                if not options['dry_run']:
+                    os.unlink(path)
+
+        verb = 'would delete' if options['dry_run'] else 'deleted'
+        self.stdout.write(f'{len(referenced)} referenced blobs, {kept} kept, '
+                          f'{verb} {deleted} ({freed} bytes)')
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from hello.tasks import purge_done, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (previews, ...) from the tasks table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=1.0, help='Idle poll interval in seconds')
+
+    def handle(self, *args, **options):
+        purged_at = None
+        while True:
+            close_old_connections()
+            if purged_at is None or time.monotonic() - purged_at >= settings.TASK_PURGE_INTERVAL:
+                purged_at = time.monotonic()
+                purged = purge_done()
+                if purged:
+                    self.stdout.write(f'purged {purged} finished tasks')
+            count = run_pending(options['batch_size'])
+            if count:
+                self.stdout.write(f'ran {count} tasks')
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
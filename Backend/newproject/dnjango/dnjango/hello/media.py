@@ -0,0 +1,147 @@
+"""
+Authorized media downloads.
+
+Files are only reachable through ``serve_media``: staff with an admin session
+may fetch anything, applicants need a URL signed for them (the serializers
+emit those via ``signed_media_url``) and must still own a row referencing the
+file. Once authorized, the transfer is handed to the front proxy with
+X-Accel-Redirect / X-Sendfile when configured; otherwise it is served here
+with ETag / Last-Modified revalidation and single-range requests.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db.models import Exists, OuterRef, Q
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+
+from .models import User, UserDocument, JobApplication, UserMessage
+from .storage import ContentAddressedStorage
+
+signer = signing.TimestampSigner(salt='hello.media')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def signed_media_url(name, user_id):
+    signature = ':'.join(signer.sign(f'{user_id}:{name}').rsplit(':', 2)[1:])
+    return f"{settings.MEDIA_URL}{quote(name)}?{urlencode({'u': user_id, 'sig': signature})}"
+
+
+def signed_user_id(request, name):
+    user_id, signature = request.GET.get('u', ''), request.GET.get('sig', '')
+    try:
+        signer.unsign(f'{user_id}:{name}:{signature}', max_age=settings.MEDIA_URL_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return user_id
+
+
+def owns_file(user_id, name):
+    """Whether active user ``user_id`` has a row referencing ``name`` (one query)."""
+    return User.objects.filter(pk=user_id, is_active=True).filter(
+        Exists(UserDocument.objects.filter(Q(file=name) | Q(preview=name), user=OuterRef('pk')))
+        | Exists(JobApplication.objects.filter(
+            Q(cv=name) | Q(cover_letter=name) | Q(cv_preview=name) | Q(cover_letter_preview=name),
+            user=OuterRef('pk')))
+        | Exists(UserMessage.objects.filter(file=name, user=OuterRef('pk')))
+    ).exists()
+
+
+def is_authorized(request, name):
+    if getattr(request.user, 'is_staff', False):
+        return True
+    user_id = signed_user_id(request, name)
+    return user_id is not None and owns_file(user_id, name)
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single ``bytes=`` range, None to send the
+    whole file, or False when the range cannot be satisfied."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(settings.FILE_UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    if not is_authorized(request, path):
+        raise Http404('File not found')
+    try:
+        full_path = default_storage.path(path)
+        stat = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404('File not found')
+
+    # Blob names are content hashes, which makes them ideal strong ETags
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if ContentAddressedStorage.is_blob(path):
+        etag = f'"{stem}"'
+    else:
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        return response
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+    elif settings.MEDIA_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        response = full_or_partial_response(request, full_path, stat.st_size, etag, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = f'private, max-age={settings.MEDIA_URL_MAX_AGE}'
+    return response
+
+
+def full_or_partial_response(request, full_path, size, etag, content_type):
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (not if_range or etag in parse_etags(if_range)):
+        byte_range = parse_range(request.headers['Range'], size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(read_range(full_path, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        # FileResponse goes through wsgi.file_wrapper, i.e. sendfile() where the server supports it
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    return response
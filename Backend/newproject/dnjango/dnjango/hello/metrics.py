@@ -0,0 +1,183 @@
+"""
+Per-view request metrics, served in the Prometheus text format on /metrics.
+
+``MetricsMiddleware`` times every request and counts the SQL it runs (through
+``execute_wrapper`` on each database connection), the request body it
+received and the response it sent, per view name. Series are labelled by
+view, not path, so their number stays bounded. The profile cache counters
+from ``hello.cache`` are exported alongside.
+
+Requests slower than METRICS_SLOW_REQUEST seconds are also logged on the
+``hello.slow_requests`` logger, as one JSON line with the statements that
+took longest. A streamed response is timed until it is handed to the
+server, and its body size is not counted.
+
+Everything is kept in memory, per process: with several worker processes,
+scrape each of them.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .cache import cache_stats
+
+slow_logger = logging.getLogger('hello.slow_requests')
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, tuple(buckets)
+        self.series = {}  # label values -> [count per bucket..., count above the last, sum]
+
+    def observe(self, values, amount):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [0] * (len(self.buckets) + 1) + [0]
+        series[bisect.bisect_left(self.buckets, amount)] += 1
+        series[-1] += amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for values, series in sorted(self.series.items()):
+            labels = format_labels(self.labels, values)
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], series):
+                cumulative += count
+                yield f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_sum{{{labels}}} {series[-1]}'
+            yield f'{self.name}_count{{{labels}}} {cumulative}'
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.series = defaultdict(float)
+
+    def inc(self, values, amount=1):
+        self.series[values] += amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for values, total in sorted(self.series.items()):
+            yield f'{self.name}{{{format_labels(self.labels, values)}}} {total}'
+
+
+def format_labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+requests = Histogram('hello_request_duration_seconds', 'Time to produce a response.',
+                     ('view', 'method', 'status'),
+                     (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+queries = Histogram('hello_request_queries', 'SQL statements run per request.', ('view',),
+                    (0, 1, 2, 3, 5, 8, 13, 21, 50, 100))
+response_bytes = Histogram('hello_response_bytes', 'Size of non-streamed response bodies.', ('view',),
+                           (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+query_seconds = Counter('hello_request_query_seconds_total', 'Time spent in SQL statements.', ('view',))
+request_bytes = Counter('hello_request_body_bytes_total', 'Request body bytes received, uploads included.', ('view',))
+
+METRICS = [requests, queries, response_bytes, query_seconds, request_bytes]
+
+
+def reset_metrics():
+    with _lock:
+        for metric in METRICS:
+            metric.series.clear()
+
+
+class QueryRecorder:
+    """An ``execute_wrapper`` counting statements and their time."""
+
+    def __init__(self, keep_statements):
+        self.count, self.seconds = 0, 0.0
+        self.statements = [] if keep_statements else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if self.statements is not None:
+                self.statements.append((sql, elapsed))
+
+    def slowest(self, limit):
+        totals = defaultdict(lambda: [0, 0.0])
+        for sql, elapsed in self.statements:
+            totals[sql][0] += 1
+            totals[sql][1] += elapsed
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [{'sql': sql, 'count': count, 'ms': round(seconds * 1000, 3)} for sql, (count, seconds) in ranked]
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(keep_statements=settings.METRICS_SLOW_REQUEST is not None)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        received = int(request.META.get('CONTENT_LENGTH') or 0)
+        with _lock:
+            requests.observe((view, method, response.status_code), elapsed)
+            queries.observe((view,), recorder.count)
+            query_seconds.inc((view,), recorder.seconds)
+            if received:
+                request_bytes.inc((view,), received)
+            if not response.streaming:
+                response_bytes.observe((view,), len(response.content))
+
+        if settings.METRICS_SLOW_REQUEST is not None and elapsed >= settings.METRICS_SLOW_REQUEST:
+            slow_logger.warning(json.dumps({
+                'view': view, 'method': request.method, 'path': request.path, 'status': response.status_code,
+                'ms': round(elapsed * 1000, 3), 'queries': recorder.count,
+                'query_ms': round(recorder.seconds * 1000, 3),
+                'slowest_queries': recorder.slowest(settings.METRICS_SLOW_QUERIES),
+            }))
+        return response
+
+
+def render_metrics():
+    lines = []
+    with _lock:
+        for metric in METRICS:
+            lines.extend(metric.render())
+    stats = cache_stats()
+    lines += ['# HELP hello_profile_cache_events_total Per-user cache lookups and invalidations.',
+              '# TYPE hello_profile_cache_events_total counter']
+    lines += [f'hello_profile_cache_events_total{{event="{event}"}} {stats[event]}'
+              for event in ('hits', 'misses', 'evictions', 'invalidations')]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape target, for staff or METRICS_ALLOWED_IPS."""
+    if not (getattr(request.user, 'is_staff', False)
+            or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hello', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usermessage',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='user_messages_history_idx'),
+        ),
+    ]
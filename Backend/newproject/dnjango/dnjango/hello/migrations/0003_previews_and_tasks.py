@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hello', '0002_user_messages_history_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobapplication',
+            name='cover_letter_preview',
+            field=models.FileField(blank=True, null=True, upload_to='previews/'),
+        ),
+        migrations.AddField(
+            model_name='jobapplication',
+            name='cv_preview',
+            field=models.FileField(blank=True, null=True, upload_to='previews/'),
+        ),
+        migrations.AddField(
+            model_name='userdocument',
+            name='preview',
+            field=models.FileField(blank=True, null=True, upload_to='previews/'),
+        ),
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'tasks',
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['run_at'], name='tasks_queued_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hello', '0003_previews_and_tasks'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jobapplication',
+            index=models.Index(fields=['-application_date'], name='job_applications_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobapplication',
+            index=models.Index(fields=['status', '-application_date'], name='job_applications_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobapplication',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['-application_date'], name='job_applications_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-registration_date'], name='users_registration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active', '-registration_date'], name='users_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['gender', '-registration_date'], name='users_gender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['marital_status', '-registration_date'], name='users_marital_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userdocument',
+            index=models.Index(fields=['-uploaded_at'], name='user_documents_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userdocument',
+            index=models.Index(fields=['document_type', '-uploaded_at'], name='user_documents_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usermessage',
+            index=models.Index(fields=['-created_at'], name='user_messages_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usermessage',
+            index=models.Index(condition=models.Q(('admin_reply__isnull', True)), fields=['-created_at'], name='user_messages_unanswered_idx'),
+        ),
+    ]
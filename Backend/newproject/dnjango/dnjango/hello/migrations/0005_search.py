@@ -0,0 +1,103 @@
+import django.contrib.postgres.search
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+SEARCH_INDEXES = [
+    ('user', GinIndex(fields=['search_vector'], name='users_search_idx')),
+    ('user', GinIndex(
+        OpClass(Upper('first_name'), name='gin_trgm_ops'),
+        OpClass(Upper('last_name'), name='gin_trgm_ops'),
+        OpClass(Upper('email'), name='gin_trgm_ops'),
+        OpClass(Upper('phone_number'), name='gin_trgm_ops'),
+        OpClass(Upper('id_number'), name='gin_trgm_ops'),
+        name='users_trgm_idx',
+    )),
+    ('jobapplication', GinIndex(fields=['search_vector'], name='job_applications_search_idx')),
+    ('jobapplication', GinIndex(OpClass(Upper('job_title'), name='gin_trgm_ops'), name='job_applications_trgm_idx')),
+    ('usermessage', GinIndex(fields=['search_vector'], name='user_messages_search_idx')),
+    ('usermessage', GinIndex(OpClass(Upper('message'), name='gin_trgm_ops'), name='user_messages_trgm_idx')),
+]
+
+# table -> (tsvector expression over NEW, columns that trigger a refresh).
+# Keep the text search configuration in step with hello.search.SEARCH_CONFIG.
+SEARCH_VECTORS = {
+    'users': (
+        "setweight(to_tsvector('simple', concat_ws(' ', NEW.first_name, NEW.middle_name, NEW.last_name)), 'A')"
+        " || setweight(to_tsvector('simple', concat_ws(' ', NEW.email, NEW.id_number)), 'B')",
+        ['first_name', 'middle_name', 'last_name', 'email', 'id_number'],
+    ),
+    'job_applications': (
+        "to_tsvector('simple', coalesce(NEW.job_title, ''))",
+        ['job_title'],
+    ),
+    'user_messages': (
+        "to_tsvector('simple', coalesce(NEW.message, ''))",
+        ['message'],
+    ),
+}
+
+
+def create_search(apps, schema_editor):
+    """GIN indexes and tsvector triggers only exist on PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, (vector, columns) in SEARCH_VECTORS.items():
+        schema_editor.execute(f"""
+            CREATE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {vector};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        schema_editor.execute(f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF {', '.join(columns)} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()
+        """)
+        # Fire the trigger once for existing rows
+        schema_editor.execute(f'UPDATE {table} SET {columns[0]} = {columns[0]}')
+    for model_name, index in SEARCH_INDEXES:
+        schema_editor.add_index(apps.get_model('hello', model_name), index)
+
+
+def drop_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in SEARCH_INDEXES:
+        schema_editor.remove_index(apps.get_model('hello', model_name), index)
+    for table in SEARCH_VECTORS:
+        schema_editor.execute(f'DROP TRIGGER {table}_search_vector_trigger ON {table}')
+        schema_editor.execute(f'DROP FUNCTION {table}_search_vector_update()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hello', '0004_admin_changelist_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='jobapplication',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='usermessage',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Not in the model state: the indexes only exist on PostgreSQL, and
+        # SQLite table rebuilds would try to recreate them
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def dead_letter_failed_tasks(apps, schema_editor):
+    """Tasks that failed under the old run-once worker become dead letters."""
+    Task = apps.get_model('hello', 'Task')
+    FailedTask = apps.get_model('hello', 'FailedTask')
+    failed = Task.objects.filter(status='failed')
+    FailedTask.objects.bulk_create(
+        FailedTask(name=task.name, payload=task.payload, attempts=task.attempts,
+                   last_error=task.last_error or '', created_at=task.created_at)
+        for task in failed.iterator()
+    )
+    failed.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hello', '0005_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('attempts', models.PositiveIntegerField()),
+                ('last_error', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('failed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'task_dead_letters',
+            },
+        ),
+        migrations.RunPython(dead_letter_failed_tasks, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='tasks_queued_idx',
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done')], default='queued', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status__in', ['queued', 'running'])), fields=['run_at'], name='tasks_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='failedtask',
+            index=models.Index(fields=['-failed_at'], name='task_dead_letters_failed_idx'),
+        ),
+    ]
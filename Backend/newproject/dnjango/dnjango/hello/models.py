@@ -1,6 +1,71 @@
-from django.db import models
-import hashlib
+from django.db import models, transaction
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.contrib.auth.hashers import make_password
 from django.utils import timezone
+from .hashers import get_hashing_pool, tag_legacy_hash, verify_and_rehash
+
+
+def profile_prefetches(limit=None):
+    """Prefetches for everything UserSerializer renders.
+
+    Messages and applications are capped at ``limit + 1`` rows per user (the
+    extra row only tells the serializer whether there is more history).
+    """
+    limit = limit or settings.PROFILE_NESTED_LIMIT
+    return [
+        # In upload order, as hello.payloads.build_profile lists them
+        models.Prefetch('documents', queryset=UserDocument.objects.order_by('id')),
+        models.Prefetch(
+            'messages',
+            queryset=UserMessage.objects.order_by('-created_at', '-id')[:limit + 1],
+            to_attr='recent_messages',
+        ),
+        models.Prefetch(
+            'applications',
+            queryset=JobApplication.objects.order_by('-application_date', '-id')[:limit + 1],
+            to_attr='recent_applications',
+        ),
+    ]
+
+
+class UserQuerySet(models.QuerySet):
+    def with_profile(self, limit=None):
+        return self.prefetch_related(*profile_prefetches(limit))
+
+
+class JobApplicationQuerySet(models.QuerySet):
+    def transition(self, status):
+        """Move every application in this queryset to ``status`` where allowed.
+
+        Two queries however many rows match: the rows are locked and read,
+        then one UPDATE whose WHERE clause only admits the statuses
+        ``status`` may be reached from. Owners' cached profiles are
+        invalidated and one batched ``application_status`` notice is sent.
+        Returns ``{id: (outcome, previous status)}``, where outcome is
+        'updated', 'unchanged' or 'invalid_transition'.
+        """
+        from .cache import invalidate_users
+        from .events import publish_many
+
+        sources = JobApplication.allowed_sources(status)
+        with transaction.atomic(using=self.db):
+            rows = list(self.select_for_update(of=('self',)).order_by().values_list('id', 'user_id', 'status'))
+            if any(previous in sources for _, _, previous in rows):
+                self.filter(status__in=sources).update(status=status)
+            updated = [(user_id, pk) for pk, user_id, previous in rows if previous in sources]
+            invalidate_users({user_id for user_id, _ in updated})
+            publish_many('application_status', updated, using=self.db)
+
+        outcomes = {}
+        for pk, _, previous in rows:
+            if previous in sources:
+                outcomes[pk] = ('updated', previous)
+            elif previous == status:
+                outcomes[pk] = ('unchanged', previous)
+            else:
+                outcomes[pk] = ('invalid_transition', previous)
+        return outcomes
 
 
 class User(models.Model):
@@ -29,19 +94,44 @@ class User(models.Model):
     password = models.CharField(max_length=255)
     registration_date = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
+    # Bumped to revoke every access / refresh token issued so far (hello/tokens.py).
+    # The database default covers the raw INSERT in hello/imports.py.
+    token_version = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+    # Names, email and ID number; maintained by a database trigger (migration 0005)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = UserQuerySet.as_manager()
 
     class Meta:
         db_table = 'users'
+        # Admin changelist: newest first, optionally narrowed by one list_filter
+        indexes = [
+            models.Index(fields=['-registration_date'], name='users_registration_idx'),
+            models.Index(fields=['is_active', '-registration_date'], name='users_active_idx'),
+            models.Index(fields=['gender', '-registration_date'], name='users_gender_idx'),
+            models.Index(fields=['marital_status', '-registration_date'], name='users_marital_status_idx'),
+        ]
+        # Search (whole words through the tsvector, fragments through pg_trgm)
+        # uses GIN indexes that only exist on PostgreSQL, created by
+        # migrations/0005_search.py and kept out of the model state.
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
     def set_password(self, raw_password):
-        """Hash password before saving"""
-        self.password = hashlib.sha256(raw_password.encode()).hexdigest()
+        """Hash password before saving, with the first of settings.PASSWORD_HASHERS"""
+        self.password = get_hashing_pool().run(make_password, raw_password)
 
     def check_password(self, raw_password):
-        return self.password == hashlib.sha256(raw_password.encode()).hexdigest()
+        """Verify password, rehashing legacy or under-cost hashes in place"""
+        is_correct, new_password = get_hashing_pool().run(
+            verify_and_rehash, raw_password, tag_legacy_hash(self.password)
+        )
+        if new_password:
+            self.password = new_password
+            if self.pk:
+                User.objects.filter(pk=self.pk).update(password=self.password)
+        return is_correct
 
 
 class UserDocument(models.Model):
@@ -54,10 +144,15 @@ class UserDocument(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
     document_type = models.CharField(max_length=30, choices=DOCUMENT_TYPES)
     file = models.FileField(upload_to='user_documents/%Y/%m/%d/')
+    preview = models.FileField(upload_to='previews/', blank=True, null=True)
     uploaded_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = 'user_documents'
+        indexes = [
+            models.Index(fields=['-uploaded_at'], name='user_documents_uploaded_idx'),
+            models.Index(fields=['document_type', '-uploaded_at'], name='user_documents_type_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.document_type}"
@@ -70,16 +165,47 @@ class JobApplication(models.Model):
         ('rejected', 'Rejected'),
         ('hired', 'Hired'),
     ]
+    # Where a recruiter may move an application from each status
+    STATUS_TRANSITIONS = {
+        'pending': ['reviewed', 'rejected', 'hired'],
+        'reviewed': ['rejected', 'hired'],
+        'rejected': [],
+        'hired': [],
+    }
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='applications')
     job_title = models.CharField(max_length=200)
     cv = models.FileField(upload_to='applications/cv/')
     cover_letter = models.FileField(upload_to='applications/cover_letters/')
+    cv_preview = models.FileField(upload_to='previews/', blank=True, null=True)
+    cover_letter_preview = models.FileField(upload_to='previews/', blank=True, null=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     application_date = models.DateTimeField(default=timezone.now)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = JobApplicationQuerySet.as_manager()
 
     class Meta:
         db_table = 'job_applications'
+        indexes = [
+            models.Index(fields=['-application_date'], name='job_applications_date_idx'),
+            models.Index(fields=['status', '-application_date'], name='job_applications_status_idx'),
+            # The recruiters' triage queue
+            models.Index(fields=['-application_date'], condition=models.Q(status='pending'),
+                         name='job_applications_pending_idx'),
+        ]
+        # PostgreSQL-only search indexes: see migrations/0005_search.py
+
+    @classmethod
+    def allowed_sources(cls, status):
+        return [source for source, targets in cls.STATUS_TRANSITIONS.items() if status in targets]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets save hooks tell a status change from a re-save (hello/signals.py)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
 
     def __str__(self):
         return f"{self.user.email} - {self.job_title}"
@@ -94,9 +220,73 @@ class UserMessage(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     admin_reply = models.TextField(blank=True, null=True)
     reply_date = models.DateTimeField(blank=True, null=True)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         db_table = 'user_messages'
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='user_messages_history_idx'),
+            models.Index(fields=['-created_at'], name='user_messages_created_idx'),
+            # Messages still waiting for an admin reply
+            models.Index(fields=['-created_at'], condition=models.Q(admin_reply__isnull=True),
+                         name='user_messages_unanswered_idx'),
+        ]
+        # PostgreSQL-only search indexes: see migrations/0005_search.py
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets save hooks tell a new reply from a re-save (hello/signals.py)
+        instance._loaded_reply = instance.__dict__.get('admin_reply')
+        return instance
 
     def __str__(self):
         return f"{self.user.email} - {self.created_at}"
+
+
+class Task(models.Model):
+    """A unit of background work, run by `manage.py run_tasks` (see hello/tasks.py)."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    # When a queued task is due, when a running task's lease runs out, or
+    # when a done task finished
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'tasks'
+        indexes = [
+            models.Index(fields=['run_at'], condition=models.Q(status__in=['queued', 'running']),
+                         name='tasks_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class FailedTask(models.Model):
+    """Dead letter: a task that failed on every attempt."""
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField()
+    last_error = models.TextField()
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'task_dead_letters'
+        indexes = [
+            models.Index(fields=['-failed_at'], name='task_dead_letters_failed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} (failed)"
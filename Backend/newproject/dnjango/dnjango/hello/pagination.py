@@ -0,0 +1,127 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidPage('Invalid cursor')
+
+
+def get_page_size(value, default=None, maximum=None):
+    if value in (None, ''):
+        return default or settings.MESSAGES_PAGE_SIZE
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        raise InvalidPage('Invalid page_size')
+    if page_size < 1:
+        raise InvalidPage('Invalid page_size')
+    return min(page_size, maximum or settings.MESSAGES_MAX_PAGE_SIZE)
+
+
+def row_value(row, name):
+    """``name`` of a model instance or of a ``values()`` row."""
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def keyset_page(queryset, cursor=None, page_size=None, field='created_at'):
+    """Newest-first page of ``queryset`` ordered on ``(field, id)``.
+
+    Seeks past ``cursor`` instead of using OFFSET, so every page costs the same
+    single index range scan no matter how deep the client has scrolled.
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    page_size = page_size or settings.MESSAGES_PAGE_SIZE
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(row_value(rows[-1], field), row_value(rows[-1], 'id'))
+
+
+def parse_since(value):
+    since = parse_datetime(value.replace(' ', '+'))
+    if since is None:
+        raise InvalidPage('Invalid since')
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def changes_since(queryset, since, limit=None):
+    """Messages created or replied to after ``since``, oldest change first.
+
+    Returns ``(rows, next_since, has_more)``. A truncated batch stops before
+    the rows sharing its last change time (unless there are more than
+    ``limit`` of them), so passing ``next_since`` back does not skip any.
+    """
+    limit = limit or settings.MESSAGES_MAX_PAGE_SIZE
+    rows = list(
+        queryset.filter(Q(created_at__gt=since) | Q(reply_date__gt=since))
+        .annotate(changed_at=Greatest('created_at', Coalesce('reply_date', 'created_at')))
+        .order_by('changed_at', 'id')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    if has_more:
+        boundary = row_value(rows[limit], 'changed_at')
+        rows = [row for row in rows[:limit] if row_value(row, 'changed_at') < boundary] or rows[:limit]
+    next_since = row_value(rows[-1], 'changed_at') if rows else since
+    return rows, next_since, has_more
+
+
+def estimate_count(queryset):
+    """Planner row estimate for ``queryset`` on PostgreSQL, else None."""
+    if not hasattr(queryset, 'query'):
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator that trusts the PostgreSQL planner's row estimate once it
+    exceeds ESTIMATED_COUNT_THRESHOLD, instead of running COUNT(*) over a large
+    table on every changelist page. Small results are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= settings.ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
@@ -0,0 +1,82 @@
+"""
+Small JPEG previews of uploaded photos and first pages of PDFs, generated by
+the background worker so list pages never pull the full-size originals.
+
+Needs Pillow; PDF pages additionally need poppler's ``pdftoppm``. Files that
+cannot be rendered are simply left without a preview.
+"""
+import os
+import shutil
+import subprocess
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .cache import invalidate_user
+from .tasks import task
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+# model label -> [(source field, preview field)]
+PREVIEW_FIELDS = {
+    'hello.UserDocument': [('file', 'preview')],
+    'hello.JobApplication': [('cv', 'cv_preview'), ('cover_letter', 'cover_letter_preview')],
+}
+
+
+def open_image(field_file, size):
+    from PIL import Image
+
+    ext = os.path.splitext(field_file.name)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        with field_file.open('rb') as f:
+            image = Image.open(f)
+            # Let the JPEG decoder downscale while decoding instead of inflating a full-size bitmap
+            image.draft('RGB', (size, size))
+            image.load()
+        return image
+    if ext == '.pdf' and shutil.which('pdftoppm'):
+        result = subprocess.run(
+            ['pdftoppm', '-f', '1', '-l', '1', '-png', '-scale-to', str(size), field_file.path, '-'],
+            capture_output=True, timeout=60, check=True,
+        )
+        return Image.open(BytesIO(result.stdout))
+    return None
+
+
+def render_preview(field_file, size=None):
+    """JPEG bytes of a ``size``-bounded preview, or None if the file type is not previewable."""
+    try:
+        from PIL import Image  # noqa: F401
+    except ImportError:
+        return None
+
+    size = size or settings.PREVIEW_SIZE
+    image = open_image(field_file, size)
+    if image is None:
+        return None
+    image.thumbnail((size, size))
+    output = BytesIO()
+    image.convert('RGB').save(output, 'JPEG', quality=settings.PREVIEW_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+@task('generate_previews')
+def generate_previews(model, ids):
+    Model = apps.get_model(model)
+    for obj in Model.objects.filter(id__in=ids):
+        updates = {}
+        for source, target in PREVIEW_FIELDS[model]:
+            field_file = getattr(obj, source)
+            if not field_file or getattr(obj, target):
+                continue
+            data = render_preview(field_file)
+            if data is not None:
+                name = f'previews/{os.path.splitext(os.path.basename(field_file.name))[0]}.jpg'
+                updates[target] = default_storage.save(name, ContentFile(data))
+        if updates:
+            Model.objects.filter(pk=obj.pk).update(**updates)
+            invalidate_user(obj.user_id)
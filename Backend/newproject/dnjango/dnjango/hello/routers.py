@@ -0,0 +1,163 @@
+"""
+Read-replica routing.
+
+``ReplicaRoutingMiddleware`` decides per request where reads go. A request
+reads from a replica only when all of these hold:
+
+- it is a GET or HEAD;
+- it is served by a view marked ``@replica_reads`` or by an admin changelist;
+- the caller has not written recently. There are two kinds of pin:
+  a ``user_id`` pinned by ``pin_users()`` after its data changed (see
+  ``hello.cache.invalidate_users``), and a client carrying the cookie set
+  after one of its own POSTs;
+- some replica is reachable and its lag is at most REPLICA_MAX_LAG.
+
+Otherwise the request stays on ``default``. ``ReplicaRouter`` then sends
+this app's reads to the chosen replica. All writes go to ``default``. So
+do sessions, auth and the other contrib apps, which are only read right
+after being written.
+"""
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+
+PIN_COOKIE = 'hello_primary'
+
+_read_alias = ContextVar('hello_read_alias', default=None)
+_lag = {}  # alias -> (checked at, lag in seconds or None when unreachable)
+_lag_lock = threading.Lock()
+
+
+def replica_reads(view):
+    """Let GET/HEAD requests to ``view`` read from a replica."""
+    view.replica_reads = True
+    return view
+
+
+def pin_key(user_id):
+    return f'hello:user:{user_id}:primary'
+
+
+def pin_users(user_ids):
+    """Keep reads about ``user_ids`` on the primary for REPLICA_STICKY_SECONDS."""
+    if settings.REPLICA_DATABASES:
+        caches[settings.USER_CACHE_ALIAS].set_many(
+            {pin_key(user_id): True for user_id in user_ids}, timeout=settings.REPLICA_STICKY_SECONDS,
+        )
+
+
+def is_pinned(user_id):
+    return bool(caches[settings.USER_CACHE_ALIAS].get(pin_key(user_id)))
+
+
+def current_read_alias():
+    """The replica this request reads from, or None for the primary."""
+    return _read_alias.get()
+
+
+def measure_lag(alias):
+    """Replay lag of ``alias`` in seconds; 0 when it is caught up or not a standby."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        # An idle primary makes the last replay timestamp look old; equal
+        # receive/replay positions mean there is nothing left to apply
+        cursor.execute("""
+            SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+        """)
+        lag, = cursor.fetchone()
+    return float(lag or 0)
+
+
+def replica_lag(alias):
+    """``measure_lag(alias)``, re-measured at most every REPLICA_LAG_CHECK_INTERVAL seconds."""
+    now = time.monotonic()
+    with _lag_lock:
+        checked_at, lag = _lag.get(alias, (None, None))
+    if checked_at is None or now - checked_at >= settings.REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            lag = measure_lag(alias)
+        except DatabaseError:
+            lag = None
+        with _lag_lock:
+            _lag[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    if settings.REPLICA_MAX_LAG is None:
+        return list(settings.REPLICA_DATABASES)
+    healthy = []
+    for alias in settings.REPLICA_DATABASES:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+            healthy.append(alias)
+    return healthy
+
+
+def reset_replica_state():
+    with _lag_lock:
+        _lag.clear()
+
+
+def read_alias(request, view_func, view_kwargs):
+    """The replica ``request`` may read from, or None for the primary."""
+    if not settings.REPLICA_DATABASES or request.method not in ('GET', 'HEAD'):
+        return None
+    match = request.resolver_match
+    changelist = match.namespace == 'admin' and (match.url_name or '').endswith('_changelist')
+    if not (getattr(view_func, 'replica_reads', False) or changelist):
+        return None
+    if request.COOKIES.get(PIN_COOKIE):
+        return None
+    if 'user_id' in view_kwargs and is_pinned(view_kwargs['user_id']):
+        return None
+    replicas = healthy_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            if getattr(request, 'read_alias', None):
+                _read_alias.set(None)
+        if (settings.REPLICA_DATABASES and request.method not in ('GET', 'HEAD', 'OPTIONS')
+                and response.status_code < 400):
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        alias = read_alias(request, view_func, view_kwargs)
+        if alias:
+            request.read_alias = alias
+            _read_alias.set(alias)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'hello':
+            return current_read_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or rows loaded from a replica would be saved back to it
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
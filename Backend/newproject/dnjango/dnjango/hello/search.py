@@ -0,0 +1,73 @@
+"""
+Search over applicants, job applications and messages.
+
+On PostgreSQL every searched table carries a ``search_vector`` column that a
+trigger keeps current (migration 0005). Whole words are matched against it
+through a GIN index, and fragments such as part of an email or ID number go
+through pg_trgm GIN indexes on ``UPPER(column)``, the expression Django's
+``icontains`` compiles to. Either way the lookup is an index scan rather than
+a pass over the whole table. Other databases fall back to plain ``icontains``.
+"""
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+
+from .models import User, JobApplication, UserMessage
+
+SEARCH_CONFIG = 'simple'
+
+# type -> (model, fragment fields, fields returned by /api/search/)
+SEARCH_TARGETS = {
+    'users': (
+        User, ['first_name', 'last_name', 'email', 'phone_number', 'id_number'],
+        ['id', 'first_name', 'last_name', 'email', 'id_number', 'registration_date'],
+    ),
+    'applications': (
+        JobApplication, ['job_title'],
+        ['id', 'user_id', 'job_title', 'status', 'application_date'],
+    ),
+    'messages': (
+        UserMessage, ['message'],
+        ['id', 'user_id', 'message', 'created_at'],
+    ),
+}
+
+
+def full_text_supported(alias):
+    return connections[alias].vendor == 'postgresql'
+
+
+def search_query(term):
+    return SearchQuery(term, search_type='websearch', config=SEARCH_CONFIG)
+
+
+def search_filter(term, fields, vector='search_vector', alias='default'):
+    """Rows whose ``vector`` matches ``term`` as words, or any of ``fields`` contains it."""
+    fragments = reduce(or_, (Q(**{f'{field}__icontains': term}) for field in fields))
+    if not full_text_supported(alias):
+        return fragments
+    return Q(**{vector: search_query(term)}) | fragments
+
+
+def search(queryset, term, fields, vector='search_vector'):
+    """``queryset`` narrowed to ``term``, best matches first, annotated with ``rank``."""
+    queryset = queryset.filter(search_filter(term, fields, vector, queryset.db))
+    if full_text_supported(queryset.db):
+        rank = SearchRank(F(vector), search_query(term))
+    else:
+        rank = Value(0.0, output_field=FloatField())
+    return queryset.annotate(rank=rank).order_by('-rank', '-pk')
+
+
+def search_page(target, term, page=1, page_size=20):
+    """One page of ``target`` results as dicts, plus whether another page follows."""
+    model, fields, values = SEARCH_TARGETS[target]
+    queryset = model.objects.all()
+    if model is User:
+        queryset = queryset.filter(is_active=True)
+    start = (page - 1) * page_size
+    rows = list(search(queryset, term, fields).values(*values, 'rank')[start:start + page_size + 1])
+    return rows[:page_size], len(rows) > page_size
@@ -1,15 +1,35 @@
+from django.conf import settings
+from django.db import models, transaction
 from rest_framework import serializers
+from .media import signed_media_url
 from .models import User, UserDocument, JobApplication, UserMessage
+from .tasks import enqueue
 
 
-class UserDocumentSerializer(serializers.ModelSerializer):
+class MediaFileField(serializers.FileField):
+    """Download URL signed for the file's owner (see hello.media)."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return signed_media_url(value.name, value.instance.user_id)
+
+
+class MediaModelSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.FileField: MediaFileField,
+    }
+
+
+class UserDocumentSerializer(MediaModelSerializer):
     class Meta:
         model = UserDocument
-        fields = ['document_type', 'file', 'uploaded_at']
-        read_only_fields = ['uploaded_at']
+        fields = ['document_type', 'file', 'preview', 'uploaded_at']
+        read_only_fields = ['preview', 'uploaded_at']
 
 
-class UserMessageSerializer(serializers.ModelSerializer):
+class UserMessageSerializer(MediaModelSerializer):
     class Meta:
         model = UserMessage
         fields = [
@@ -19,17 +39,30 @@ class UserMessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'reply_date']
 
 
-class JobApplicationSerializer(serializers.ModelSerializer):
+class JobApplicationSerializer(MediaModelSerializer):
     class Meta:
         model = JobApplication
-        fields = ['id', 'job_title', 'cv', 'cover_letter', 'status', 'application_date']
-        read_only_fields = ['application_date']
+        fields = [
+            'id', 'job_title', 'cv', 'cover_letter', 'cv_preview', 'cover_letter_preview',
+            'status', 'application_date'
+        ]
+        read_only_fields = ['cv_preview', 'cover_letter_preview', 'application_date']
 
 
 class UserSerializer(serializers.ModelSerializer):
+    """Profile payload.
+
+    ``messages`` and ``applications`` hold only the most recent
+    ``PROFILE_NESTED_LIMIT`` rows, with ``*_has_more`` flags telling the client
+    to page through the rest. Fetch users with ``User.objects.with_profile()``
+    (or ``profile_prefetches()``) so this costs a fixed number of queries.
+    """
     documents = UserDocumentSerializer(many=True, read_only=True)
-    messages = UserMessageSerializer(many=True, read_only=True)
-    applications = JobApplicationSerializer(many=True, read_only=True)
+
+    nested = [
+        ('messages', UserMessageSerializer, ('-created_at', '-id')),
+        ('applications', JobApplicationSerializer, ('-application_date', '-id')),
+    ]
 
     class Meta:
         model = User
@@ -37,10 +70,21 @@ class UserSerializer(serializers.ModelSerializer):
             'id', 'first_name', 'middle_name', 'last_name', 'date_of_birth',
             'phone_number', 'email', 'gender', 'id_number', 'marital_status',
             'form_four_number', 'registration_date', 'is_active',
-            'documents', 'messages', 'applications'
+            'documents'
         ]
         read_only_fields = ['registration_date', 'is_active']
 
+    def to_representation(self, user):
+        data = super().to_representation(user)
+        limit = settings.PROFILE_NESTED_LIMIT
+        for relation, serializer_class, ordering in self.nested:
+            rows = getattr(user, f'recent_{relation}', None)
+            if rows is None:
+                rows = list(getattr(user, relation).order_by(*ordering)[:limit + 1])
+            data[relation] = serializer_class(rows[:limit], many=True, context=self.context).data
+            data[f'{relation}_has_more'] = len(rows) > limit
+        return data
+
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=6)
@@ -57,6 +101,12 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             'form_four_number', 'password', 'confirm_password',
             'passport_photo', 'birth_certificate', 'education_certificate'
         ]
+        # Uniqueness is checked once by register_user and enforced by the
+        # database constraints, not with a query per field here.
+        extra_kwargs = {
+            'email': {'validators': []},
+            'id_number': {'validators': []},
+        }
 
     def validate(self, data):
         if data['password'] != data['confirm_password']:
@@ -65,19 +115,22 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('confirm_password')
-        passport_photo = validated_data.pop('passport_photo')
-        birth_certificate = validated_data.pop('birth_certificate')
-        education_certificate = validated_data.pop('education_certificate')
+        documents = {
+            document_type: validated_data.pop(document_type)
+            for document_type, _ in UserDocument.DOCUMENT_TYPES
+        }
 
         password = validated_data.pop('password')
         user = User(**validated_data)
         user.set_password(password)
-        user.save()
 
-        # Save documents
-        UserDocument.objects.create(user=user, document_type='passport_photo', file=passport_photo)
-        UserDocument.objects.create(user=user, document_type='birth_certificate', file=birth_certificate)
-        UserDocument.objects.create(user=user, document_type='education_certificate', file=education_certificate)
+        with transaction.atomic():
+            user.save()
+            documents = UserDocument.objects.bulk_create(
+                UserDocument(user=user, document_type=document_type, file=file)
+                for document_type, file in documents.items()
+            )
+            enqueue('generate_previews', model='hello.UserDocument', ids=[document.id for document in documents])
 
         return user
 
@@ -93,6 +146,14 @@ class JobApplicationSubmitSerializer(serializers.ModelSerializer):
         fields = ['job_title', 'cv', 'cover_letter']
 
 
+class BulkStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=settings.BULK_STATUS_MAX_IDS
+    )
+    status = serializers.ChoiceField(choices=JobApplication.STATUS_CHOICES)
+
+
 class SimpleUserMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserMessage
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_user
+from .events import publish
+from .models import User, UserDocument, JobApplication, UserMessage
+from .tokens import forget_token_state
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+    forget_token_state(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserDocument)
+@receiver([post_save, post_delete], sender=JobApplication)
+@receiver([post_save, post_delete], sender=UserMessage)
+def invalidate_cached_owner(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=UserMessage)
+def push_reply(sender, instance, created, using, **kwargs):
+    if instance.admin_reply and instance.admin_reply != getattr(instance, '_loaded_reply', None):
+        publish(instance.user_id, 'reply', instance.pk, using)
+        instance._loaded_reply = instance.admin_reply
+
+
+@receiver(post_save, sender=JobApplication)
+def push_application_status(sender, instance, created, using, **kwargs):
+    if not created and instance.status != getattr(instance, '_loaded_status', instance.status):
+        publish(instance.user_id, 'application_status', instance.pk, using)
+        instance._loaded_status = instance.status
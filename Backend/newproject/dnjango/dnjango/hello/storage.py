@@ -0,0 +1,137 @@
+import errno
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+
+class StreamingFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage that never exposes a partially written file and never
+    holds more than FILE_UPLOAD_CHUNK_SIZE bytes of an upload in memory.
+
+    Each file is first staged in a hidden temporary file next to its final
+    location, either by renaming the spooled upload (no copy when both are on
+    the same filesystem) or by streaming it in chunks, and is then hard-linked
+    into its ``upload_to`` path. link() is atomic and fails instead of
+    overwriting, so a name collision just picks another name and retries.
+    """
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        staged = self._stage(content, directory)
+        try:
+            while True:
+                try:
+                    os.link(staged, full_path)
+                    break
+                except FileExistsError:
+                    name = self.get_available_name(name)
+                    validate_file_name(name, allow_relative_path=True)
+                    full_path = self.path(name)
+        finally:
+            os.unlink(staged)
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+        name = os.path.relpath(full_path, self.location)
+        return str(name).replace('\\', '/')
+
+    def _stage(self, content, directory, hash=None):
+        """Put ``content`` in a temporary file in ``directory``, feeding every
+        chunk to ``hash`` if given (which rules out the rename shortcut)."""
+        fd, staged = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            if hasattr(content, 'temporary_file_path') and hash is None:
+                try:
+                    os.close(fd)
+                    fd = None
+                    os.replace(content.temporary_file_path(), staged)
+                    return staged
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    fd = os.open(staged, os.O_WRONLY | os.O_TRUNC)
+
+            with os.fdopen(fd, 'wb') as destination:
+                fd = None
+                for chunk in content.chunks(settings.FILE_UPLOAD_CHUNK_SIZE):
+                    chunk = chunk if isinstance(chunk, bytes) else chunk.encode()
+                    if hash is not None:
+                        hash.update(chunk)
+                    destination.write(chunk)
+            return staged
+        except BaseException:
+            if fd is not None:
+                os.close(fd)
+            os.unlink(staged)
+            raise
+
+
+class ContentAddressedStorage(StreamingFileSystemStorage):
+    """
+    Stores every file once, under ``blobs/<aa>/<bb>/<sha256><ext>``, whatever
+    ``upload_to`` path it was saved with. Saving content that already exists
+    writes nothing and returns the existing blob's name, so re-uploaded CVs and
+    certificates share one file on disk.
+
+    Blobs are never deleted on save or row deletion; their reference count is
+    the number of FileField values naming them, and ``manage.py media_blobs gc``
+    removes blobs that no row references any more.
+    """
+
+    BLOB_DIR = 'blobs'
+
+    def get_available_name(self, name, max_length=None):
+        # The name is derived from the content in _save, so collisions are dedupes.
+        return name
+
+    @classmethod
+    def blob_name(cls, digest, original_name):
+        ext = os.path.splitext(original_name)[1].lower()[:10]
+        return f'{cls.BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    @classmethod
+    def is_blob(cls, name):
+        return bool(name) and name.startswith(f'{cls.BLOB_DIR}/')
+
+    def _save(self, name, content):
+        staging_dir = self.path(self.BLOB_DIR)
+        os.makedirs(staging_dir, exist_ok=True)
+
+        staged, digest = None, getattr(content, 'sha256', None)
+        if digest is None:
+            hash = hashlib.sha256()
+            staged = self._stage(content, staging_dir, hash)
+            digest = hash.hexdigest()
+
+        blob_name = self.blob_name(digest, name)
+        full_path = self.path(blob_name)
+        try:
+            if os.path.exists(full_path):
+                # Refresh mtime so a concurrent gc treats the blob as freshly used
+                os.utime(full_path)
+                return blob_name
+
+            if staged is None:
+                staged = self._stage(content, staging_dir)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                os.link(staged, full_path)
+            except FileExistsError:
+                # The same content was stored concurrently
+                pass
+        finally:
+            if staged is not None:
+                os.unlink(staged)
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return blob_name
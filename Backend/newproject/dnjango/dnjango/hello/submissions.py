@@ -0,0 +1,103 @@
+"""
+Follow-up work for submitted job applications and messages.
+
+The submit views only store the row (and its uploads) and queue this work
+in the same transaction, so their latency does not depend on any of it:
+
+- ``scan_uploads``: runs the attached files through VIRUS_SCANNER, then
+  queues preview generation for the clean ones.
+- ``send_receipt``: a confirmation email through the configured
+  EMAIL_BACKEND.
+- ``audit``: a structured line on the ``hello.audit`` logger.
+
+VIRUS_SCANNER is a stub, ``eicar_scanner``, which only detects the EICAR test
+file. A real scanner (e.g. a clamd client) can replace it if it has the
+same signature: a file in, an infection name or None out.
+"""
+import json
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import mail_admins, send_mail
+from django.utils.module_loading import import_string
+
+from .previews import PREVIEW_FIELDS
+from .tasks import enqueue, enqueue_many, task
+
+audit_logger = logging.getLogger('hello.audit')
+
+# model label -> file fields to scan
+UPLOAD_FIELDS = {
+    'hello.JobApplication': ['cv', 'cover_letter'],
+    'hello.UserMessage': ['file'],
+}
+
+RECEIPTS = {
+    'hello.JobApplication': ('Application received',
+                             'We have received your application for {obj.job_title}. '
+                             'You will hear from us when its status changes.'),
+    'hello.UserMessage': ('Message received',
+                          'We have received your message and will reply as soon as we can.'),
+}
+
+EICAR = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+
+def eicar_scanner(field_file):
+    """Stub scanner: flags only the EICAR test signature."""
+    tail = b''
+    with field_file.open('rb') as f:
+        for chunk in f.chunks():
+            if EICAR in tail + chunk:
+                return 'EICAR-Test-File'
+            tail = (tail + chunk)[-len(EICAR):]
+    return None
+
+
+def after_submit(obj, action):
+    """Queue the follow-up work for a just-saved ``obj``, with one INSERT."""
+    label = obj._meta.label
+    payload = {'model': label, 'id': obj.pk}
+    tasks = [('audit', {**payload, 'action': action, 'user': obj.user_id})]
+    if any(getattr(obj, field) for field in UPLOAD_FIELDS.get(label, ())):
+        tasks.append(('scan_uploads', payload))
+    if label in RECEIPTS:
+        tasks.append(('send_receipt', payload))
+    return enqueue_many(tasks)
+
+
+@task('scan_uploads')
+def scan_uploads(model, id):
+    obj = apps.get_model(model).objects.filter(pk=id).first()
+    if obj is None:
+        return
+    scanner = import_string(settings.VIRUS_SCANNER)
+    infected = {}
+    for field in UPLOAD_FIELDS[model]:
+        field_file = getattr(obj, field)
+        if field_file:
+            verdict = scanner(field_file)
+            if verdict:
+                infected[field] = verdict
+    if infected:
+        enqueue('audit', model=model, id=id, action='upload_infected', user=obj.user_id, detail=infected)
+        mail_admins(f'Infected upload in {model} #{id}', json.dumps(infected))
+    elif model in PREVIEW_FIELDS:
+        # Only clean files are handed to the image / PDF renderers
+        enqueue('generate_previews', model=model, ids=[id])
+
+
+@task('send_receipt')
+def send_receipt(model, id):
+    obj = apps.get_model(model).objects.select_related('user').filter(pk=id).first()
+    if obj is None:
+        return
+    subject, body = RECEIPTS[model]
+    send_mail(subject, f'Dear {obj.user.first_name},\n\n{body.format(obj=obj)}\n',
+              settings.DEFAULT_FROM_EMAIL, [obj.user.email])
+
+
+@task('audit')
+def audit(action, model, id, user=None, **detail):
+    audit_logger.info(json.dumps({'action': action, 'model': model, 'id': id, 'user': user, **detail}))
@@ -0,0 +1,185 @@
+"""
+Synthetic applicants for local load and scale testing.
+
+``generate()`` bulk-inserts users with their documents, job applications and
+messages. The same seed gives the same rows. The shape roughly follows a
+live deployment: most users have a few messages, a few have hundreds, and
+registrations, applications and replies are spread over the
+``days`` before ``end``.
+
+Every file field points to one of a handful of small placeholder files.
+Because storage is content-addressed, these are saved once and shared by
+every row. All users get the same password, ``PASSWORD``, hashed once.
+"""
+import hashlib
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import User, UserDocument, JobApplication, UserMessage
+
+PASSWORD = 'synthetic-password'
+
+FIRST_NAMES = ['Amina', 'Baraka', 'Neema', 'Juma', 'Zawadi', 'Halima', 'Rehema', 'Omari', 'Imani', 'Faraji',
+               'Asha', 'Daudi', 'Mwajuma', 'Hamisi', 'Subira', 'Tumaini', 'Upendo', 'Khamis', 'Saida', 'Jabari']
+LAST_NAMES = ['Mwangi', 'Otieno', 'Kamau', 'Mollel', 'Njoroge', 'Wanjiru', 'Mushi', 'Kimaro', 'Swai', 'Achieng',
+              'Hassan', 'Mbwana', 'Lyimo', 'Massawe', 'Ngowi', 'Shirima', 'Komba', 'Mrema', 'Temba', 'Urassa']
+JOB_TITLES = ['Field officer', 'Accountant', 'Data clerk', 'Driver', 'Nurse', 'Teacher', 'Software developer',
+              'Procurement officer', 'Community health worker', 'Logistics assistant', 'HR assistant', 'Cashier']
+MESSAGES = ['When will I hear back about my application for {job}?',
+            'I uploaded the wrong CV, can I replace it?',
+            'My education certificate is attached.',
+            'Is the {job} position still open?',
+            'I cannot log in since I changed my phone number.',
+            'Please update my marital status to married.']
+REPLIES = ['Thank you, we have received it.', 'Shortlisting ends next week; you will be contacted by email.',
+           'Yes, please apply again with the new document.', 'The position has been filled, sorry.']
+
+GENDERS = [('female', 48), ('male', 48), ('other', 4)]
+MARITAL_STATUSES = [('single', 55), ('married', 38), ('divorced', 4), ('widowed', 3)]
+STATUSES = [('pending', 50), ('reviewed', 25), ('rejected', 20), ('hired', 5)]
+
+PDF = (b'%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n'
+       b'3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n')
+# 1x1 white JPEG
+JPEG = bytes.fromhex(
+    'ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707070909080a0c140d0c0b0b0c1912130f141d1a'
+    '1f1e1d1a1c1c20242e2720222c231c1c2837292c30313434341f27393d38323c2e333432ffc0000b080001000101011100ffc4001f'
+    '0000010501010101010100000000000000000102030405060708090a0bffc400b5100002010303020403050504040000017d010203'
+    '00041105122131410613516107227114328191a1082342b1c11552d1f02433627282090a161718191a25262728292a343536373839'
+    '3a434445464748494a535455565758595a636465666768696a737475767778797a838485868788898a92939495969798999aa2a3a4'
+    'a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9fa'
+    'ffda0008010100003f00fbd3ffd9'
+)
+
+
+@dataclass
+class GenerationResult:
+    users: int = 0
+    documents: int = 0
+    applications: int = 0
+    messages: int = 0
+    user_ids: list = field(default_factory=list, repr=False)
+
+    def summary(self):
+        return (f'{self.users} users, {self.documents} documents, {self.applications} applications, '
+                f'{self.messages} messages')
+
+
+def placeholder_files():
+    """Storage names of the shared placeholder files, saving them if needed."""
+    return {
+        'photo': default_storage.save('user_documents/placeholder.jpg', ContentFile(JPEG)),
+        'pdf': default_storage.save('user_documents/placeholder.pdf', ContentFile(PDF)),
+    }
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def heavy_tailed(rng, mean):
+    """Mostly near ``mean``, occasionally many times it."""
+    if mean <= 0:
+        return 0
+    return round(rng.paretovariate(2.5) * mean * 0.6)
+
+
+def email(prefix, index):
+    return f'{prefix}{index}@example.com'
+
+
+def id_tag(prefix):
+    """``id_number`` prefix of the users of ``prefix``: a digest of the whole of it,
+    so prefixes that share a stem (``synthetic``, ``synthetic2``) do not clash."""
+    return hashlib.sha256(prefix.encode()).hexdigest()[:8].upper()
+
+
+def id_number(tag, index):
+    return f'{tag}{index:09d}'
+
+
+def generate(users, seed=0, prefix='synthetic', messages=5.0, applications=1.5, days=730,
+             end=datetime(2025, 1, 1, tzinfo=dt_timezone.utc), batch_size=2000, using='default', progress=None):
+    """Insert ``users`` users and their rows; returns a ``GenerationResult``.
+
+    ``messages`` and ``applications`` are means per user. ``progress`` is
+    called with the result so far after each batch.
+    """
+    rng = random.Random(seed)
+    files = placeholder_files()
+    password = make_password(PASSWORD)
+    tag = id_tag(prefix)
+    result = GenerationResult()
+    for start in range(0, users, batch_size):
+        batch = range(start, min(start + batch_size, users))
+        with transaction.atomic(using=using):
+            result.user_ids += generate_batch(rng, batch, prefix, tag, password, files, messages,
+                                              applications, days, end, using, result)
+        if progress:
+            progress(result)
+    return result
+
+
+def generate_batch(rng, indexes, prefix, tag, password, files, messages, applications, days, end, using, result):
+    new_users = []
+    for i in indexes:
+        registered = end - timedelta(seconds=rng.randrange(days * 86400))
+        new_users.append(User(
+            first_name=rng.choice(FIRST_NAMES),
+            middle_name=rng.choice(FIRST_NAMES) if rng.random() < 0.3 else None,
+            last_name=rng.choice(LAST_NAMES),
+            date_of_birth=date(1960, 1, 1) + timedelta(days=rng.randrange(45 * 365)),
+            phone_number=f'07{rng.randrange(10 ** 8):08d}',
+            email=email(prefix, i),
+            gender=weighted(rng, GENDERS),
+            id_number=id_number(tag, i),
+            marital_status=weighted(rng, MARITAL_STATUSES),
+            form_four_number=f'S{rng.randrange(10000):04d}/{rng.randrange(10000):04d}/{rng.randrange(1990, 2020)}',
+            password=password,
+            registration_date=registered,
+            is_active=rng.random() < 0.97,
+        ))
+    User.objects.using(using).bulk_create(new_users)
+
+    documents, job_applications, user_messages = [], [], []
+    for user in new_users:
+        registered = user.registration_date
+        span = max(1, int((end - registered).total_seconds()))
+        if rng.random() < 0.9:
+            documents += [
+                UserDocument(user=user, document_type=document_type, uploaded_at=registered,
+                             file=files['photo'] if document_type == 'passport_photo' else files['pdf'])
+                for document_type, _ in UserDocument.DOCUMENT_TYPES
+            ]
+        for _ in range(heavy_tailed(rng, applications)):
+            job_applications.append(JobApplication(
+                user=user, job_title=rng.choice(JOB_TITLES), cv=files['pdf'], cover_letter=files['pdf'],
+                status=weighted(rng, STATUSES), application_date=registered + timedelta(seconds=rng.randrange(span)),
+            ))
+        for _ in range(heavy_tailed(rng, messages)):
+            created = registered + timedelta(seconds=rng.randrange(span))
+            replied = rng.random() < 0.5
+            attached = rng.random() < 0.15
+            user_messages.append(UserMessage(
+                user=user, message=rng.choice(MESSAGES).format(job=rng.choice(JOB_TITLES)), created_at=created,
+                admin_reply=rng.choice(REPLIES) if replied else None,
+                reply_date=min(end, created + timedelta(hours=rng.randrange(1, 96))) if replied else None,
+                file=files['pdf'] if attached else None, file_name='attachment.pdf' if attached else None,
+                file_type='application/pdf' if attached else None,
+            ))
+    UserDocument.objects.using(using).bulk_create(documents)
+    JobApplication.objects.using(using).bulk_create(job_applications)
+    UserMessage.objects.using(using).bulk_create(user_messages)
+
+    result.users += len(new_users)
+    result.documents += len(documents)
+    result.applications += len(job_applications)
+    result.messages += len(user_messages)
+    return [user.pk for user in new_users]
@@ -0,0 +1,144 @@
+"""
+Broker-less background tasks backed by the ``tasks`` table.
+
+Views call ``enqueue()`` / ``enqueue_many()`` inside their own transaction,
+so a task exists only if the row it refers to was committed. ``manage.py
+run_tasks`` workers claim due rows with ``SELECT ... FOR UPDATE SKIP LOCKED``
+(on PostgreSQL), so any number of workers can run side by side without
+handing out a task twice.
+
+A claimed task is leased: its ``run_at`` moves TASK_LEASE seconds ahead, and
+if the worker dies before finishing, the task becomes due again then. A
+handler that raises is retried with exponential backoff until it has had
+``max_attempts`` attempts; after that the task moves to the dead-letter table
+(``FailedTask``), where the admin can inspect and requeue it. Tasks can run
+more than once, so handlers should be safe to repeat.
+
+Finished tasks stay in the table as ``done`` for TASK_DONE_RETENTION days
+and are then deleted by ``purge_done()``, which run_tasks workers call every
+TASK_PURGE_INTERVAL seconds.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Task, FailedTask
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name, max_attempts=None):
+    """Register ``fn`` as the handler for tasks called ``name``.
+
+    ``max_attempts`` defaults to TASK_MAX_ATTEMPTS, read when the task runs.
+    """
+    def register(fn):
+        fn.max_attempts = max_attempts
+        TASKS[name] = fn
+        return fn
+    return register
+
+
+def enqueue(name, **payload):
+    if name not in TASKS:
+        raise KeyError(f'Unknown task {name!r}')
+    return Task.objects.create(name=name, payload=payload)
+
+
+def enqueue_many(tasks):
+    """Queue ``(name, payload)`` pairs with a single INSERT."""
+    for name, _ in tasks:
+        if name not in TASKS:
+            raise KeyError(f'Unknown task {name!r}')
+    return Task.objects.bulk_create(Task(name=name, payload=payload) for name, payload in tasks)
+
+
+def retry_delay(attempts):
+    """Seconds before attempt ``attempts + 1``: doubling, capped, with jitter."""
+    delay = min(settings.TASK_RETRY_MAX_DELAY, settings.TASK_RETRY_DELAY * 2 ** (attempts - 1))
+    # Spread retries of tasks that failed together (e.g. during an outage)
+    return delay * random.uniform(0.5, 1)
+
+
+def claim(batch_size=10):
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status__in=['queued', 'running'], run_at__lte=now)
+            .order_by('run_at')[:batch_size]
+        )
+        for claimed in tasks:
+            claimed.status = 'running'
+            claimed.attempts += 1
+            claimed.run_at = now + timedelta(seconds=settings.TASK_LEASE)
+        Task.objects.bulk_update(tasks, ['status', 'attempts', 'run_at'])
+    return tasks
+
+
+def dead_letter(claimed, error):
+    with transaction.atomic():
+        FailedTask.objects.create(
+            name=claimed.name, payload=claimed.payload, attempts=claimed.attempts,
+            last_error=error, created_at=claimed.created_at,
+        )
+        Task.objects.filter(pk=claimed.pk).delete()
+
+
+def run(claimed):
+    handler = TASKS.get(claimed.name)
+    try:
+        if handler is None:
+            raise KeyError(f'Unknown task {claimed.name!r}')
+        handler(**claimed.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if handler is None or claimed.attempts >= (handler.max_attempts or settings.TASK_MAX_ATTEMPTS):
+            logger.exception('Task %s failed for good after %d attempts', claimed, claimed.attempts)
+            dead_letter(claimed, error)
+            return
+        delay = retry_delay(claimed.attempts)
+        logger.warning('Task %s failed, retrying in %.0fs', claimed, delay, exc_info=True)
+        claimed.status, claimed.last_error = 'queued', error
+        claimed.run_at = timezone.now() + timedelta(seconds=delay)
+    else:
+        claimed.status, claimed.last_error = 'done', None
+        claimed.run_at = timezone.now()  # when it finished, for purge_done()
+    Task.objects.filter(pk=claimed.pk).update(
+        status=claimed.status, last_error=claimed.last_error, run_at=claimed.run_at,
+    )
+
+
+def run_pending(batch_size=10):
+    """Run queued tasks until none are due; returns how many ran."""
+    count = 0
+    while True:
+        tasks = claim(batch_size)
+        if not tasks:
+            return count
+        for claimed in tasks:
+            run(claimed)
+        count += len(tasks)
+
+
+def purge_done(days=None):
+    """Delete tasks finished more than ``days`` (default TASK_DONE_RETENTION) ago; returns how many."""
+    days = settings.TASK_DONE_RETENTION if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Task.objects.filter(status='done', run_at__lt=cutoff).delete()
+    return deleted
+
+
+def requeue(failed_tasks):
+    """Move dead letters back to the queue with a fresh attempt count."""
+    with transaction.atomic():
+        tasks = Task.objects.bulk_create(Task(name=failed.name, payload=failed.payload) for failed in failed_tasks)
+        FailedTask.objects.filter(pk__in=[failed.pk for failed in failed_tasks]).delete()
+    return tasks
@@ -1,2 +1,1716 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
+try:
+    import PIL.Image
+except ImportError:
+    PIL = None
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import is_password_usable, make_password
+from django.core import mail, signing
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections, router
+from django.http import StreamingHttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import cache, compression
+from .cache import cache_stats, get_cache, invalidate_user, reset_cache_stats, version_key
+from .checks import check_shared_user_cache
+from .events import broker, notices, pack, uses_notify
+from .hashers import configure_hashing_pool
+from .imports import ImportFormatError, import_applicants
+from .media import signed_media_url
+from .metrics import reset_metrics
+from .models import User, UserDocument, JobApplication, UserMessage, Task, FailedTask
+from .pagination import EstimatedCountPaginator, changes_since, keyset_page
+from .renderers import FastJSONRenderer, dumps
+from .routers import PIN_COOKIE, is_pinned, reset_replica_state
+from .serializers import UserMessageSerializer, UserSerializer
+from .storage import StreamingFileSystemStorage
+from .submissions import EICAR, eicar_scanner
+from .synthetic import generate
+from .throttling import hit
+from .tokens import issue_tokens, revoke_tokens, verify_token
+from .tasks import claim, purge_done, run_pending
+from .views import REGISTRATION_FIELD_MAPPING
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# Rate limits are switched off for the module (ThrottleTests turns on the ones
+# it checks), or requests from the test client would add up across tests
+THROTTLING_OFF = override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': dict.fromkeys(settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']),
+})
+
+
+def setUpModule():
+    THROTTLING_OFF.enable()
+
+
+def tearDownModule():
+    THROTTLING_OFF.disable()
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+    })
+
+
+# Production PBKDF2 cost would make every make_user() take most of a second
+FAST_HASHING = override_settings(
+    PASSWORD_HASHERS=settings.PASSWORD_HASHERS,
+    PASSWORD_HASH_COST={'pbkdf2_sha256': {'iterations': 1000}},
+)
+
+
+def make_user(email='user@example.com', id_number='ID-1', password='secret123', **extra):
+    user = User(
+        first_name='Asha', last_name='Juma', date_of_birth=date(1995, 1, 1),
+        phone_number='0712345678', email=email, gender='female',
+        id_number=id_number, marital_status='single', form_four_number='S0101/0001/2012',
+        **extra
+    )
+    user.set_password(password)
+    user.save()
+    return user
+
+
+def add_history(user, count):
+    for document_type, _ in UserDocument.DOCUMENT_TYPES:
+        UserDocument.objects.create(user=user, document_type=document_type, file=f'user_documents/{document_type}.pdf')
+    UserMessage.objects.bulk_create(
+        UserMessage(user=user, message=f'Message {i}') for i in range(count)
+    )
+    JobApplication.objects.bulk_create(
+        JobApplication(user=user, job_title=f'Job {i}', cv='applications/cv/cv.pdf',
+                       cover_letter='applications/cover_letters/letter.pdf')
+        for i in range(count)
+    )
+
+
+def upload(name='file.pdf', content=b'%PDF-1.4 test'):
+    return SimpleUploadedFile(name, content, content_type='application/pdf')
+
+
+def registration_data(i=0, **overrides):
+    data = {
+        'first_name': 'Neema', 'last_name': 'Ali', 'date_of_birth': '1990-05-05',
+        'phone_number': '0700000000', 'email': f'new{i}@example.com', 'gender': 'female',
+        'id_number': f'ID-NEW-{i}', 'marital_status': 'single', 'form_four_number': 'S1/1/2010',
+        'password': 'secret123', 'confirm_password': 'secret123',
+        'passport_photo': upload('photo.jpg'), 'birth_certificate': upload('birth.pdf'),
+        'education_certificate': upload('education.pdf'),
+    }
+    data.update(overrides)
+    return data
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+@FAST_HASHING
+class QueryCountTests(TestCase):
+    """Every view must cost the same number of queries regardless of history size."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.small = make_user('small@example.com', 'ID-SMALL')
+        self.large = make_user('large@example.com', 'ID-LARGE')
+        add_history(self.small, 1)
+        add_history(self.large, 50)
+
+    def count_queries(self, method, url, data=None, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, **kwargs)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(queries)
+
+    def assertConstantQueries(self, method, url_for, data_for=None, **kwargs):
+        counts = [
+            self.count_queries(method, url_for(user), data_for(user) if data_for else None, **kwargs)
+            for user in (self.small, self.large)
+        ]
+        self.assertEqual(counts[0], counts[1], f'{url_for(self.large)} scales with history: {counts}')
+
+    def test_home(self):
+        self.assertEqual(self.count_queries('get', '/api/'), 0)
+
+    def test_profile(self):
+        self.assertConstantQueries('get', lambda user: f'/api/profile/{user.id}/')
+
+    def test_login(self):
+        self.assertConstantQueries(
+            'post', lambda user: '/api/login/',
+            lambda user: {'email': user.email, 'password': 'secret123'},
+            content_type='application/json',
+        )
+
+    def test_user_messages(self):
+        self.assertConstantQueries('get', lambda user: f'/api/messages/{user.id}/')
+
+    def test_submit_message(self):
+        self.assertConstantQueries(
+            'post', lambda user: '/api/messages/',
+            lambda user: {'user_id': user.id, 'message': 'Hello', 'file': upload()},
+        )
+
+    def test_submit_application(self):
+        self.assertConstantQueries(
+            'post', lambda user: '/api/apply-job/',
+            lambda user: {'user_id': user.id, 'job_title': 'Developer', 'cv': upload('cv.pdf'),
+                          'cover_letter': upload('letter.pdf')},
+        )
+
+    def test_register(self):
+        counts = []
+        for i in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/register/', registration_data(i))
+            self.assertEqual(response.status_code, 201, response.content)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+@FAST_HASHING
+class ProfileSerializationTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        add_history(self.user, 30)
+
+    @override_settings(PROFILE_NESTED_LIMIT=10)
+    def test_nested_lists_are_bounded(self):
+        response = self.client.get(f'/api/profile/{self.user.id}/')
+        user = response.json()['user']
+        self.assertEqual(len(user['documents']), 3)
+        self.assertEqual(len(user['messages']), 10)
+        self.assertTrue(user['messages_has_more'])
+        self.assertEqual(len(user['applications']), 10)
+        self.assertTrue(user['applications_has_more'])
+        self.assertEqual(user['messages'][0]['id'], self.user.messages.order_by('-created_at', '-id')[0].id)
+
+    def test_short_history_has_no_more(self):
+        response = self.client.get(f'/api/profile/{self.user.id}/')
+        user = response.json()['user']
+        self.assertEqual(len(user['messages']), 20)
+        self.assertTrue(user['messages_has_more'])
+        UserMessage.objects.filter(id__in=list(self.user.messages.values_list('id', flat=True)[:15])).delete()
+        user = self.client.get(f'/api/profile/{self.user.id}/').json()['user']
+        self.assertEqual(len(user['messages']), 15)
+        self.assertFalse(user['messages_has_more'])
+
+
+@FAST_HASHING
+class MessageHistoryTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        now = timezone.now()
+        # Half the rows share a timestamp so the id tie-breaker is exercised
+        UserMessage.objects.bulk_create(
+            UserMessage(user=self.user, message=f'Message {i}', created_at=now if i % 2 else now - timedelta(seconds=i))
+            for i in range(25)
+        )
+        self.expected = list(self.user.messages.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_cursor_pages_cover_history_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': 7}
+            if cursor:
+                params['cursor'] = cursor
+            body = self.client.get(f'/api/messages/{self.user.id}/', params).json()
+            self.assertLessEqual(len(body['messages']), 7)
+            seen += [message['id'] for message in body['messages']]
+            cursor = body['next_cursor']
+            self.assertEqual(body['has_more'], cursor is not None)
+            if not cursor:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'/api/messages/{self.user.id}/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(f'/api/messages/{self.user.id}/', {'page_size': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_ndjson_stream(self):
+        response = self.client.get(f'/api/messages/{self.user.id}/', {'stream': '1'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], self.expected)
+
+
+# Media URLs embed the signing time; keep it fixed while comparing payloads
+FIXED_SIGNING_TIME = mock.patch.object(signing.TimestampSigner, 'timestamp', lambda signer: '1abcde')
+
+
+@FAST_HASHING
+@FIXED_SIGNING_TIME
+class LeanPayloadTests(TestCase):
+    """The values() read path renders exactly what the serializers did."""
+
+    def setUp(self):
+        self.user = make_user(middle_name='Neema')
+        add_history(self.user, 25)
+        UserDocument.objects.filter(user=self.user, document_type='passport_photo').update(preview='previews/photo.jpg')
+        UserMessage.objects.create(user=self.user, message='Line\u2028break "quoted" \u00e9', file='user_messages/a.pdf',
+                                   file_name='a.pdf', file_type='application/pdf', admin_reply='Noted',
+                                   reply_date=timezone.now())
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_profile_and_login(self):
+        expected = UserSerializer(User.objects.with_profile().get(pk=self.user.id)).data
+        response = self.client.get(f'/api/profile/{self.user.id}/')
+        self.assertEqual(response.content, self.render({'success': True, 'user': expected}))
+        invalidate_user(self.user.id)
+        response = self.client.post('/api/login/', {'email': self.user.email, 'password': 'secret123'},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['user'], json.loads(self.render(expected)))
+
+    def test_message_pages(self):
+        url = f'/api/messages/{self.user.id}/'
+        response = self.client.get(url, {'page_size': 10})
+        messages, next_cursor = keyset_page(UserMessage.objects.filter(user=self.user), '', 10)
+        self.assertEqual(response.content, self.render({
+            'success': True, 'messages': UserMessageSerializer(messages, many=True).data,
+            'next_cursor': next_cursor, 'has_more': True,
+        }))
+
+        since = timezone.now() - timedelta(hours=1)
+        response = self.client.get(url, {'since': since.isoformat(), 'page_size': 5})
+        messages, next_since, has_more = changes_since(UserMessage.objects.filter(user=self.user), since, 5)
+        self.assertEqual(response.content, self.render({
+            'success': True, 'messages': UserMessageSerializer(messages, many=True).data,
+            'next_since': next_since, 'has_more': has_more,
+        }))
+
+        response = self.client.get(url, {'stream': '1'})
+        self.assertEqual(b''.join(response.streaming_content).decode(), ''.join(
+            json.dumps(UserMessageSerializer(message).data, cls=JSONEncoder) + '\n'
+            for message in UserMessage.objects.filter(user=self.user).order_by('-created_at', '-id')
+        ))
+
+    def test_renderer_matches_drf(self):
+        data = {'text': 'a\u2028b\u2029c\x00\t\u00e9\U0001f600', 'when': timezone.now(), 'utc': datetime(2025, 1, 1, tzinfo=dt_timezone.utc),
+                'day': date(2025, 1, 1), 'amount': Decimal('1.50'), 'lazy': gettext_lazy('Hello'),
+                'rows': ('x', [1, None, True]), 'big': 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # Non-string keys are left to the stock renderer
+        self.assertEqual(FastJSONRenderer().render({1: 'one'}), b'{"1":"one"}')
+        self.assertEqual(dumps({'b': 1, 'a': [date(2025, 1, 1)]}, sort_keys=True), b'{"a":["2025-01-01"],"b":1}')
+
+
+@FAST_HASHING
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        add_history(self.user, 20)
+        self.url = f'/api/profile/{self.user.id}/'
+
+    def test_gzip(self):
+        plain = self.client.get(self.url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(self.url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(int(response['Content-Length']), len(plain.content))
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        again = self.client.get(self.url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    @unittest.skipUnless(compression.brotli, 'brotli is not installed')
+    def test_brotli(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, headers={'Accept-Encoding': 'gzip, deflate, br'})
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), plain.content)
+
+    def test_not_compressed(self):
+        for accept in ('identity', 'gzip;q=0', 'compress'):
+            response = self.client.get(self.url, headers={'Accept-Encoding': accept})
+            self.assertFalse(response.has_header('Content-Encoding'), accept)
+        # Too small, or streamed
+        self.assertFalse(self.client.get('/api/', headers={'Accept-Encoding': 'gzip'}).has_header('Content-Encoding'))
+        response = self.client.get(f'/api/messages/{self.user.id}/', {'stream': '1'}, headers={'Accept-Encoding': 'gzip'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        json.loads(b''.join(response.streaming_content).splitlines()[0])
+
+    def test_negotiation(self):
+        best = 'br' if compression.brotli else 'gzip'
+        for header, expected in [('gzip', 'gzip'), ('*', best), ('br;q=0.5, gzip', 'gzip'),
+                                 ('GZIP;q=0.3, br;q=0.8', best), ('gzip;q=0, *;q=0.1', 'br' if compression.brotli else None),
+                                 ('', None), ('gzip;q=oops', None)]:
+            encoding = compression.choose_encoding(header)
+            self.assertEqual(encoding and encoding[0], expected, header)
+
+
+@FAST_HASHING
+class PasswordHashingTests(TestCase):
+    def test_new_passwords_use_preferred_hasher(self):
+        user = make_user()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(user.check_password('secret123'))
+        self.assertFalse(user.check_password('wrong'))
+
+    def test_legacy_sha256_is_upgraded_on_login(self):
+        user = make_user()
+        User.objects.filter(pk=user.pk).update(password=hashlib.sha256(b'secret123').hexdigest())
+
+        response = self.client.post('/api/login/', {'email': user.email, 'password': 'wrong'}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        user.refresh_from_db()
+        self.assertEqual(len(user.password), 64)
+
+        response = self.client.post('/api/login/', {'email': user.email, 'password': 'secret123'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('secret123'))
+
+    def test_raising_cost_rehashes_on_login(self):
+        user = make_user()
+        with override_settings(PASSWORD_HASHERS=settings.PASSWORD_HASHERS,
+                               PASSWORD_HASH_COST={'pbkdf2_sha256': {'iterations': 1200}}):
+            self.assertTrue(user.check_password('secret123'))
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('pbkdf2_sha256$1200$'))
+
+
+@FAST_HASHING
+class HashingPoolTests(TestCase):
+    def tearDown(self):
+        configure_hashing_pool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_MAX_QUEUE)
+
+    def test_saturated_pool_returns_503(self):
+        user = make_user()
+        pool = configure_hashing_pool(1, 0)
+        release = threading.Event()
+        busy = pool.submit(release.wait)
+        try:
+            response = self.client.post('/api/login/', {'email': user.email, 'password': 'secret123'},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            response = self.client.post('/api/register/', registration_data())
+            self.assertEqual(response.status_code, 503)
+            self.assertFalse(User.objects.filter(email='new0@example.com').exists())
+        finally:
+            release.set()
+            busy.result()
+
+        response = self.client.post('/api/login/', {'email': user.email, 'password': 'secret123'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rehash_on_login_takes_one_pool_job(self):
+        user = make_user()
+        User.objects.filter(pk=user.pk).update(password=hashlib.sha256(b'secret123').hexdigest())
+        pool = configure_hashing_pool(1, 0)
+        with mock.patch.object(pool, 'submit', wraps=pool.submit) as submit:
+            response = self.client.post('/api/login/', {'email': user.email, 'password': 'secret123'},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(submit.call_count, 1)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+
+@FAST_HASHING
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RegistrationTests(TestCase):
+    def test_frontend_field_names_are_mapped(self):
+        data = registration_data()
+        for frontend_field, backend_field in REGISTRATION_FIELD_MAPPING.items():
+            if backend_field in data:
+                data[frontend_field] = data.pop(backend_field)
+        response = self.client.post('/api/register/', data)
+        self.assertEqual(response.status_code, 201, response.content)
+        user = User.objects.get(email='new0@example.com')
+        self.assertEqual(user.id_number, 'ID-NEW-0')
+        self.assertEqual(user.marital_status, 'single')
+        self.assertEqual(sorted(user.documents.values_list('document_type', flat=True)),
+                         sorted(key for key, _ in UserDocument.DOCUMENT_TYPES))
+
+    def test_duplicates_are_reported_per_field(self):
+        make_user('taken@example.com', 'ID-TAKEN')
+        response = self.client.post('/api/register/', registration_data(email='taken@example.com'))
+        self.assertEqual(response.json()['message'], 'Email already registered. Please login instead.')
+        response = self.client.post('/api/register/', registration_data(id_number='ID-TAKEN'))
+        self.assertEqual(response.json()['message'], 'ID Number already registered.')
+
+    def test_registration_is_atomic(self):
+        race = IntegrityError('UNIQUE constraint failed: users.id_number')
+        with mock.patch.object(UserDocument.objects, 'bulk_create', side_effect=race):
+            response = self.client.post('/api/register/', registration_data())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'ID Number already registered.')
+        self.assertFalse(User.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+@FAST_HASHING
+class TokenAuthTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        response = self.client.post('/api/login/', {'email': self.user.email, 'password': 'secret123'},
+                                    content_type='application/json')
+        self.tokens = response.json()['tokens']
+
+    def post_message(self, access=None, **data):
+        headers = {'Authorization': f'Bearer {access or self.tokens["access"]}'}
+        return self.client.post('/api/messages/', {'message': 'Hello', **data}, headers=headers)
+
+    def test_token_identifies_the_caller_without_a_query(self):
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post_message()
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertFalse([q['sql'] for q in queries if '"users"' in q['sql']])
+        self.assertEqual(UserMessage.objects.filter(user=self.user).count(), 2)
+
+    def test_token_wins_over_user_id(self):
+        other = make_user('other@example.com', 'ID-2')
+        self.assertEqual(self.post_message(user_id=other.id).status_code, 403)
+        self.assertEqual(self.post_message(user_id=self.user.id).status_code, 201)
+
+    def test_invalid_tokens_are_rejected(self):
+        self.assertEqual(self.post_message(self.tokens['access'][:-1] + 'x').status_code, 401)
+        self.assertEqual(self.post_message(self.tokens['refresh']).status_code, 401)
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            response = self.post_message()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+    def test_refresh(self):
+        response = self.client.post('/api/token/refresh/', {'refresh': self.tokens['refresh']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.post_message(response.json()['tokens']['access']).status_code, 201)
+        response = self.client.post('/api/token/refresh/', {'refresh': self.tokens['access']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_revokes_every_token(self):
+        response = self.client.post('/api/logout/', headers={'Authorization': f'Bearer {self.tokens["access"]}'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.post_message().status_code, 401)
+        response = self.client.post('/api/token/refresh/', {'refresh': self.tokens['refresh']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivation_revokes(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.post_message().status_code, 401)
+
+    def test_stale_token_does_not_block_public_views(self):
+        # A client still sending an expired header must be able to log in again
+        headers = {'Authorization': f'Bearer {self.tokens["access"]}'}
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            response = self.client.post('/api/login/', {'email': self.user.email, 'password': 'secret123'},
+                                        content_type='application/json', headers=headers)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(self.client.get(f'/api/profile/{self.user.id}/', headers=headers).status_code, 200)
+            self.assertEqual(self.client.get(f'/api/messages/{self.user.id}/', headers=headers).status_code, 200)
+            response = self.client.post('/api/register/', registration_data(), headers=headers)
+            self.assertEqual(response.status_code, 201, response.content)
+
+    def test_revocation_reaches_other_workers(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        self.enterContext(override_settings(DEBUG=False, CACHES={**settings.CACHES, 'shared': shared}))
+        self.assertEqual([error.id for error in check_shared_user_cache(None)], ['hello.E001'])
+        self.enterContext(override_settings(USER_CACHE_ALIAS='shared'))
+        self.assertEqual(check_shared_user_cache(None), [])
+
+        # Two worker processes, each with its own connection to the shared cache
+        worker_a, worker_b = caches.create_connection('shared'), caches.create_connection('shared')
+        with mock.patch('hello.tokens.get_cache', lambda: worker_a):
+            self.assertIsNotNone(verify_token(self.tokens['access']))
+        with mock.patch('hello.tokens.get_cache', lambda: worker_b):
+            revoke_tokens(self.user.id)
+        with mock.patch('hello.tokens.get_cache', lambda: worker_a):
+            self.assertIsNone(verify_token(self.tokens['access']))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+@FAST_HASHING
+class ThrottleTests(TestCase):
+    def setUp(self):
+        caches[settings.THROTTLE_CACHE_ALIAS].clear()
+        self.user = make_user()
+
+    def login(self, email=None, address='10.0.0.1'):
+        return self.client.post('/api/login/', {'email': email or self.user.email, 'password': 'wrong'},
+                                content_type='application/json', REMOTE_ADDR=address)
+
+    def test_sliding_window(self):
+        self.assertEqual([hit('k', 3, 60, now=120)[0] for _ in range(4)], [True, True, True, False])
+        # Halfway through the next window half of the previous 4 hits still count
+        self.assertEqual(hit('k', 3, 60, now=210), (True, 0))
+        allowed, wait = hit('k', 3, 60, now=210)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 15)
+        self.assertEqual(hit('k', 3, 60, now=330), (True, 0))
+
+    @throttle_rates(login_ip='2/min')
+    def test_login_is_limited_per_address(self):
+        self.assertEqual([self.login().status_code for _ in range(2)], [401, 401])
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        # Over budget in this window: it must still weigh little enough in the next
+        self.assertTrue(1 <= int(response['Retry-After']) <= 80)
+        self.assertEqual(self.login(address='10.0.0.2').status_code, 401)
+
+    @throttle_rates(login_email='2/min')
+    def test_login_is_limited_per_account(self):
+        self.login(address='10.0.0.1')
+        self.login(self.user.email.upper(), address='10.0.0.2')
+        response = self.login(address='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.login('other@example.com', address='10.0.0.3').status_code, 401)
+
+    @throttle_rates(upload_ip='1/hour')
+    def test_uploads_are_rejected_before_the_body_is_parsed(self):
+        data = {'user_id': self.user.id, 'message': 'Hello', 'file': upload()}
+        self.assertEqual(self.client.post('/api/messages/', data, REMOTE_ADDR='10.0.0.1').status_code, 201)
+        data['file'] = upload()
+        with mock.patch('rest_framework.parsers.MultiPartParser.parse') as parse:
+            response = self.client.post('/api/messages/', data, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        parse.assert_not_called()
+        self.assertEqual(UserMessage.objects.count(), 1)
+
+    @throttle_rates(upload_user='1/hour')
+    def test_uploads_are_limited_per_user(self):
+        access = issue_tokens(self.user)['access']
+        statuses = [
+            self.client.post('/api/apply-job/', {'job_title': 'Developer', 'cv': upload('cv.pdf'),
+                                                 'cover_letter': upload('letter.pdf')},
+                             headers={'Authorization': f'Bearer {access}'}, REMOTE_ADDR=address).status_code
+            for address in ('10.0.0.1', '10.0.0.2')
+        ]
+        self.assertEqual(statuses, [201, 429])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, METRICS_SLOW_REQUEST=None)
+@FAST_HASHING
+class MetricsTests(TestCase):
+    def setUp(self):
+        reset_metrics()
+        self.user = make_user()
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_records_latency_queries_and_sizes_per_view(self):
+        for _ in range(2):
+            self.client.get(f'/api/profile/{self.user.id}/')
+        content = os.urandom(5000)
+        self.client.post('/api/messages/', {'user_id': self.user.id, 'message': 'Hi', 'file': upload(content=content)})
+        self.client.get('/nowhere/')
+
+        samples = self.scrape()
+        profile = 'view="get_user_profile"'
+        self.assertEqual(samples[f'hello_request_duration_seconds_count{{{profile},method="GET",status="200"}}'], 2)
+        self.assertEqual(samples[f'hello_request_duration_seconds_bucket{{{profile},method="GET",status="200",le="+Inf"}}'], 2)
+        self.assertGreater(samples[f'hello_request_queries_sum{{{profile}}}'], 0)
+        # The second read was served from the cache without a query
+        self.assertEqual(samples[f'hello_request_queries_bucket{{{profile},le="0"}}'], 1)
+        self.assertGreater(samples[f'hello_response_bytes_sum{{{profile}}}'], 0)
+        self.assertGreater(samples['hello_request_body_bytes_total{view="submit_user_message"}'], len(content))
+        self.assertEqual(samples['hello_request_duration_seconds_count{view="unmatched",method="GET",status="404"}'], 1)
+        self.assertGreaterEqual(samples['hello_profile_cache_events_total{event="hits"}'], 1)
+
+    def test_scrapes_are_restricted(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+    def test_slow_requests_are_traced(self):
+        with override_settings(METRICS_SLOW_REQUEST=0), self.assertLogs('hello.slow_requests', 'WARNING') as logs:
+            self.client.get(f'/api/messages/{self.user.id}/')
+        trace = json.loads(logs.records[0].getMessage())
+        self.assertEqual((trace['view'], trace['status']), ('get_user_messages', 200))
+        self.assertEqual(trace['queries'], sum(query['count'] for query in trace['slowest_queries']))
+        self.assertIn('user_messages', trace['slowest_queries'][0]['sql'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SyntheticDataTests(TestCase):
+    def rows(self, prefix):
+        users = User.objects.filter(email__startswith=prefix)
+        return (
+            list(users.order_by('id_number').values_list('first_name', 'gender', 'registration_date')),
+            list(UserMessage.objects.filter(user__in=users).order_by('user__id_number', 'created_at')
+                 .values_list('message', 'created_at')),
+        )
+
+    def test_same_seed_same_data(self):
+        first = generate(30, seed=7, prefix='one', batch_size=8)
+        generate(30, seed=7, prefix='two', batch_size=8)
+        self.assertEqual(first.users, 30)
+        self.assertEqual(User.objects.filter(email__startswith='one').count(), 30)
+        self.assertEqual(self.rows('one'), self.rows('two'))
+        self.assertEqual(JobApplication.objects.filter(user_id__in=first.user_ids).count(), first.applications)
+        # Every file field shares the placeholders
+        self.assertEqual(len(set(UserDocument.objects.values_list('file', flat=True))), 2)
+
+    def test_command_refuses_an_existing_prefix(self):
+        call_command('generate_data', users=3, prefix='again', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('generate_data', users=3, prefix='again', stdout=StringIO())
+
+    def test_prefixes_sharing_a_stem_do_not_clash(self):
+        call_command('generate_data', users=5, stdout=StringIO())
+        call_command('generate_data', users=5, prefix='synthetic2', stdout=StringIO())
+        self.assertEqual(User.objects.values('id_number').distinct().count(), 10)
+        # A clash with an existing id_number is caught before anything is inserted
+        User.objects.filter(email='synthetic0@example.com').update(email='moved@example.com')
+        with self.assertRaises(CommandError):
+            call_command('generate_data', users=5, stdout=StringIO())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, FILE_UPLOAD_CHUNK_SIZE=4096)
+class UploadPipelineTests(TestCase):
+    content = os.urandom(100 * 1024)
+
+    def test_uploads_are_spooled_and_hashed(self):
+        request = RequestFactory().post('/', {'file': upload('big.pdf', self.content)})
+        uploaded = request.FILES['file']
+        self.assertIsInstance(uploaded, TemporaryUploadedFile)
+        self.assertEqual(uploaded.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(uploaded.read(), self.content)
+        request.close()
+
+    def test_storage_moves_into_place_without_clobbering(self):
+        storage = StreamingFileSystemStorage()
+        first = storage.save('applications/cv/cv.pdf', upload('cv.pdf', self.content))
+        request = RequestFactory().post('/', {'file': upload('cv.pdf', b'second')})
+        second = storage.save('applications/cv/cv.pdf', request.FILES['file'])
+        request.close()
+
+        self.assertNotEqual(first, second)
+        with storage.open(first) as f:
+            self.assertEqual(f.read(), self.content)
+        with storage.open(second) as f:
+            self.assertEqual(f.read(), b'second')
+        leftovers = [name for name in os.listdir(storage.path('applications/cv')) if name.startswith('.upload-')]
+        self.assertEqual(leftovers, [])
+
+
+@FAST_HASHING
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.user = make_user()
+
+    def blobs(self):
+        root = os.path.join(self.media_root, 'blobs')
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(root) for name in names
+        )
+
+    def apply(self, user):
+        return self.client.post('/api/apply-job/', {
+            'user_id': user.id, 'job_title': 'Developer',
+            'cv': upload('My CV.PDF', b'same cv'), 'cover_letter': upload('letter.pdf', b'letter'),
+        })
+
+    def test_identical_uploads_share_one_blob(self):
+        self.apply(self.user)
+        self.apply(self.user)
+        first, second = JobApplication.objects.order_by('id')
+        digest = hashlib.sha256(b'same cv').hexdigest()
+        self.assertEqual(first.cv.name, f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf')
+        self.assertEqual(first.cv.name, second.cv.name)
+        self.assertEqual(len(self.blobs()), 2)
+        with first.cv.open() as f:
+            self.assertEqual(f.read(), b'same cv')
+
+    def test_gc_removes_only_unreferenced_blobs(self):
+        other = make_user('other@example.com', 'ID-2')
+        self.apply(self.user)
+        self.client.post('/api/apply-job/', {
+            'user_id': other.id, 'job_title': 'Developer',
+            'cv': upload('cv.pdf', b'other cv'), 'cover_letter': upload('letter.pdf', b'letter'),
+        })
+        self.assertEqual(len(self.blobs()), 3)
+
+        self.user.delete()
+        call_command('media_blobs', 'gc', '--grace-hours=0', stdout=StringIO())
+        application = JobApplication.objects.get()
+        self.assertEqual(self.blobs(), sorted([application.cv.name, application.cover_letter.name]))
+
+    def test_backfill_moves_and_dedupes_legacy_files(self):
+        for name in ('applications/cv/cv.pdf', 'applications/cv/cv_copy.pdf'):
+            os.makedirs(os.path.dirname(os.path.join(self.media_root, name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as f:
+                f.write(b'legacy cv')
+            JobApplication.objects.create(user=self.user, job_title='Legacy', cv=name, cover_letter=name)
+
+        call_command('media_blobs', 'backfill', stdout=StringIO())
+        names = set(JobApplication.objects.values_list('cv', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names.pop().startswith('blobs/'))
+        self.assertEqual(len(self.blobs()), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'applications/cv/cv.pdf')))
+
+
+def png(size=(1200, 900)):
+    from PIL import Image
+
+    output = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(output, 'PNG')
+    return output.getvalue()
+
+
+@FAST_HASHING
+class BackgroundTaskTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+
+    @override_settings(TASK_MAX_ATTEMPTS=3, TASK_RETRY_DELAY=10)
+    def test_failures_are_retried_then_dead_lettered(self):
+        task = Task.objects.create(name='generate_previews', payload={'model': 'hello.Nope', 'ids': [1]})
+        delays = []
+        for attempt in range(1, 3):
+            with self.assertLogs('hello.tasks', 'WARNING'):
+                self.assertEqual(run_pending(), 1)
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.attempts), ('queued', attempt))
+            self.assertIn('LookupError', task.last_error)
+            delays.append((task.run_at - timezone.now()).total_seconds())
+            # Not due yet, so nothing runs until the backoff has passed
+            self.assertEqual(run_pending(), 0)
+            Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        self.assertTrue(4 < delays[0] <= 10 and 9 < delays[1] <= 20, delays)
+
+        with self.assertLogs('hello.tasks', 'ERROR'):
+            self.assertEqual(run_pending(), 1)
+        self.assertFalse(Task.objects.exists())
+        failed = FailedTask.objects.get()
+        self.assertEqual((failed.name, failed.attempts), ('generate_previews', 3))
+        self.assertIn('LookupError', failed.last_error)
+
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.client.post('/admin/hello/failedtask/', {'action': 'requeue', '_selected_action': [failed.pk]})
+        self.assertFalse(FailedTask.objects.exists())
+        self.assertEqual(Task.objects.get().attempts, 0)
+
+    def test_abandoned_tasks_are_taken_over(self):
+        Task.objects.create(name='audit', payload={'action': 'test', 'model': 'hello.User', 'id': 1})
+        self.assertEqual(len(claim()), 1)
+        self.assertEqual(claim(), [])  # leased
+        Task.objects.update(run_at=timezone.now())  # the lease ran out
+        with self.assertLogs('hello.audit', 'INFO'):
+            self.assertEqual(run_pending(), 1)
+        self.assertEqual(Task.objects.get().attempts, 2)
+
+    @override_settings(TASK_DONE_RETENTION=7)
+    def test_finished_tasks_are_purged_after_retention(self):
+        payload = {'action': 'test', 'model': 'hello.User', 'id': 1}
+        old, recent = Task.objects.bulk_create([Task(name='audit', payload=payload) for _ in range(2)])
+        with self.assertLogs('hello.audit', 'INFO'):
+            self.assertEqual(run_pending(), 2)
+        Task.objects.filter(pk=old.pk).update(run_at=timezone.now() - timedelta(days=8))
+        # Queued work is never purged, however old
+        queued = Task.objects.create(name='audit', payload=payload, run_at=timezone.now() + timedelta(days=1),
+                                     created_at=timezone.now() - timedelta(days=30))
+
+        self.assertEqual(purge_done(), 1)
+        self.assertEqual(sorted(Task.objects.values_list('pk', flat=True)), [recent.pk, queued.pk])
+        self.assertEqual(Task.objects.get(pk=recent.pk).status, 'done')
+
+    @unittest.skipIf(PIL is None, 'Pillow is not installed')
+    def test_registration_documents_get_previews(self):
+        photo = SimpleUploadedFile('photo.png', png(), content_type='image/png')
+        response = self.client.post('/api/register/', registration_data(passport_photo=photo))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Task.objects.filter(name='generate_previews', status='queued').count(), 1)
+
+        self.assertEqual(run_pending(), 1)
+        document = UserDocument.objects.get(document_type='passport_photo')
+        self.assertTrue(document.preview.name.endswith('.jpg'))
+        self.assertLess(document.preview.size, document.file.size)
+        with document.preview.open() as f:
+            self.assertLessEqual(max(PIL.Image.open(f).size), settings.PREVIEW_SIZE)
+
+        user = self.client.get(f'/api/profile/{document.user_id}/').json()['user']
+        photo = next(d for d in user['documents'] if d['document_type'] == 'passport_photo')
+        self.assertTrue(photo['preview'].startswith(document.preview.url + '?'))
+        pdf = next(d for d in user['documents'] if d['document_type'] == 'birth_certificate')
+        self.assertIn('preview', pdf)
+
+
+@FAST_HASHING
+@override_settings(ADMINS=[('Admin', 'admin@example.com')])
+class SubmissionTaskTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.user = make_user()
+
+    def queued(self):
+        return sorted(Task.objects.filter(status='queued').values_list('name', flat=True))
+
+    def test_submit_only_queues_the_follow_up_work(self):
+        response = self.client.post('/api/apply-job/', {
+            'user_id': self.user.id, 'job_title': 'Developer', 'cv': upload('cv.pdf'),
+            'cover_letter': upload('letter.pdf'),
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.queued(), ['audit', 'scan_uploads', 'send_receipt'])
+        self.assertEqual(mail.outbox, [])
+
+        with self.assertLogs('hello.audit', 'INFO') as logs:
+            run_pending()
+        self.assertEqual(json.loads(logs.records[0].getMessage())['action'], 'application_submitted')
+        self.assertEqual([message.subject for message in mail.outbox], ['Application received'])
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        # Clean uploads are passed on to the preview renderer
+        self.assertEqual(self.queued(), [])
+        self.assertTrue(Task.objects.filter(name='generate_previews', status='done').exists())
+
+    def test_plain_message_is_not_scanned(self):
+        response = self.client.post('/api/messages/', {'user_id': self.user.id, 'message': 'Hello'})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.queued(), ['audit', 'send_receipt'])
+
+    def test_infected_upload_is_reported(self):
+        infected = upload('file.pdf', b'header ' + EICAR + b' trailer')
+        response = self.client.post('/api/messages/', {'user_id': self.user.id, 'message': 'Hi', 'file': infected})
+        self.assertEqual(response.status_code, 201, response.content)
+
+        with self.assertLogs('hello.audit', 'INFO') as logs:
+            run_pending()
+        actions = [json.loads(record.getMessage())['action'] for record in logs.records]
+        self.assertEqual(sorted(actions), ['message_submitted', 'upload_infected'])
+        message = UserMessage.objects.get()
+        self.assertEqual(sorted(email.subject for email in mail.outbox), [
+            'Message received', f'{settings.EMAIL_SUBJECT_PREFIX}Infected upload in hello.UserMessage #{message.id}',
+        ])
+        self.assertFalse(Task.objects.filter(name='generate_previews').exists())
+
+    def test_scanner_finds_signature_across_chunks(self):
+        content = os.urandom(64 * 1024 - 10) + EICAR + os.urandom(100)
+        message = UserMessage.objects.create(user=self.user, message='x', file=upload('file.pdf', content))
+        self.assertEqual(eicar_scanner(message.file), 'EICAR-Test-File')
+        message.file = upload('clean.pdf', os.urandom(100 * 1024))
+        message.save()
+        self.assertIsNone(eicar_scanner(message.file))
+
+
+@FAST_HASHING
+class MediaServingTests(TestCase):
+    content = bytes(range(256)) * 64
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT_PREFIX=None))
+        self.owner = make_user()
+        self.other = make_user('other@example.com', 'ID-2')
+        self.client.post('/api/apply-job/', {
+            'user_id': self.owner.id, 'job_title': 'Developer',
+            'cv': upload('cv.pdf', self.content), 'cover_letter': upload('letter.pdf', b'letter'),
+        })
+        self.application = JobApplication.objects.get()
+        profile = self.client.get(f'/api/profile/{self.owner.id}/').json()['user']
+        self.url = profile['applications'][0]['cv']
+
+    def test_signed_url_serves_owner_only(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        path = self.application.cv.name
+        self.assertEqual(self.client.get(f'/media/{path}').status_code, 404)
+        forged = signed_media_url(path, self.other.id)
+        self.assertEqual(self.client.get(forged).status_code, 404)
+        self.assertEqual(self.client.get(self.url.replace(f'u={self.owner.id}', f'u={self.other.id}')).status_code, 404)
+
+    def test_conditional_and_range_requests(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(etag, f'"{hashlib.sha256(self.content).hexdigest()}"')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-').status_code, 416)
+
+    def test_proxy_offload(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.application.cv.name}')
+        self.assertEqual(response.content, b'')
+
+
+@FAST_HASHING
+class AdminChangelistTests(TestCase):
+    changelists = ['user', 'userdocument', 'jobapplication', 'usermessage']
+
+    def setUp(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin-password')
+        self.client.force_login(admin_user)
+
+    def changelist_queries(self, model, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/admin/hello/{model}/{query}')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_scale_with_rows(self):
+        add_history(make_user('first@example.com', 'ID-1'), 2)
+        before = {model: self.changelist_queries(model) for model in self.changelists}
+        for i in range(2, 12):
+            add_history(make_user(f'user{i}@example.com', f'ID-{i}'), 3)
+        after = {model: self.changelist_queries(model) for model in self.changelists}
+        self.assertEqual(before, after)
+
+        filtered = {
+            'user': '?gender__exact=female&is_active__exact=1',
+            'jobapplication': '?status__exact=pending',
+            'usermessage': '?admin_reply__isnull=True',
+        }
+        for model, query in filtered.items():
+            self.assertEqual(self.changelist_queries(model, query), after[model], model)
+
+    def test_paginator_counts_exactly_without_estimates(self):
+        add_history(make_user(), 5)
+        paginator = EstimatedCountPaginator(UserMessage.objects.order_by('-created_at'), 2)
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 3)
+
+
+@FAST_HASHING
+class SearchTests(TestCase):
+    def setUp(self):
+        self.asha = make_user('asha@example.com', 'ID-100')
+        self.baraka = User.objects.create(
+            first_name='Baraka', last_name='Mollel', date_of_birth=date(1990, 1, 1), phone_number='0799999999',
+            email='baraka@example.com', gender='male', id_number='ID-200', marital_status='single',
+            form_four_number='S0101/0002/2012', password='!',
+        )
+        JobApplication.objects.create(user=self.baraka, job_title='Senior Accountant', cv='cv.pdf', cover_letter='cl.pdf')
+        UserMessage.objects.create(user=self.asha, message='When is the accountant interview?')
+        self.staff = get_user_model().objects.create_user('staff', 'staff@example.com', 'staff-password', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def search(self, **params):
+        return self.client.get('/api/search/', params)
+
+    def test_requires_staff(self):
+        self.assertEqual(self.search(q='a').status_code, 200)
+        self.client.logout()
+        self.assertIn(self.search(q='a').status_code, (401, 403))
+        # An applicant's own token is not enough either
+        token = issue_tokens(self.asha)['access']
+        response = self.client.get('/api/search/', {'q': 'a', 'type': 'messages'}, headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_finds_users_by_fragment(self):
+        response = self.search(q='baraka@exa')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.baraka.id])
+        self.assertNotIn('password', response.json()['results'][0])
+
+        response = self.search(q='id-100')
+        self.assertEqual([row['email'] for row in response.json()['results']], ['asha@example.com'])
+
+    def test_searches_applications_and_messages(self):
+        response = self.search(q='accountant', type='applications')
+        self.assertEqual([row['job_title'] for row in response.json()['results']], ['Senior Accountant'])
+        response = self.search(q='accountant', type='messages')
+        self.assertEqual([row['user_id'] for row in response.json()['results']], [self.asha.id])
+
+    def test_paginates_without_counting(self):
+        first = self.search(q='example.com', page_size=1).json()
+        second = self.search(q='example.com', page_size=1, page=2).json()
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual({first['results'][0]['id'], second['results'][0]['id']}, {self.asha.id, self.baraka.id})
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.search(q='').status_code, 400)
+        self.assertEqual(self.search(q='asha', type='documents').status_code, 400)
+        self.assertEqual(self.search(q='asha', page='0').status_code, 400)
+
+    def test_admin_search(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin-password')
+        self.client.force_login(admin_user)
+        response = self.client.get('/admin/hello/user/', {'q': 'mollel'})
+        self.assertContains(response, 'baraka@example.com')
+        self.assertNotContains(response, 'asha@example.com')
+
+
+@FAST_HASHING
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        reset_cache_stats()
+        self.user = make_user()
+        add_history(self.user, 3)
+        self.message = self.user.messages.order_by('-created_at', '-id').first()
+
+    def test_repeat_reads_are_served_from_cache(self):
+        self.client.get(f'/api/profile/{self.user.id}/')
+        self.client.get(f'/api/messages/{self.user.id}/')
+        with self.assertNumQueries(0):
+            profile = self.client.get(f'/api/profile/{self.user.id}/').json()
+            messages = self.client.get(f'/api/messages/{self.user.id}/').json()
+        self.assertEqual(profile['user']['email'], self.user.email)
+        self.assertEqual(len(messages['messages']), 3)
+        # profile, message ETag state and message page
+        self.assertEqual(cache_stats()['hits'], 3)
+        self.assertEqual(cache_stats()['misses'], 3)
+
+    def test_invalidation_reaches_other_workers_through_a_shared_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        self.enterContext(override_settings(CACHES={**settings.CACHES, 'shared': shared}, USER_CACHE_ALIAS='shared'))
+        # Two worker processes, each with its own connection to the shared cache
+        worker_a, worker_b = caches.create_connection('shared'), caches.create_connection('shared')
+        with mock.patch('hello.cache.get_cache', lambda: worker_a):
+            self.assertEqual(cache.cached('test', self.user.id, lambda: 'old'), 'old')
+            self.assertEqual(cache.cached('test', self.user.id, lambda: 'new'), 'old')
+        with mock.patch('hello.cache.get_cache', lambda: worker_b):
+            invalidate_user(self.user.id)
+        with mock.patch('hello.cache.get_cache', lambda: worker_a):
+            self.assertEqual(cache.cached('test', self.user.id, lambda: 'new'), 'new')
+
+    def test_login_shares_the_cached_profile(self):
+        self.client.get(f'/api/profile/{self.user.id}/')
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/login/', {'email': self.user.email, 'password': 'secret123'},
+                                        content_type='application/json')
+        self.assertEqual(response.json()['user']['id'], self.user.id)
+
+    def test_admin_reply_is_never_read_stale(self):
+        self.client.get(f'/api/profile/{self.user.id}/')
+        self.client.get(f'/api/messages/{self.user.id}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.message.admin_reply = 'Interviews start on Monday'
+            self.message.reply_date = timezone.now()
+            self.message.save()
+
+        profile = self.client.get(f'/api/profile/{self.user.id}/').json()['user']
+        messages = self.client.get(f'/api/messages/{self.user.id}/').json()['messages']
+        self.assertEqual(profile['messages'][0]['admin_reply'], 'Interviews start on Monday')
+        self.assertEqual(messages[0]['admin_reply'], 'Interviews start on Monday')
+        self.assertEqual(cache_stats()['hits'], 0)
+        self.assertGreaterEqual(cache_stats()['invalidations'], 2)
+
+    def test_writes_to_any_related_row_invalidate(self):
+        self.client.get(f'/api/profile/{self.user.id}/')
+        JobApplication.objects.create(user=self.user, job_title='Clerk', cv='cv.pdf', cover_letter='cl.pdf')
+        profile = self.client.get(f'/api/profile/{self.user.id}/').json()['user']
+        self.assertEqual(profile['applications'][0]['job_title'], 'Clerk')
+
+        User.objects.get(pk=self.user.pk).delete()
+        self.assertEqual(self.client.get(f'/api/profile/{self.user.id}/').status_code, 404)
+
+    def test_lost_version_key_never_resurrects_old_entries(self):
+        self.client.get(f'/api/profile/{self.user.id}/')
+        get_cache().delete(version_key(self.user.id))
+        UserMessage.objects.filter(pk=self.message.pk).update(admin_reply='Seen')
+        profile = self.client.get(f'/api/profile/{self.user.id}/').json()['user']
+        self.assertEqual(profile['messages'][0]['admin_reply'], 'Seen')
+
+
+@FAST_HASHING
+class ConditionalPollingTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = make_user()
+        add_history(self.user, 3)
+        self.messages_url = f'/api/messages/{self.user.id}/'
+        self.profile_url = f'/api/profile/{self.user.id}/'
+
+    def test_unchanged_polls_get_empty_304s(self):
+        for url in (self.messages_url, self.profile_url):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(first['Cache-Control'], 'private, no-cache')
+            with self.assertNumQueries(0):
+                again = self.client.get(url, headers={'If-None-Match': first['ETag']})
+            self.assertEqual(again.status_code, 304)
+            self.assertEqual(again.content, b'')
+            self.assertEqual(again['ETag'], first['ETag'])
+
+    def test_reply_changes_the_etag(self):
+        etags = [self.client.get(url)['ETag'] for url in (self.messages_url, self.profile_url)]
+        message = self.user.messages.first()
+        message.admin_reply, message.reply_date = 'Thanks', timezone.now()
+        message.save()
+        for url, etag in zip((self.messages_url, self.profile_url), etags):
+            response = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_page_parameters(self):
+        etag = self.client.get(self.messages_url)['ETag']
+        response = self.client.get(self.messages_url, {'page_size': 1}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['messages']), 1)
+
+    def test_since_returns_only_new_messages_and_replies(self):
+        since = timezone.now()
+        old, other = self.user.messages.order_by('id')[:2]
+        UserMessage.objects.filter(pk=old.pk).update(admin_reply='Answered', reply_date=since + timedelta(seconds=1))
+        new = UserMessage.objects.create(user=self.user, message='New', created_at=since + timedelta(seconds=2))
+
+        body = self.client.get(self.messages_url, {'since': since.isoformat()}).json()
+        self.assertEqual([message['id'] for message in body['messages']], [old.id, new.id])
+        self.assertFalse(body['has_more'])
+
+        response = self.client.get(self.messages_url, {'since': body['next_since']})
+        self.assertEqual(response.json()['messages'], [])
+        again = self.client.get(self.messages_url, {'since': body['next_since']},
+                                headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    def test_since_batches_do_not_split_equal_timestamps(self):
+        since = timezone.now()
+        stamp = since + timedelta(seconds=1)
+        UserMessage.objects.bulk_create(
+            UserMessage(user=self.user, message=f'Burst {i}', created_at=stamp if i >= 2 else since + timedelta(microseconds=i + 1))
+            for i in range(4)
+        )
+        body = self.client.get(self.messages_url, {'since': since.isoformat(), 'page_size': 3}).json()
+        self.assertEqual([message['message'] for message in body['messages']], ['Burst 0', 'Burst 1'])
+        self.assertTrue(body['has_more'])
+        body = self.client.get(self.messages_url, {'since': body['next_since'], 'page_size': 3}).json()
+        self.assertEqual([message['message'] for message in body['messages']], ['Burst 2', 'Burst 3'])
+
+    def test_invalid_since(self):
+        self.assertEqual(self.client.get(self.messages_url, {'since': 'yesterday'}).status_code, 400)
+
+    def test_admin_reply_stamps_reply_date(self):
+        message = self.user.messages.first()
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin-password')
+        request = RequestFactory().post('/')
+        request.user = admin_user
+        model_admin = admin.site._registry[UserMessage]
+        form = model_admin.get_form(request, message, change=True)(
+            instance=message, data={'user': self.user.id, 'message': message.message, 'admin_reply': 'Thanks'}
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        model_admin.save_model(request, form.save(commit=False), form, True)
+        message.refresh_from_db()
+        self.assertIsNotNone(message.reply_date)
+
+
+@FAST_HASHING
+class ServerSentEventTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        add_history(self.user, 2)
+        self.message = self.user.messages.first()
+        self.application = self.user.applications.first()
+
+    async def next_event(self, stream):
+        while True:
+            chunk = (await asyncio.wait_for(anext(stream), 2)).decode()
+            if not chunk.startswith((':', 'retry:')):
+                return chunk
+
+    # On PostgreSQL notices travel through NOTIFY, which LISTEN only sees once
+    # committed; the test transaction never commits, so deliver in-process
+    @mock.patch('hello.events.uses_notify', return_value=False)
+    async def test_pushes_replies_and_status_changes(self, uses_notify):
+        client = AsyncClient()
+        response = await client.get(f'/api/events/{self.user.id}/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertEqual(broker.count(), 1)
+
+        def reply():
+            message = UserMessage.objects.get(pk=self.message.pk)
+            message.admin_reply = 'See you Monday'
+            with self.captureOnCommitCallbacks(execute=True):
+                message.save()
+            # Saving again without a new reply pushes nothing
+            with self.captureOnCommitCallbacks(execute=True):
+                message.save()
+            application = JobApplication.objects.get(pk=self.application.pk)
+            application.status = 'reviewed'
+            with self.captureOnCommitCallbacks(execute=True):
+                application.save()
+
+        await sync_to_async(reply)()
+        event = await self.next_event(stream)
+        self.assertTrue(event.startswith('event: reply\n'))
+        self.assertEqual(json.loads(event.split('data: ', 1)[1])['admin_reply'], 'See you Monday')
+        event = await self.next_event(stream)
+        self.assertTrue(event.startswith('event: application_status\n'))
+        self.assertEqual(json.loads(event.split('data: ', 1)[1])['status'], 'reviewed')
+
+        # A client disconnect cancels the pending read, which unsubscribes
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(broker.count(), 0)
+
+    async def test_unknown_user(self):
+        response = await AsyncClient().get('/api/events/999999/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_users_events_are_not_delivered(self):
+        other = make_user('other@example.com', 'ID-2')
+
+        async def listen():
+            subscription = broker.subscribe(self.user.id)
+            try:
+                broker.dispatch({'user': other.id, 'event': 'reply', 'id': 1})
+                broker.dispatch({'user': self.user.id, 'event': 'reply', 'id': 2})
+                return await subscription.get(1)
+            finally:
+                broker.unsubscribe(subscription)
+
+        self.assertEqual(async_to_sync(listen)()['id'], 2)
+
+    @override_settings(EVENTS_QUEUE_SIZE=1)
+    def test_slow_subscriber_is_dropped(self):
+        async def flood():
+            subscription = broker.subscribe(self.user.id)
+            try:
+                for i in range(3):
+                    broker.dispatch({'user': self.user.id, 'event': 'reply', 'id': i})
+                await asyncio.sleep(0)
+                return subscription.overflowed
+            finally:
+                broker.unsubscribe(subscription)
+
+        self.assertTrue(async_to_sync(flood)())
+
+
+@FAST_HASHING
+class BulkStatusTests(TestCase):
+    url = '/api/applications/bulk-status/'
+
+    def setUp(self):
+        get_cache().clear()
+        self.staff = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin-password')
+        self.user = make_user()
+        add_history(self.user, 3)
+        self.pending, self.hired, self.reviewed = self.user.applications.order_by('id')
+        JobApplication.objects.filter(pk=self.hired.pk).update(status='hired')
+        JobApplication.objects.filter(pk=self.reviewed.pk).update(status='reviewed')
+
+    def post(self, data):
+        return self.client.post(self.url, data, content_type='application/json')
+
+    def test_requires_staff(self):
+        response = self.post({'ids': [self.pending.id], 'status': 'reviewed'})
+        self.assertIn(response.status_code, (401, 403))
+        self.assertEqual(JobApplication.objects.get(pk=self.pending.pk).status, 'pending')
+
+    def test_reports_per_row_outcomes(self):
+        self.client.force_login(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post({'ids': [self.pending.id, self.hired.id, self.reviewed.id, 999999], 'status': 'rejected'})
+        self.assertEqual(response.status_code, 200)
+        outcomes = {row['id']: (row['outcome'], row['previous_status']) for row in response.json()['results']}
+        self.assertEqual(outcomes, {
+            self.pending.id: ('updated', 'pending'),
+            self.hired.id: ('invalid_transition', 'hired'),
+            self.reviewed.id: ('updated', 'reviewed'),
+            999999: ('not_found', None),
+        })
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(
+            dict(self.user.applications.values_list('id', 'status')),
+            {self.pending.id: 'rejected', self.hired.id: 'hired', self.reviewed.id: 'rejected'},
+        )
+        self.assertEqual(self.post({'ids': [], 'status': 'rejected'}).status_code, 400)
+        self.assertEqual(self.post({'ids': [self.pending.id], 'status': 'archived'}).status_code, 400)
+
+    def test_query_count_does_not_scale(self):
+        JobApplication.objects.bulk_create(
+            JobApplication(user=self.user, job_title=f'Bulk {i}', cv='cv.pdf', cover_letter='cl.pdf')
+            for i in range(300)
+        )
+        ids = list(JobApplication.objects.filter(status='pending').values_list('id', flat=True))
+        counts = []
+        for batch in (ids[:1], ids[1:]):
+            with CaptureQueriesContext(connection) as queries:
+                JobApplication.objects.filter(id__in=batch).transition('reviewed')
+            counts.append(len([q for q in queries if 'SAVEPOINT' not in q['sql']]))
+        # Lock + update, and on PostgreSQL the pg_notify of the whole batch
+        expected = 3 if uses_notify() else 2
+        self.assertEqual(counts, [expected, expected])
+        self.assertFalse(JobApplication.objects.filter(status='pending').exists())
+
+    @mock.patch('hello.events.uses_notify', return_value=False)
+    def test_invalidates_cache_and_batches_notifications(self, uses_notify):
+        self.client.get(f'/api/profile/{self.user.id}/')
+        dispatched = []
+        with mock.patch('hello.events.broker.dispatch', dispatched.append):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.user.applications.all().transition('hired')
+        self.assertEqual(len(callbacks), 2)  # one cache bump, one notification batch
+        self.assertEqual({notice['id'] for notice in dispatched}, {self.pending.id, self.reviewed.id})
+        profile = self.client.get(f'/api/profile/{self.user.id}/').json()['user']
+        self.assertEqual({application['status'] for application in profile['applications']}, {'hired'})
+
+    def test_admin_actions(self):
+        self.client.force_login(self.staff)
+        response = self.client.post('/admin/hello/jobapplication/', {
+            'action': 'mark_hired', '_selected_action': [self.pending.id, self.hired.id],
+        }, follow=True)
+        self.assertContains(response, '1 application(s) marked hired.')
+        self.assertEqual(JobApplication.objects.get(pk=self.pending.pk).status, 'hired')
+
+    def test_packs_notify_payloads(self):
+        payloads = pack('application_status', [(i, i) for i in range(5000)])
+        self.assertGreater(len(payloads), 1)
+        self.assertTrue(all(len(payload) < 8000 for payload in payloads))
+        self.assertEqual(sum(len(notices(json.loads(payload))) for payload in payloads), 5000)
+
+
+@FAST_HASHING
+class ExportTests(TestCase):
+    url = '/api/exports/applicants/'
+
+    def setUp(self):
+        self.staff = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin-password')
+        self.applicant = make_user()
+        add_history(self.applicant, 2)
+        first, _ = self.applicant.applications.order_by('id')
+        JobApplication.objects.filter(pk=first.pk).update(status='hired', job_title='Data Clerk')
+        self.idle = make_user('idle@example.com', 'ID-2')
+
+    def export(self, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, params)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response
+
+    def csv_rows(self, response):
+        return list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_csv_lists_every_applicant_and_application(self):
+        header, *rows = self.csv_rows(self.export())
+        self.assertEqual(header[:2], ['User ID', 'First name'])
+        self.assertEqual(len(rows), 3)
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row[header.index('Email')], []).append(row)
+        self.assertEqual(len(by_user['user@example.com']), 2)
+        self.assertEqual(by_user['user@example.com'][0][header.index('Passport Photo')], 'yes')
+        idle, = by_user['idle@example.com']
+        self.assertEqual(idle[header.index('Passport Photo')], 'no')
+        self.assertEqual(idle[header.index('Application ID')], '')
+
+    def test_filters(self):
+        header, *rows = self.csv_rows(self.export(status='hired'))
+        self.assertEqual([row[header.index('Job title')] for row in rows], ['Data Clerk'])
+        header, *rows = self.csv_rows(self.export(job_title='clerk'))
+        self.assertEqual(len(rows), 1)
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.csv_rows(self.export(registered_after=tomorrow))), 1)
+        self.assertEqual(len(self.csv_rows(self.export(registered_before=tomorrow))), 4)
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(self.url, {'format': 'pdf'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'status': 'archived'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'registered_after': 'last week'}).status_code, 400)
+
+    def test_rows_are_read_through_a_cursor(self):
+        with mock.patch('django.db.models.query.QuerySet.iterator', autospec=True,
+                        side_effect=lambda qs, chunk_size=None: iter(qs)) as iterator:
+            self.csv_rows(self.export())
+        self.assertEqual(iterator.call_args.kwargs['chunk_size'], settings.EXPORT_CHUNK_SIZE)
+
+    def test_xlsx_is_a_valid_workbook(self):
+        content = b''.join(self.export(format='xlsx').streaming_content)
+        with zipfile.ZipFile(BytesIO(content)) as workbook:
+            self.assertIsNone(workbook.testzip())
+            self.assertIn('xl/workbook.xml', workbook.namelist())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 4)
+        self.assertIn('<t>Data Clerk</t>', sheet)
+
+    def test_formulas_are_not_exported_as_formulas(self):
+        User.objects.filter(pk=self.idle.pk).update(first_name='=HYPERLINK("http://evil.example","x")',
+                                                    last_name='@SUM(1+1)', phone_number='+255700000000')
+        header, *rows = self.csv_rows(self.export())
+        idle, = [row for row in rows if row[header.index('Email')] == 'idle@example.com']
+        self.assertEqual(idle[header.index('First name')], '\'=HYPERLINK("http://evil.example","x")')
+        self.assertEqual(idle[header.index('Last name')], "'@SUM(1+1)")
+        self.assertEqual(idle[header.index('Phone number')], "'+255700000000")
+
+        content = b''.join(self.export(format='xlsx').streaming_content)
+        with zipfile.ZipFile(BytesIO(content)) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        # Inline strings are shown as typed, never evaluated
+        self.assertIn('<c t="inlineStr"><is><t>=HYPERLINK("http://evil.example","x")</t></is></c>', sheet)
+        self.assertNotIn('<f>', sheet)
+
+    @mock.patch('hello.exports.XLSX_MAX_ROWS', 2)
+    def test_xlsx_rolls_over_to_new_sheets(self):
+        content = b''.join(self.export(format='xlsx').streaming_content)
+        with zipfile.ZipFile(BytesIO(content)) as workbook:
+            self.assertIn('xl/worksheets/sheet2.xml', workbook.namelist())
+            self.assertIn('Applicants 2', workbook.read('xl/workbook.xml').decode())
+
+    def test_admin_action(self):
+        self.client.force_login(self.staff)
+        response = self.client.post('/admin/hello/jobapplication/', {
+            'action': 'export_csv',
+            '_selected_action': list(self.applicant.applications.filter(status='hired').values_list('id', flat=True)),
+        })
+        rows = self.csv_rows(response)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][rows[0].index('Application status')], 'hired')
+
+
+class ImportTests(TestCase):
+    header = ('first_name,last_name,date_of_birth,phone_number,email,gender,id_number,marital_status,'
+              'form_four_number,passport_photo,job_title,cv\n')
+
+    def setUp(self):
+        self.existing = make_user('taken@example.com', 'ID-TAKEN')
+
+    def row(self, i, **overrides):
+        values = {
+            'first_name': 'Neema', 'last_name': f'Ali{i}', 'date_of_birth': '1990-05-05',
+            'phone_number': '0700000000', 'email': f'import{i}@example.com', 'gender': 'female',
+            'id_number': f'ID-IMP-{i}', 'marital_status': 'single', 'form_four_number': 'S1/1/2010',
+            'passport_photo': f'blobs/photo{i}', 'job_title': '', 'cv': '',
+        }
+        values.update(overrides)
+        return ','.join(values.values()) + '\n'
+
+    def import_csv(self, *rows):
+        return import_applicants(BytesIO((self.header + ''.join(rows)).encode()), 'csv')
+
+    def test_imports_users_documents_and_applications(self):
+        result = self.import_csv(self.row(1), self.row(2, job_title='Clerk', cv='applications/cv/a.pdf'))
+        self.assertEqual((result.users, result.documents, result.applications), (2, 2, 1))
+        self.assertEqual(result.rejected, [])
+        user = User.objects.get(email='import2@example.com')
+        self.assertFalse(is_password_usable(user.password))
+        # The same shape as make_password(None) whichever merge path ran
+        self.assertEqual(len(user.password), len(make_password(None)))
+        self.assertIsNone(user.middle_name)
+        self.assertEqual(user.documents.get().file.name, 'blobs/photo2')
+        self.assertEqual(user.applications.get().status, 'pending')
+        self.assertEqual(Task.objects.filter(name='generate_previews').count(), 2)
+
+    def test_reports_rejected_rows(self):
+        result = self.import_csv(
+            self.row(1),
+            self.row(2, date_of_birth='05/05/1990'),
+            self.row(3, gender='unknown'),
+            self.row(4, email='import1@example.com'),
+            self.row(5, id_number='ID-TAKEN'),
+            self.row(6, cv='applications/cv/a.pdf'),
+            self.row(7, email='not-an-email'),
+        )
+        self.assertEqual(result.users, 1)
+        self.assertEqual([line for line, _ in result.rejected], [3, 4, 5, 6, 7, 8])
+        reasons = dict(result.rejected)
+        self.assertEqual(reasons[5], 'duplicate email (line 2)')
+        self.assertEqual(reasons[6], 'id_number already registered')
+        self.assertFalse(User.objects.filter(id_number='ID-IMP-4').exists())
+
+    def test_ndjson_and_command(self):
+        lines = [json.dumps({'first_name': 'Neema', 'last_name': 'Ali', 'date_of_birth': '1990-05-05',
+                             'phone_number': '0700000000', 'email': 'nd@example.com', 'gender': 'female',
+                             'id_number': 'ID-ND', 'marital_status': 'married', 'form_four_number': 'S1/1/2010'}),
+                 '[1, 2]']
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            f.write('\n'.join(lines))
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_applicants', f.name, rejected='-', stdout=out)
+        self.assertIn('1 applicants', out.getvalue())
+        self.assertIn('2,not a JSON object', out.getvalue())
+        self.assertTrue(User.objects.filter(email='nd@example.com', marital_status='married').exists())
+
+    def test_missing_columns(self):
+        with self.assertRaises(ImportFormatError):
+            import_applicants(BytesIO(b'first_name,email\nA,a@example.com\n'), 'csv')
+
+    def test_admin_upload(self):
+        staff = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin-password')
+        self.client.force_login(staff)
+        self.assertContains(self.client.get('/admin/hello/user/'), 'Import applicants')
+        upload_file = SimpleUploadedFile('fair.csv', (self.header + self.row(1) + self.row(2, gender='x')).encode())
+        response = self.client.post('/admin/hello/user/import/', {'file': upload_file}, follow=True)
+        self.assertContains(response, '1 applicants')
+        self.assertContains(response, 'Line 3: gender must be one of')
+        self.assertTrue(User.objects.filter(email='import1@example.com').exists())
+
+
+@FAST_HASHING
+# Payload caching off, so every request shows which database answered it
+@override_settings(REPLICA_DATABASES=['replica'], REPLICA_MAX_LAG=5, USER_CACHE_TIMEOUT=0)
+class ReplicaRoutingTests(TestCase):
+    """Routing against a second, separately migrated test database, so where a
+    read went shows in what it returns."""
+
+    @classmethod
+    def setUpClass(cls):
+        primary = connections['default'].settings_dict
+        test_settings = dict(primary['TEST'], MIRROR=None)
+        if connections['default'].vendor != 'sqlite':
+            test_settings['NAME'] = f"{primary['NAME']}_replica"
+        connections.settings['replica'] = {**primary, 'TEST': test_settings}
+        cls.replica_name = connections['replica'].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Declared only now: the test runner sets up (and checks) the aliases
+        # named in `databases` before any class is set up
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].creation.destroy_test_db(cls.replica_name, verbosity=0)
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        get_cache().clear()
+        reset_replica_state()
+        self.user = make_user()
+        # The replica's copy of the same user, one write behind
+        replica_user = User.objects.using('replica').get_or_create(
+            pk=self.user.pk, defaults={**{f.attname: getattr(self.user, f.attname) for f in User._meta.concrete_fields},
+                                       'first_name': 'Stale'})[0]
+        self.assertEqual(replica_user.first_name, 'Stale')
+
+    def profile_name(self):
+        return self.client.get(f'/api/profile/{self.user.id}/').json()['user']['first_name']
+
+    def test_read_only_views_use_the_replica(self):
+        self.assertEqual(self.profile_name(), 'Stale')
+        # Writes and their reads stay on the primary
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/messages/', {'user_id': self.user.id, 'message': 'Hello'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(UserMessage.objects.using('default').filter(user=self.user).exists())
+        self.assertFalse(UserMessage.objects.using('replica').exists())
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            UserMessage.objects.create(user=self.user, message='Hello')
+        self.assertTrue(is_pinned(self.user.id))
+        self.assertEqual(self.profile_name(), 'Asha')
+        messages = self.client.get(f'/api/messages/{self.user.id}/').json()['messages']
+        self.assertEqual(len(messages), 1)
+
+        # A different user's reads are not pinned
+        other = make_user('other@example.com', 'ID-2')
+        get_cache().delete(f'hello:user:{other.id}:primary')
+        self.assertEqual(self.client.get(f'/api/profile/{other.id}/').status_code, 404)
+
+    @override_settings(USER_CACHE_TIMEOUT=300)
+    def test_replica_payload_racing_a_write_is_not_cached(self):
+        get_version = cache.get_version
+
+        def commit_then_get_version(user_id):
+            # The write commits after this request was routed to the replica
+            with self.captureOnCommitCallbacks(execute=True):
+                User.objects.filter(pk=self.user.pk).update(first_name='Fresh')
+                invalidate_user(self.user.id)
+            return get_version(user_id)
+
+        with mock.patch('hello.cache.get_version', side_effect=commit_then_get_version):
+            self.assertEqual(self.profile_name(), 'Stale')
+        # Pinned now, and the replica's payload was not stored under the new version
+        self.assertEqual(self.profile_name(), 'Fresh')
+        self.assertEqual(self.profile_name(), 'Fresh')
+
+    def test_post_sets_a_pin_cookie(self):
+        self.client.post('/api/messages/', {'user_id': self.user.id, 'message': 'Hello'})
+        self.assertIn(PIN_COOKIE, self.client.cookies)
+        get_cache().delete(f'hello:user:{self.user.id}:primary')
+        self.assertEqual(self.profile_name(), 'Asha')
+        del self.client.cookies[PIN_COOKIE]
+        self.assertEqual(self.profile_name(), 'Stale')
+
+    def test_falls_back_to_the_primary_on_lag(self):
+        with mock.patch('hello.routers.measure_lag', return_value=30.0) as measure:
+            self.assertEqual(self.profile_name(), 'Asha')
+            self.assertEqual(self.profile_name(), 'Asha')
+        self.assertEqual(measure.call_count, 1)  # rechecked every REPLICA_LAG_CHECK_INTERVAL
+        reset_replica_state()
+        with mock.patch('hello.routers.measure_lag', side_effect=OperationalError):
+            self.assertEqual(self.profile_name(), 'Asha')
+        reset_replica_state()
+        with override_settings(REPLICA_MAX_LAG=None), mock.patch('hello.routers.measure_lag') as measure:
+            self.assertEqual(self.profile_name(), 'Stale')
+        measure.assert_not_called()
+
+    def test_router_decisions(self):
+        self.assertEqual(router.db_for_write(User), 'default')
+        self.assertEqual(router.db_for_read(User), 'default')
+        staff = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin-password')
+        self.client.force_login(staff)
+        # Admin changelists read from the replica; auth and sessions do not
+        response = self.client.get('/admin/hello/user/')
+        self.assertContains(response, 'Stale')
+        self.assertNotContains(self.client.get(f'/admin/hello/user/{self.user.id}/change/'), 'value="Stale"')
@@ -0,0 +1,154 @@
+"""
+Rate limits for login, registration and uploads.
+
+Budgets are DRF throttle rates, per scope, in
+``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']``; a scope without a rate (or with
+None) is not limited. Each budget is a sliding window counter kept in the
+THROTTLE_CACHE_ALIAS cache: requests are counted per fixed window with
+``incr``, and the previous window's count is weighted by how much of it still
+overlaps the sliding window. That is two cache round trips per check, atomic
+on every backend that implements ``incr`` atomically (local memory, Redis,
+memcached), and a bounded number of keys however hard a client pushes.
+
+Per-address budgets (``early = True``) only need the request headers, so
+``ThrottleMiddleware`` checks them before the view runs and nothing reads the
+body of a rejected request, however large the upload. Budgets keyed by the
+submitted email or the authenticated user are checked by DRF as usual.
+Rejected requests are counted too, so a client that keeps hammering stays
+locked out instead of getting a steady trickle through.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from .tokens import TokenUser
+
+
+def hit(key, limit, window, now=None):
+    """Count one request against ``key``; ``(allowed, seconds until allowed again)``."""
+    cache = caches[settings.THROTTLE_CACHE_ALIAS]
+    now = time.time() if now is None else now
+    slot, elapsed = divmod(now, window)
+    current_key, previous_key = f'{key}:{int(slot)}', f'{key}:{int(slot) - 1}'
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # First request of this window; add() lets only one racer create it
+        if cache.add(current_key, 1, timeout=2 * window):
+            current = 1
+        else:
+            current = cache.incr(current_key)
+    previous = cache.get(previous_key, 0)
+    if previous * (1 - elapsed / window) + current <= limit:
+        return True, 0
+    if current > limit:
+        # Only once this window is the previous one, weighted down far enough
+        return False, window - elapsed + window * (1 - limit / current)
+    return False, window * (1 - (limit - current) / previous) - elapsed
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """DRF's rates and cache keys, counted with ``hit()``."""
+    # Keyed on the request headers alone, so ThrottleMiddleware can check it
+    early = False
+
+    def __init__(self):
+        # Read the rates now, not at import, so changed settings apply
+        self.THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+        super().__init__()
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        if self.early and getattr(request, 'early_throttled', False):
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        allowed, self.retry_after = hit(self.key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AddressThrottle(SlidingWindowThrottle):
+    early = True
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginAddressThrottle(AddressThrottle):
+    scope = 'login_ip'
+
+
+class RegisterAddressThrottle(AddressThrottle):
+    scope = 'register_ip'
+
+
+class UploadAddressThrottle(AddressThrottle):
+    scope = 'upload_ip'
+
+
+class LoginEmailThrottle(SlidingWindowThrottle):
+    """Attempts per account, from however many addresses."""
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email:
+            return None
+        # Hashed: cache keys must stay short and free of spaces for memcached
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class UploadUserThrottle(SlidingWindowThrottle):
+    """Uploads per token-authenticated user. Callers without a token are
+    only limited per address: their ``user_id`` is in the multipart body."""
+    scope = 'upload_user'
+
+    def get_cache_key(self, request, view):
+        if not isinstance(request.user, TokenUser):
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.id}
+
+
+LOGIN_THROTTLES = [LoginAddressThrottle, LoginEmailThrottle]
+REGISTER_THROTTLES = [RegisterAddressThrottle]
+UPLOAD_THROTTLES = [UploadAddressThrottle, UploadUserThrottle]
+
+
+def throttled_response(wait):
+    response = JsonResponse({'success': False, 'message': 'Too many requests, please try again later'}, status=429)
+    response['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+class ThrottleMiddleware:
+    """Checks a view's ``early`` throttles before the view reads the body."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        throttle_classes = getattr(getattr(view_func, 'cls', None), 'throttle_classes', ())
+        waits = []
+        for throttle_class in throttle_classes:
+            if getattr(throttle_class, 'early', False):
+                throttle = throttle_class()
+                if not throttle.allow_request(request, None):
+                    waits.append(throttle.wait())
+        request.early_throttled = True
+        if waits:
+            return throttled_response(max(waits))
@@ -0,0 +1,123 @@
+"""
+Stateless signed access and refresh tokens.
+
+``login_user`` issues a short-lived access token and a longer-lived refresh
+token. Both are ``TimestampSigner`` values over ``<user id>:<active>:<token
+version>``. Each kind has its own salt, so one kind cannot be used as the
+other. ``TokenAuthentication`` checks the signature and age in memory. It
+then compares the version with ``token_state()``, a small cache entry per
+user, so a warm request costs no query to establish who is calling.
+
+Revoking is a matter of bumping ``User.token_version`` (``revoke_tokens``,
+used by logout). Deactivating or deleting the user also revokes. Any of
+these drops the cache entry, so the next request reads the row again.
+That only holds for every worker if USER_CACHE_ALIAS is shared between
+them; ``hello.checks`` fails ``check --deploy`` on a local memory cache.
+"""
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from .cache import get_cache
+from .models import User
+
+ACCESS, REFRESH = 'access', 'refresh'
+
+signers = {kind: signing.TimestampSigner(salt=f'hello.tokens.{kind}') for kind in (ACCESS, REFRESH)}
+
+
+def lifetime(kind):
+    return settings.ACCESS_TOKEN_LIFETIME if kind == ACCESS else settings.REFRESH_TOKEN_LIFETIME
+
+
+def state_key(user_id):
+    return f'hello:user:{user_id}:tokens'
+
+
+def token_state(user_id):
+    """``(token_version, is_active)`` of ``user_id``; ``(None, False)`` if it does not exist."""
+    cache = get_cache()
+    state = cache.get(state_key(user_id))
+    if state is None:
+        # From the primary: a lagging replica may not have seen a revocation yet
+        row = User.objects.using('default').filter(pk=user_id).values_list('token_version', 'is_active').first()
+        state = tuple(row) if row else (None, False)
+        cache.set(state_key(user_id), state, timeout=settings.TOKEN_STATE_TIMEOUT)
+    return state
+
+
+def forget_token_state(user_id):
+    """Drop the cached state now and again on commit, like ``invalidate_user``."""
+    get_cache().delete(state_key(user_id))
+    transaction.on_commit(lambda: get_cache().delete(state_key(user_id)))
+
+
+def revoke_tokens(user_id):
+    User.objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+    forget_token_state(user_id)
+
+
+def make_token(kind, user):
+    return signers[kind].sign(f'{user.pk}:{int(user.is_active)}:{user.token_version}')
+
+
+def issue_tokens(user):
+    # Login has just loaded the row, so the first authenticated request needs no query either
+    get_cache().set(state_key(user.pk), (user.token_version, user.is_active), timeout=settings.TOKEN_STATE_TIMEOUT)
+    return {
+        'access': make_token(ACCESS, user),
+        'refresh': make_token(REFRESH, user),
+        'token_type': 'Bearer',
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+    }
+
+
+class TokenUser:
+    """The caller of a token-authenticated request, without its row."""
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+    is_staff = False
+    is_superuser = False
+
+    def __init__(self, user_id, token_version):
+        self.id = self.pk = user_id
+        self.token_version = token_version
+
+    def __str__(self):
+        return f'User #{self.id}'
+
+
+def verify_token(token, kind=ACCESS):
+    """The ``TokenUser`` ``token`` was issued to, or None when it is forged, expired or revoked."""
+    try:
+        value = signers[kind].unsign(token, max_age=lifetime(kind))
+        user_id, active, version = map(int, value.split(':'))
+    except (signing.BadSignature, ValueError):
+        return None
+    if not active or token_state(user_id) != (version, True):
+        return None
+    return TokenUser(user_id, version)
+
+
+class TokenAuthentication(BaseAuthentication):
+    """``Authorization: Bearer <access token>``."""
+    keyword = b'bearer'
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword:
+            return None
+        if len(header) != 2:
+            raise AuthenticationFailed('Invalid Authorization header.')
+        token = header[1].decode('latin-1')
+        user = verify_token(token)
+        if user is None:
+            raise AuthenticationFailed('Invalid or expired token.')
+        return user, token
+
+    def authenticate_header(self, request):
+        return 'Bearer'
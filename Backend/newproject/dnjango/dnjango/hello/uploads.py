@@ -0,0 +1,30 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spool every upload straight to a temporary file in FILE_UPLOAD_CHUNK_SIZE
+    chunks, hashing it as it arrives. Nothing is buffered in worker memory
+    beyond one chunk, and the finished file carries its SHA-256 hex digest as
+    ``upload.sha256``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.chunk_size = settings.FILE_UPLOAD_CHUNK_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.hash.hexdigest()
+        return upload
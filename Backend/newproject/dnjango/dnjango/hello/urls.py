@@ -1,12 +1,19 @@
 from django.urls import path
 from . import views
+from .exports import export_applicants
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('register/', views.register_user, name='register_user'),
     path('login/', views.login_user, name='login_user'),
+    path('token/refresh/', views.refresh_tokens, name='refresh_tokens'),
+    path('logout/', views.logout_user, name='logout_user'),
     path('profile/<int:user_id>/', views.get_user_profile, name='get_user_profile'),
     path('apply-job/', views.submit_job_application, name='submit_job_application'),
+    path('exports/applicants/', export_applicants, name='export_applicants'),
+    path('applications/bulk-status/', views.bulk_update_application_status, name='bulk_update_application_status'),
     path('messages/', views.submit_user_message, name='submit_user_message'),
     path('messages/<int:user_id>/', views.get_user_messages, name='get_user_messages'),
+    path('search/', views.search, name='search'),
+    path('events/<int:user_id>/', views.user_events, name='user_events'),
 ]
\ No newline at end of file
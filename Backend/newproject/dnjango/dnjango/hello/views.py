@@ -1,79 +1,119 @@
-from django.http import JsonResponse
-from rest_framework.decorators import api_view, parser_classes
+import json
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.decorators import api_view, authentication_classes, parser_classes, permission_classes, renderer_classes, throttle_classes
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import IntegrityError
+from rest_framework.utils.encoders import JSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .cache import cached
+from .events import broker, listener
+from .etags import messages_etag, not_modified, payload_etag, with_etag
+from .hashers import HashingPoolSaturated
 from .models import User, UserDocument, JobApplication, UserMessage
+from .pagination import InvalidPage, changes_since, decode_cursor, get_page_size, keyset_page, parse_since
+from .payloads import MESSAGES, build_profile
+from .renderers import FAST_RENDERERS
+from .routers import replica_reads
 from .serializers import (
     UserSerializer, UserRegistrationSerializer, LoginSerializer,
-    JobApplicationSubmitSerializer, UserMessageSerializer
+    JobApplicationSubmitSerializer, UserMessageSerializer, JobApplicationSerializer,
+    BulkStatusSerializer
 )
+from .search import SEARCH_TARGETS, search_page
+from .submissions import after_submit
+from .throttling import LOGIN_THROTTLES, REGISTER_THROTTLES, UPLOAD_THROTTLES
+from .tokens import REFRESH, TokenAuthentication, TokenUser, issue_tokens, revoke_tokens, verify_token
 
 @api_view(['GET'])
+@authentication_classes([])
 def home(request):
     return JsonResponse({
         'message': 'Welcome to Zawamis API',
         'endpoints': {
             'register': '/api/register/',
             'login': '/api/login/',
+            'refresh_token': '/api/token/refresh/',
+            'logout': '/api/logout/',
             'profile': '/api/profile/{id}/',
             'apply_job': '/api/apply-job/',
             'messages': '/api/messages/',
+            'search': '/api/search/?q={term}&type=users|applications|messages',
+            'events': '/api/events/{id}/',
+            'export_applicants': '/api/exports/applicants/?format=csv|xlsx',
             'admin_panel': '/admin/'
         }
     })
 
+# Map frontend field names to backend field names
+REGISTRATION_FIELD_MAPPING = {
+    'firstName': 'first_name',
+    'middleName': 'middle_name',
+    'lastName': 'last_name',
+    'dateOfBirth': 'date_of_birth',
+    'phoneNumber': 'phone_number',
+    'idNumber': 'id_number',
+    'maritalStatus': 'marital_status',
+    'formFourNumber': 'form_four_number',
+    'confirmPassword': 'confirm_password',
+    'passportPhoto': 'passport_photo',
+    'birthCertificate': 'birth_certificate',
+    'educationCertificate': 'education_certificate'
+}
+
+DUPLICATE_MESSAGES = {
+    'email': 'Email already registered. Please login instead.',
+    'id_number': 'ID Number already registered.',
+}
+
+def duplicate_registration_response(field):
+    message = DUPLICATE_MESSAGES.get(field, 'Database error: User might already exist')
+    return Response({'success': False, 'message': message}, status=status.HTTP_400_BAD_REQUEST)
+
 @api_view(['POST'])
+@authentication_classes([])
 @parser_classes([MultiPartParser, FormParser])
+@throttle_classes(REGISTER_THROTTLES)
 def register_user(request):
     try:
-        # Check if email already exists
-        if User.objects.filter(email=request.data.get('email')).exists():
-            return Response({'success': False, 'message': 'Email already registered. Please login instead.'}, status=status.HTTP_400_BAD_REQUEST)
-            
-        # Check if ID number already exists
-        if User.objects.filter(id_number=request.data.get('idNumber')).exists():
-            return Response({'success': False, 'message': 'ID Number already registered.'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create a copy of the request data
-        data = request.data.copy()
-        
-        # Map frontend field names to backend field names
-        field_mapping = {
-            'firstName': 'first_name',
-            'middleName': 'middle_name', 
-            'lastName': 'last_name',
-            'dateOfBirth': 'date_of_birth',
-            'phoneNumber': 'phone_number',
-            'idNumber': 'id_number',
-            'maritalStatus': 'marital_status',
-            'formFourNumber': 'form_four_number',
-            'confirmPassword': 'confirm_password',
-            'passportPhoto': 'passport_photo',
-            'birthCertificate': 'birth_certificate',
-            'educationCertificate': 'education_certificate'
-        }
-        
-        # Convert all field names from camelCase to snake_case
-        for frontend_field, backend_field in field_mapping.items():
-            if frontend_field in data:
-                data[backend_field] = data.pop(frontend_field)
-        
+        # Convert field names from camelCase to snake_case without copying the uploads
+        data = {REGISTRATION_FIELD_MAPPING.get(key, key): value for key, value in request.data.items()}
+
+        # One query for both unique fields, before spending CPU on hashing;
+        # the unique constraints catch anything that races past it.
+        taken = User.objects.filter(
+            Q(email=data.get('email')) | Q(id_number=data.get('id_number'))
+        ).values_list('email', flat=True).first()
+        if taken is not None:
+            return duplicate_registration_response('email' if taken == data.get('email') else 'id_number')
+
         serializer = UserRegistrationSerializer(data=data)
         if serializer.is_valid():
             user = serializer.save()
+            user.recent_messages, user.recent_applications = [], []
             user_serializer = UserSerializer(user)
             return Response({'success': True, 'message': 'Registration successful', 'user': user_serializer.data}, status=status.HTTP_201_CREATED)
         else:
             return Response({'success': False, 'message': 'Validation failed', 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
-            
-    except IntegrityError:
-        return Response({'success': False, 'message': 'Database error: User might already exist'}, status=status.HTTP_400_BAD_REQUEST)
+
+    except IntegrityError as e:
+        error = str(e)
+        return duplicate_registration_response(next((field for field in ('id_number', 'email') if field in error), None))
+    except HashingPoolSaturated:
+        return Response({'success': False, 'message': 'Server busy, please try again shortly'}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except Exception as e:
         return Response({'success': False, 'message': f'Registration failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
+@authentication_classes([])
+@renderer_classes(FAST_RENDERERS)
+@throttle_classes(LOGIN_THROTTLES)
 def login_user(request):
     try:
         serializer = LoginSerializer(data=request.data)
@@ -89,20 +129,57 @@ def login_user(request):
             return Response({'success': False, 'message': 'Invalid email or password'}, status=status.HTTP_401_UNAUTHORIZED)
         
         if user.check_password(password):
-            user_serializer = UserSerializer(user)
-            return Response({'success': True, 'message': 'Login successful', 'user': user_serializer.data}, status=status.HTTP_200_OK)
+            return Response({'success': True, 'message': 'Login successful', 'user': cached('profile', user.id, lambda: build_profile(user.id, user)), 'tokens': issue_tokens(user)}, status=status.HTTP_200_OK)
         else:
             return Response({'success': False, 'message': 'Invalid email or password'}, status=status.HTTP_401_UNAUTHORIZED)
             
+    except HashingPoolSaturated:
+        return Response({'success': False, 'message': 'Server busy, please try again shortly'}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except Exception as e:
         return Response({'success': False, 'message': f'Login failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@authentication_classes([])
+def refresh_tokens(request):
+    user = verify_token(str(request.data.get('refresh', '')), REFRESH)
+    if user is None:
+        return Response({'success': False, 'message': 'Invalid or expired refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response({'success': True, 'tokens': issue_tokens(user)}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def logout_user(request):
+    # Revokes the tokens of every session of this user, not just this one
+    revoke_tokens(request.user.id)
+    return Response({'success': True, 'message': 'Logged out'}, status=status.HTTP_200_OK)
+
+def submitter_id(request):
+    """``(user id, None)`` for the caller of a submit view, or ``(None, error response)``.
+
+    A bearer token identifies the caller without a query. Clients that still
+    send only a ``user_id`` field get the old lookup.
+    """
+    user_id = request.data.get('user_id')
+    if isinstance(request.user, TokenUser):
+        if user_id and str(user_id) != str(request.user.id):
+            return None, Response({'success': False, 'message': 'user_id does not match the token'}, status=status.HTTP_403_FORBIDDEN)
+        return request.user.id, None
+    if not user_id:
+        return None, Response({'success': False, 'message': 'User ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if not User.objects.filter(id=user_id, is_active=True).exists():
+        return None, Response({'success': False, 'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    return user_id, None
+
+@replica_reads
 @api_view(['GET'])
+@authentication_classes([])
+@renderer_classes(FAST_RENDERERS)
 def get_user_profile(request, user_id):
     try:
-        user = User.objects.get(id=user_id, is_active=True)
-        serializer = UserSerializer(user)
-        return Response({'success': True, 'user': serializer.data}, status=status.HTTP_200_OK)
+        profile = cached('profile', user_id, lambda: build_profile(user_id))
+        etag = payload_etag(profile)
+        return with_etag(not_modified(request, etag) or Response({'success': True, 'user': profile}, status=status.HTTP_200_OK), etag)
     except User.DoesNotExist:
         return Response({'success': False, 'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -110,26 +187,24 @@ def get_user_profile(request, user_id):
 
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
+@throttle_classes(UPLOAD_THROTTLES)
 def submit_job_application(request):
     try:
-        user_id = request.data.get('user_id')
-        if not user_id:
-            return Response({'success': False, 'message': 'User ID is required'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        try:
-            user = User.objects.get(id=user_id, is_active=True)
-        except User.DoesNotExist:
-            return Response({'success': False, 'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        user_id, error = submitter_id(request)
+        if error:
+            return error
         
         serializer = JobApplicationSubmitSerializer(data=request.data)
         if serializer.is_valid():
             job_application = JobApplication(
-                user=user,
+                user_id=user_id,
                 job_title=serializer.validated_data['job_title'],
                 cv=serializer.validated_data['cv'],
                 cover_letter=serializer.validated_data['cover_letter']
             )
-            job_application.save()
+            with transaction.atomic():
+                job_application.save()
+                after_submit(job_application, 'application_submitted')
             
             return Response({'success': True, 'message': 'Application submitted successfully'}, status=status.HTTP_201_CREATED)
         else:
@@ -140,27 +215,25 @@ def submit_job_application(request):
 
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
+@throttle_classes(UPLOAD_THROTTLES)
 def submit_user_message(request):
     try:
-        user_id = request.data.get('user_id')
-        if not user_id:
-            return Response({'success': False, 'message': 'User ID is required'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        try:
-            user = User.objects.get(id=user_id, is_active=True)
-        except User.DoesNotExist:
-            return Response({'success': False, 'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        user_id, error = submitter_id(request)
+        if error:
+            return error
         
         serializer = UserMessageSerializer(data=request.data)
         if serializer.is_valid():
             user_message = UserMessage(
-                user=user,
+                user_id=user_id,
                 message=serializer.validated_data['message'],
                 file=serializer.validated_data.get('file'),
                 file_name=request.FILES.get('file').name if request.FILES.get('file') else None,
                 file_type=request.FILES.get('file').content_type if request.FILES.get('file') else None
             )
-            user_message.save()
+            with transaction.atomic():
+                user_message.save()
+                after_submit(user_message, 'message_submitted')
             
             return Response({'success': True, 'message': 'Message sent successfully'}, status=status.HTTP_201_CREATED)
         else:
@@ -169,14 +242,150 @@ def submit_user_message(request):
     except Exception as e:
         return Response({'success': False, 'message': f'Message sending failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_update_application_status(request):
+    serializer = BulkStatusSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({'success': False, 'message': 'Invalid data', 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        new_status = serializer.validated_data['status']
+        outcomes = JobApplication.objects.filter(id__in=ids).transition(new_status)
+        results = [
+            {'id': pk, 'outcome': outcomes[pk][0], 'previous_status': outcomes[pk][1]} if pk in outcomes
+            else {'id': pk, 'outcome': 'not_found', 'previous_status': None}
+            for pk in ids
+        ]
+        updated = sum(1 for result in results if result['outcome'] == 'updated')
+        return Response({'success': True, 'status': new_status, 'updated': updated, 'results': results}, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({'success': False, 'message': f'Bulk update failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def stream_user_messages(user):
+    messages = MESSAGES.values(UserMessage.objects.filter(user=user).order_by('-created_at', '-id'))
+    tz = timezone.get_current_timezone()
+    for row in messages.iterator(chunk_size=settings.MESSAGES_EXPORT_CHUNK_SIZE):
+        yield json.dumps(MESSAGES.row(row, tz), cls=JSONEncoder) + '\n'
+
+@replica_reads
 @api_view(['GET'])
+@authentication_classes([])
+@renderer_classes(FAST_RENDERERS)
 def get_user_messages(request, user_id):
     try:
-        user = User.objects.get(id=user_id, is_active=True)
-        messages = UserMessage.objects.filter(user=user).order_by('-created_at')
-        serializer = UserMessageSerializer(messages, many=True)
-        return Response({'success': True, 'messages': serializer.data}, status=status.HTTP_200_OK)
+        if request.query_params.get('stream'):
+            user = User.objects.get(id=user_id, is_active=True)
+            return StreamingHttpResponse(stream_user_messages(user), content_type='application/x-ndjson')
+
+        page_size = get_page_size(request.query_params.get('page_size'))
+        cursor = request.query_params.get('cursor') or ''
+        if cursor:
+            decode_cursor(cursor)
+        since = request.query_params.get('since') or ''
+        if since:
+            since = parse_since(since)
+
+        etag = messages_etag(user_id, cursor, page_size, since)
+        response = not_modified(request, etag)
+        if response is not None:
+            return with_etag(response, etag)
+
+        if since:
+            # Delta sync: only what was created or answered after `since`
+            messages, next_since, has_more = changes_since(MESSAGES.values(UserMessage.objects.filter(user_id=user_id)), since, page_size)
+            return with_etag(Response({
+                'success': True, 'messages': MESSAGES.rows(messages),
+                'next_since': next_since, 'has_more': has_more
+            }, status=status.HTTP_200_OK), etag)
+
+        def build_page():
+            user = User.objects.get(id=user_id, is_active=True)
+            messages, next_cursor = keyset_page(MESSAGES.values(UserMessage.objects.filter(user=user)), cursor, page_size)
+            return {'messages': MESSAGES.rows(messages), 'next_cursor': next_cursor}
+
+        page = cached('messages', user_id, build_page, cursor, page_size)
+        return with_etag(Response({
+            'success': True, 'messages': page['messages'],
+            'next_cursor': page['next_cursor'], 'has_more': page['next_cursor'] is not None
+        }, status=status.HTTP_200_OK), etag)
     except User.DoesNotExist:
         return Response({'success': False, 'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    except InvalidPage as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-        return Response({'success': False, 'message': f'Error retrieving messages: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'success': False, 'message': f'Error retrieving messages: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@replica_reads
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def search(request):
+    term = request.query_params.get('q', '').strip()
+    target = request.query_params.get('type', 'users')
+    if not term:
+        return Response({'success': False, 'message': 'Search term is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if target not in SEARCH_TARGETS:
+        return Response({'success': False, 'message': f"type must be one of {', '.join(SEARCH_TARGETS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        page_size = get_page_size(request.query_params.get('page_size'), settings.SEARCH_PAGE_SIZE, settings.SEARCH_MAX_PAGE_SIZE)
+        try:
+            page = int(request.query_params.get('page', 1))
+        except ValueError:
+            raise InvalidPage('Invalid page')
+        if page < 1:
+            raise InvalidPage('Invalid page')
+        results, has_more = search_page(target, term, page, page_size)
+        return Response({
+            'success': True, 'type': target, 'results': results,
+            'page': page, 'has_more': has_more
+        }, status=status.HTTP_200_OK)
+    except InvalidPage as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({'success': False, 'message': f'Search failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Server-Sent Events: event name -> (model, serializer) of the row it refers to
+EVENT_PAYLOADS = {
+    'reply': (UserMessage, UserMessageSerializer),
+    'application_status': (JobApplication, JobApplicationSerializer),
+}
+
+async def render_event(notice):
+    model, serializer_class = EVENT_PAYLOADS[notice['event']]
+    obj = await model.objects.filter(pk=notice['id'], user_id=notice['user']).afirst()
+    if obj is None:
+        return None
+    data = json.dumps(serializer_class(obj).data, cls=JSONEncoder)
+    return f"event: {notice['event']}\ndata: {data}\n\n"
+
+async def event_stream(subscription):
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        while not subscription.overflowed:
+            notice = await subscription.get(settings.EVENTS_HEARTBEAT)
+            if notice is None:
+                # Comment line: keeps proxies from timing out an idle stream
+                yield ': keepalive\n\n'
+                continue
+            event = await render_event(notice)
+            if event is not None:
+                yield event
+    finally:
+        broker.unsubscribe(subscription)
+
+@require_GET
+async def user_events(request, user_id):
+    """Replies and application status changes for one user, pushed as they commit.
+
+    Needs an ASGI server. Clients should fetch /api/messages/<id>/?since=
+    after every (re)connect to pick up anything sent while they were away.
+    """
+    if not await User.objects.filter(pk=user_id, is_active=True).aexists():
+        return JsonResponse({'success': False, 'message': 'User not found'}, status=404)
+    listener.ensure_started()
+    subscription = broker.subscribe(user_id)
+    response = StreamingHttpResponse(event_stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response